@@ -2,6 +2,8 @@
 ASGI config for app project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests are resolved with app.urls_asgi, whose recipe read routes are async views;
+serve it with ``uvicorn app.asgi:application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
@@ -9,8 +11,53 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+
+from core.asyncviews import iterate_pooled
+from core.db.pool import warm_pools_on_first_request
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
-application = get_asgi_application()
+django.setup(set_prefix=False)
+
+
+class ASGIApplication(ASGIHandler):
+    """Resolves requests with app.urls_asgi, streaming responses from the view threads."""
+
+    async def get_response_async(self, request):
+        request.urlconf = 'app.urls_asgi'
+        return await super().get_response_async(request)
+
+    async def send_response(self, response, send):
+        # ASGIHandler.send_response iterates streaming content on the event loop, where the
+        # queries of a streaming export are not allowed, and skips close() when sending fails
+        headers = [
+            (header.encode('ascii'), value.encode('latin1')) for header, value in response.items()
+        ] + [
+            (b'Set-Cookie', cookie.output(header='').encode('ascii').strip()) for cookie in response.cookies.values()
+        ]
+        try:
+            await send({'type': 'http.response.start', 'status': response.status_code, 'headers': headers})
+            if response.streaming:
+                parts = iterate_pooled(response)
+                try:
+                    async for part in parts:
+                        for chunk, _ in self.chunk_bytes(part):
+                            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                finally:
+                    await parts.aclose()
+                await send({'type': 'http.response.body'})
+            else:
+                for chunk, last in self.chunk_bytes(response.content):
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': not last})
+        finally:
+            # sends request_finished, which returns the request's database connections
+            await sync_to_async(response.close, thread_sensitive=True)()
+
+
+application = ASGIApplication()
+
+# open the pooled database connections of each worker process, see core.db.pool
+warm_pools_on_first_request()
@@ -12,6 +12,9 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 
 from pathlib import Path
 import os
+
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -37,15 +40,19 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'drf_spectacular',
     'core',
     'user',
     'recipe',
+    'benchmarks',
 ]
 
 MIDDLEWARE = [
+    'core.instrumentation.PerformanceMiddleware',
+    'core.db.replicas.ReplicaReadsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -81,13 +88,69 @@ WSGI_APPLICATION = 'app.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'core.db.backends.postgresql',
         'HOST': os.environ.get('DB_HOST'),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        # seconds a thread keeps its connection between requests; only worth raising with the
+        # pool off, as a pooled connection kept by a thread cannot serve the other threads
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0)),
+        # connections shared by the threads of a process, see core.db.pool
+        'POOL': {
+            # connections open at most, 0 turns the pool off
+            'MAX_SIZE': int(os.environ.get('DB_POOL_MAX_SIZE', 20)),
+            # connections opened by warm_pools() when a process serves its first request
+            'MIN_SIZE': int(os.environ.get('DB_POOL_MIN_SIZE', 4)),
+            # seconds to wait for a free connection before failing
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            # seconds a connection can be idle before it is pinged on checkout
+            'CHECK_AFTER': float(os.environ.get('DB_POOL_CHECK_AFTER', 30)),
+            # seconds after which a connection is closed instead of reused
+            'MAX_LIFETIME': float(os.environ.get('DB_POOL_MAX_LIFETIME', 3600)),
+        },
+    }
+}
+
+# Caches
+# 'default' lives in each process. 'shared', seen by every process, is configured with
+# SHARED_CACHE_BACKEND and SHARED_CACHE_LOCATION, like django.core.cache.backends.db.DatabaseCache
+# and the name of its table (created by createcachetable), or a memcached backend and address
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+}
+if os.environ.get('SHARED_CACHE_BACKEND'):
+    CACHES['shared'] = {
+        'BACKEND': os.environ['SHARED_CACHE_BACKEND'],
+        'LOCATION': os.environ.get('SHARED_CACHE_LOCATION', ''),
+    }
+
+# read replicas of default, as comma separated host[:port][/name]; a replica without a name
+# has default's, and the tests read through default's test database
+for number, replica in enumerate(filter(None, os.environ.get('DB_REPLICAS', '').split(',')), 1):
+    address, _, name = replica.strip().partition('/')
+    host, _, port = address.partition(':')
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port,
+        'NAME': name or DATABASES['default']['NAME'],
+        'POOL': dict(DATABASES['default']['POOL']),
+        'TEST': {'MIRROR': 'default'},
     }
+
+DATABASE_ROUTERS = ['core.db.replicas.ReplicaRouter']
+
+# reads of safe requests go to one of the replicas, see core.db.replicas; CACHE names an
+# alias of CACHES, which must be shared between processes for a write to pin every worker
+REPLICA_READS = {
+    'DATABASES': [alias for alias in DATABASES if alias != 'default'],
+    'STICKY_SECONDS': int(os.environ.get('DB_REPLICA_STICKY_SECONDS', 10)),
+    'COOKIE': 'db_primary',
+    'CACHE': 'shared',
 }
+if REPLICA_READS['DATABASES'] and REPLICA_READS['CACHE'] not in CACHES:
+    raise ImproperlyConfigured('DB_REPLICAS needs the shared cache, set SHARED_CACHE_BACKEND')
 
 
 # Password validation
@@ -140,7 +203,75 @@ AUTH_USER_MODEL = 'core.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # orjson in place of the stdlib json module, see core.renderers
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+# default page size of the list endpoints and the upper bound for their page_size query parameter
+API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', 100))
+API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', 1000))
+# cache of token -> user used by user.authentication.CachedTokenAuthentication:
+# a per-process LRU with a short TTL, optionally backed by a shared cache alias from CACHES
+TOKEN_AUTH_CACHE = {
+    'BACKEND': os.environ.get('TOKEN_AUTH_CACHE_BACKEND') or None,
+    'MAX_SIZE': int(os.environ.get('TOKEN_AUTH_CACHE_SIZE', 10000)),
+    'LOCAL_TTL': int(os.environ.get('TOKEN_AUTH_CACHE_LOCAL_TTL', 10)),
+    'TTL': int(os.environ.get('TOKEN_AUTH_CACHE_TTL', 300)),
+}
+# cache of recipe, tag and ingredient read responses (recipe.cache), invalidated per user by a
+# version counter; BACKEND names an alias of CACHES, which must be shared between processes
+# for a write to invalidate every worker, None disables the cache. On by default only when
+# the 'shared' cache is configured
+RESPONSE_CACHE = {
+    'BACKEND': os.environ.get('RESPONSE_CACHE_BACKEND', 'shared' if 'shared' in CACHES else '') or None,
+    'TTL': int(os.environ.get('RESPONSE_CACHE_TTL', 300)),
+}
+# resized copies rendered for every uploaded recipe image by a local process pool;
+# EAGER renders inside the request instead, which the tests rely on
+RECIPE_IMAGE_VARIANTS = {
+    'WIDTHS': [int(width) for width in os.environ.get('RECIPE_IMAGE_WIDTHS', '320,640,1280').split(',')],
+    'FORMATS': ['webp', 'jpeg'],
+    'QUALITY': int(os.environ.get('RECIPE_IMAGE_QUALITY', 80)),
+    'WORKERS': int(os.environ.get('RECIPE_IMAGE_WORKERS', 2)),
+    'EAGER': False,
+}
+# limits of recipe image uploads, enforced while the upload streams in (recipe.uploadhandlers)
+RECIPE_IMAGE_UPLOAD = {
+    'MAX_BYTES': int(os.environ.get('RECIPE_IMAGE_MAX_BYTES', 10 * 1024 * 1024)),
+    'MAX_PIXELS': int(os.environ.get('RECIPE_IMAGE_MAX_PIXELS', 40_000_000)),
+    # the image size must be readable from this many leading bytes
+    'HEADER_BYTES': 256 * 1024,
+}
+# most recipes accepted by one request to the bulk recipe endpoint
+RECIPE_BULK_MAX_ITEMS = int(os.environ.get('RECIPE_BULK_MAX_ITEMS', 5000))
+# recipes read from the database and serialized at a time by the streaming recipe export
+RECIPE_EXPORT_CHUNK_SIZE = int(os.environ.get('RECIPE_EXPORT_CHUNK_SIZE', 2000))
+# read the tags and ingredients of recipes from their denormalized cached_<relation>
+# columns instead of joining them, see RecipeQuerySet.aggregated_attrs
+RECIPE_CACHED_ATTRS = os.environ.get('RECIPE_CACHED_ATTRS', '1') == '1'
+# per-request instrumentation (core.instrumentation): the latency of every request, and for a
+# SAMPLE_RATE share of them the database, serializer and render time, reported in the
+# Server-Timing header and at /api/metrics/. Staff users can read the metrics, and so can
+# requests sending TOKEN, when set, as a bearer token; DEBUG does not open them
+PERF_METRICS = {
+    'SAMPLE_RATE': float(os.environ.get('PERF_METRICS_SAMPLE_RATE', 0.05)),
+    'TOKEN': os.environ.get('PERF_METRICS_TOKEN') or None,
+    'BUCKETS': [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10],
 }
+# what happens when a request issues more queries than the query_budgets of its view allow
+# (core.querybudget): 'raise' (development and tests), 'log' (staging) or unset (off).
+# Not derived from DEBUG: 'raise' runs every write request in a transaction
+QUERY_BUDGET = os.environ.get('QUERY_BUDGET') or None
+# threads of the ASGI application running the sync DRF views of its async routes
+# (core.asyncviews); also the most database connections those routes use at a time
+ASGI_VIEW_THREADS = int(os.environ.get('ASGI_VIEW_THREADS', 16))
 APPEND_SLASH=False
 
 # by default django browsable api does not work properly to upload image but following setting
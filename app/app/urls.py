@@ -22,10 +22,13 @@ from drf_spectacular.views import (
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core.instrumentation import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/schema/', SpectacularAPIView.as_view(), name='api-schema'),
     path('api/docks/', SpectacularSwaggerView.as_view(url_name='api-schema'), name='api-docks'),
+    path('api/metrics/', metrics_view, name='metrics'),
     path('api/user/', include('user.urls')),
     path('api/recipe/', include('recipe.urls'))
 ]
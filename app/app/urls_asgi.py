@@ -0,0 +1,26 @@
+"""
+URL configuration of the ASGI application (app.asgi).
+
+The routes of the recipe list, detail and export and of the tag and ingredient lists are
+served by async views running the DRF views in a bounded thread pool (core.asyncviews).
+Everything else is app.urls, run by Django's sync adapter. Names and paths are those of
+app.urls.
+"""
+from django.urls import include, path
+
+from app.urls import urlpatterns as sync_urlpatterns
+from core.asyncviews import pooled
+from recipe.urls import router
+
+ASYNC_ROUTES = ('recipe-list', 'recipe-detail', 'recipe-export', 'tag-list', 'ingredient-list')
+
+# every route of the recipe app, so that the whole 'recipe' namespace reverses from here
+recipe_urlpatterns = [
+    type(pattern)(pattern.pattern, pooled(pattern.callback), pattern.default_args, pattern.name)
+    if pattern.name in ASYNC_ROUTES else pattern
+    for pattern in router.urls
+]
+
+urlpatterns = [
+    path('api/recipe/', include((recipe_urlpatterns, 'recipe'))),
+] + sync_urlpatterns
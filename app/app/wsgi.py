@@ -11,6 +11,11 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
+from core.db.pool import warm_pools_on_first_request
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
 application = get_wsgi_application()
+
+# open the pooled database connections of each worker process, see core.db.pool
+warm_pools_on_first_request()
@@ -0,0 +1,159 @@
+"""
+Concurrent-connection capacity of the WSGI and the ASGI deployment.
+
+Both servers get the same number of threads running views. Slow clients open connections
+and trickle request headers without ever finishing them, like clients on bad networks;
+meanwhile probe clients keep requesting an endpoint. A WSGI worker thread is held by each
+connection it reads from, so the probes stall once the slow clients outnumber the threads;
+the ASGI server reads connections on its event loop and only hands complete requests to
+its view threads.
+"""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.servers.basehttp import WSGIServer, get_internal_wsgi_application
+
+from benchmarks.load import QuietRequestHandler
+from benchmarks.timing import summarize
+
+
+class PooledWSGIServer(WSGIServer):
+    """WSGI server handling every connection on one of `threads` threads, like a threaded worker."""
+
+    def __init__(self, *args, threads, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f'no server listening on port {port}')
+
+
+def start_server(kind, port, threads):
+    """Start the WSGI or the ASGI application in a child process, returning the process."""
+    env = {**os.environ, 'ASGI_VIEW_THREADS': str(threads)}
+    if kind == 'asgi':
+        command = [
+            sys.executable, '-m', 'uvicorn', 'app.asgi:application',
+            '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning',
+        ]
+    else:
+        command = [
+            sys.executable, '-c',
+            'import django; django.setup(); from benchmarks.capacity import serve_wsgi; '
+            f'serve_wsgi({port}, {threads})',
+        ]
+    process = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env)
+    wait_for_port(port)
+    return process
+
+
+def serve_wsgi(port, threads):
+    server = PooledWSGIServer(('127.0.0.1', port), QuietRequestHandler, threads=threads)
+    server.set_app(get_internal_wsgi_application())
+    server.serve_forever()
+
+
+async def _slow_client(port, token, stop):
+    """Hold a connection by sending one more header line every second, never ending the request."""
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    except OSError:
+        return
+    try:
+        # a valid request once the connection is closed, so the server has nothing to complain about
+        writer.write(f'GET /api/user/me/ HTTP/1.1\r\nHost: 127.0.0.1\r\nAuthorization: Token {token}\r\n'.encode())
+        while not stop.is_set():
+            writer.write(b'X-Slow: 1\r\n')
+            await writer.drain()
+            try:
+                await asyncio.wait_for(stop.wait(), 1)
+            except asyncio.TimeoutError:
+                pass
+    except OSError:
+        pass
+    finally:
+        writer.close()
+
+
+async def _request(port, path, token, timeout):
+    """GET path on a fresh connection, returning the status code."""
+    async def exchange():
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            writer.write(
+                f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nAuthorization: Token {token}\r\n'
+                'Connection: close\r\n\r\n'.encode()
+            )
+            await writer.drain()
+            response = await reader.read()
+        finally:
+            writer.close()
+        return int(response.split(b' ', 2)[1])
+
+    return await asyncio.wait_for(exchange(), timeout)
+
+
+async def _probe(port, path, token, deadline, timeout, latencies, failures):
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            status = await _request(port, path, token, timeout)
+        except (OSError, asyncio.TimeoutError, IndexError, ValueError):
+            failures.append('timeout')
+            continue
+        if status >= 400:
+            failures.append(status)
+        else:
+            latencies.append(time.perf_counter() - started)
+
+
+async def measure_capacity(port, path, token, slow, probes, duration, timeout=5):
+    """Probe path while `slow` slow clients hold connections open."""
+    stop = asyncio.Event()
+    slow_clients = [asyncio.create_task(_slow_client(port, token, stop)) for _ in range(slow)]
+    # let the slow clients connect and occupy what they can
+    await asyncio.sleep(1)
+    latencies, failures = [], []
+    deadline = time.monotonic() + duration
+    await asyncio.gather(*(_probe(port, path, token, deadline, timeout, latencies, failures) for _ in range(probes)))
+    stop.set()
+    await asyncio.gather(*slow_clients)
+    stats = summarize(latencies) if latencies else {}
+    return {
+        'slow_connections': slow,
+        'requests': len(latencies),
+        'failures': len(failures),
+        'rps': round(len(latencies) / duration, 1),
+        **{key: value for key, value in stats.items() if key != 'runs'},
+    }
@@ -0,0 +1,135 @@
+"""
+Closed-loop HTTP load generator for the recipe and user APIs.
+
+Every scenario drives one real endpoint. A run forks `concurrency` worker processes,
+each sending requests back to back over a keep-alive connection for `duration` seconds,
+and merges their latencies into RPS and percentiles. Workers draw users, ids and search
+words from a random generator seeded by their index, so runs replay the same requests.
+"""
+import http.client
+import json
+import multiprocessing
+import random
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler, get_internal_wsgi_application
+from django.db import connections
+from django.urls import reverse
+
+from benchmarks.seed import WORDS, BENCH_PASSWORD
+from benchmarks.timing import summarize
+
+
+def _query(path, **params):
+    return f'{path}?{urlencode(params)}'
+
+
+def _recipe_payload(rng):
+    return {
+        'title': f'Load {rng.choice(WORDS)} {rng.choice(WORDS)}',
+        'price': f'{rng.randint(100, 9999) / 100:.2f}',
+        'time_minutes': rng.randint(5, 180),
+        'tags': [{'name': f'tag {rng.randint(0, 19)}'}],
+        'ingredients': [{'name': f'ingredient {rng.randint(0, 49)}'} for _ in range(2)],
+    }
+
+
+# name: (rng, user) -> (method, path, JSON body or None); user is one of the users of the run
+SCENARIOS = {
+    'recipe-list': lambda rng, user: ('GET', reverse('recipe:recipe-list'), None),
+    'recipe-filter': lambda rng, user: (
+        'GET',
+        _query(reverse('recipe:recipe-list'), tags=','.join(map(str, rng.sample(user['tags'], 2)))),
+        None,
+    ),
+    'recipe-search': lambda rng, user: (
+        'GET', _query(reverse('recipe:recipe-list'), search=rng.choice(WORDS)), None,
+    ),
+    'recipe-detail': lambda rng, user: (
+        'GET', reverse('recipe:recipe-detail', args=[rng.choice(user['recipes'])]), None,
+    ),
+    'tag-list': lambda rng, user: ('GET', reverse('recipe:tag-list'), None),
+    'ingredient-list': lambda rng, user: ('GET', reverse('recipe:ingredient-list'), None),
+    'user-me': lambda rng, user: ('GET', reverse('user:me'), None),
+    'recipe-create': lambda rng, user: ('POST', reverse('recipe:recipe-list'), _recipe_payload(rng)),
+    'recipe-update': lambda rng, user: (
+        'PATCH',
+        reverse('recipe:recipe-detail', args=[rng.choice(user['recipes'])]),
+        {'title': f'Updated {rng.choice(WORDS)}'},
+    ),
+    'user-token': lambda rng, user: (
+        'POST', reverse('user:token'), {'email': user['email'], 'password': BENCH_PASSWORD},
+    ),
+}
+# scenarios leaving the dataset as it is
+READ_SCENARIOS = (
+    'recipe-list', 'recipe-filter', 'recipe-search', 'recipe-detail', 'tag-list', 'ingredient-list', 'user-me',
+)
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host='127.0.0.1', port=0):
+    """Serve the project's WSGI application from a background thread, returning its base URL."""
+    server = ThreadedWSGIServer((host, port), QuietRequestHandler)
+    server.set_app(get_internal_wsgi_application())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://{host}:{server.server_address[1]}', server
+
+
+def _worker(args):
+    base_url, scenario, users, duration, seed = args
+    url = urlsplit(base_url)
+    rng = random.Random(f'{seed}-{scenario}')
+    make_request = SCENARIOS[scenario]
+    conn = http.client.HTTPConnection(url.hostname, url.port, timeout=60)
+    latencies, errors = [], 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        user = rng.choice(users)
+        method, path, body = make_request(rng, user)
+        headers = {'Authorization': f'Token {user["token"]}', 'Accept': 'application/json'}
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        started = time.perf_counter()
+        try:
+            conn.request(method, url.path.rstrip('/') + path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            continue
+        latencies.append(time.perf_counter() - started)
+        if response.status >= 400:
+            errors += 1
+        if response.getheader('Connection', '').lower() == 'close':
+            conn.close()
+    conn.close()
+    return latencies, errors
+
+
+def run_scenario(base_url, scenario, users, concurrency, duration, seed=0):
+    """Load one endpoint from `concurrency` processes for `duration` seconds and summarize it."""
+    # forked workers must not share the parent's database connections
+    connections.close_all()
+    with multiprocessing.get_context('fork').Pool(concurrency) as pool:
+        results = pool.map(
+            _worker, [(base_url, scenario, users, duration, f'{seed}-{worker}') for worker in range(concurrency)]
+        )
+    latencies = [latency for worker_latencies, _ in results for latency in worker_latencies]
+    errors = sum(worker_errors for _, worker_errors in results)
+    stats = summarize(latencies) if latencies else {'runs': 0}
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / duration, 1),
+        **{key: value for key, value in stats.items() if key != 'runs'},
+    }
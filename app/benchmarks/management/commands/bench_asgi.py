@@ -0,0 +1,65 @@
+"""
+Django command comparing the concurrent-connection capacity of the WSGI and ASGI deployments
+"""
+import asyncio
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from benchmarks.capacity import free_port, measure_capacity, start_server
+from benchmarks.seed import seed
+from user.authentication import token_cache
+
+
+class Command(BaseCommand):
+    """
+    Serve the project with a threaded WSGI server and with uvicorn, both running views on
+    the same number of threads, and probe the recipe list while a growing number of slow
+    clients hold connections open
+    """
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--threads', type=int, default=8, help='view threads of either server')
+        parser.add_argument('--slow', help='comma separated slow client counts, by default 0 and 1, 4 and 16 x threads')
+        parser.add_argument('--probes', type=int, default=4, help='concurrent probe clients')
+        parser.add_argument('--duration', type=float, default=5, help='seconds per measurement')
+        parser.add_argument('--output', help='write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        threads = options['threads']
+        slow_counts = (
+            [int(count) for count in options['slow'].split(',')]
+            if options['slow'] else [0, threads, 4 * threads, 16 * threads]
+        )
+        user = seed(recipes=options['recipes'], seed=options['seed'], loader='copy')[0]
+        token = Token.objects.get_or_create(user=user)[0].key
+        token_cache.clear()
+        path = reverse('recipe:recipe-list')
+        connections.close_all()
+
+        results = {}
+        for kind in ('wsgi', 'asgi'):
+            port = free_port()
+            server = start_server(kind, port, threads)
+            try:
+                results[kind] = []
+                for slow in slow_counts:
+                    result = asyncio.run(
+                        measure_capacity(port, path, token, slow, options['probes'], options['duration'])
+                    )
+                    results[kind].append(result)
+                    self.stdout.write(f'{kind} {result}')
+            finally:
+                server.terminate()
+                server.wait()
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump({'options': {key: options[key] for key in ('recipes', 'threads', 'probes', 'duration')},
+                           'results': results}, output, indent=2)
@@ -0,0 +1,82 @@
+"""
+Django command measuring the per-request latency saved by pooled and persistent connections
+"""
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from django.test import Client
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from benchmarks.seed import seed
+from benchmarks.timing import measure
+
+# (POOL MAX_SIZE, CONN_MAX_AGE) of each way of getting a request its connection
+MODES = {
+    'fresh': (0, 0),
+    'persistent': (0, 600),
+    'pooled': (None, 0),
+}
+
+
+class Command(BaseCommand):
+    """
+    Time requests opening a fresh connection each, keeping the thread's connection
+    (CONN_MAX_AGE) and checking one out of the pool, both for a bare connect-query-close
+    cycle and for API requests, closing connections after each as Django's handler does
+    """
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=500)
+        parser.add_argument('--output', help='write the results to this JSON file')
+
+    def cycle(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        close_old_connections()
+
+    def handle(self, *args, **options):
+        user = seed(recipes=100, loader='copy')[0]
+        client = Client(
+            HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'Token {Token.objects.get_or_create(user=user)[0].key}',
+        )
+        requests = {
+            'select-1': self.cycle,
+            'user-me': reverse('user:me'),
+            'tag-list': reverse('recipe:tag-list'),
+        }
+        settings_dict = connection.settings_dict
+        max_size = settings_dict['POOL']['MAX_SIZE']
+        results = {}
+        try:
+            for mode, (pool_size, max_age) in MODES.items():
+                connection.close()
+                settings_dict['POOL']['MAX_SIZE'] = max_size if pool_size is None else pool_size
+                settings_dict['CONN_MAX_AGE'] = max_age
+                results[mode] = {}
+                for name, request in requests.items():
+                    if callable(request):
+                        run = request
+                    else:
+                        def run(path=request):
+                            assert client.get(path).status_code == 200
+                            # the test client does not send request_finished to close_old_connections
+                            close_old_connections()
+                    results[mode][name] = measure(run, options['runs'], warmup=5)
+                    self.stdout.write(f'{mode:<10} {name:<9} {results[mode][name]}')
+        finally:
+            connection.close()
+            settings_dict['POOL']['MAX_SIZE'] = max_size
+            settings_dict['CONN_MAX_AGE'] = 0
+
+        for mode in ('persistent', 'pooled'):
+            saved = {
+                name: round(results['fresh'][name]['p50_ms'] - results[mode][name]['p50_ms'], 3)
+                for name in requests
+            }
+            self.stdout.write(f'p50 saved per request, {mode}: {saved} ms')
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump({'runs': options['runs'], 'results': results}, output, indent=2)
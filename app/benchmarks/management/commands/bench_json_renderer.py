@@ -0,0 +1,41 @@
+"""
+Django command comparing the orjson renderer and parser with DRF's json ones
+"""
+import io
+
+from django.core.management.base import BaseCommand
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from benchmarks.seed import seed
+from benchmarks.timing import measure
+from core.models import Recipe
+from core.renderers import ORJSONParser, ORJSONRenderer
+from recipe.serializers import RecipeSerializer
+
+
+class Command(BaseCommand):
+    """Render and parse the recipe list payload of a seeded user with both implementations"""
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--runs', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'seeding {options["recipes"]} recipes...')
+        user = seed(recipes=options['recipes'], seed=options['seed'])[0]
+        recipes = Recipe.objects.for_user(user).with_attrs('tags', 'ingredients').order_by('-id')
+        data = RecipeSerializer(recipes[:options['recipes']], many=True).data
+        rendered = JSONRenderer().render(data)
+        self.stdout.write(f'payload: {len(data)} recipes, {len(rendered) / 1024 / 1024:.1f} MiB')
+
+        for name, renderer, parser in (
+            ('json', JSONRenderer(), JSONParser()),
+            ('orjson', ORJSONRenderer(), ORJSONParser()),
+        ):
+            stats = measure(lambda: renderer.render(data), options['runs'])
+            self.stdout.write(f'{name:<7} render {stats}')
+            stats = measure(lambda: parser.parse(io.BytesIO(rendered)), options['runs'])
+            self.stdout.write(f'{name:<7} parse  {stats}')
@@ -0,0 +1,121 @@
+"""
+Django command load testing the recipe and user API endpoints
+"""
+import json
+import subprocess
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from benchmarks.load import READ_SCENARIOS, SCENARIOS, run_scenario, serve
+from benchmarks.seed import LOADERS, seed
+from core.models import Recipe, Tag
+from user.authentication import token_cache
+
+# recipe ids per user the detail and update scenarios pick from
+SAMPLED_RECIPES = 1000
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    """
+    Seed a deterministic dataset, drive each endpoint scenario with concurrent keep-alive
+    clients and report RPS and p50/p95/p99 latency per endpoint, optionally saved as JSON
+    and compared with an earlier run
+    """
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=4)
+        parser.add_argument('--recipes', type=int, default=10000, help='recipes per user')
+        parser.add_argument('--tags', type=int, default=20, help='tags per user')
+        parser.add_argument('--ingredients', type=int, default=50, help='ingredients per user')
+        parser.add_argument('--per-recipe', type=int, default=3, help='tags and ingredients linked to each recipe')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--loader', choices=list(LOADERS), default='copy')
+        parser.add_argument(
+            '--scenarios', default=','.join(READ_SCENARIOS),
+            help=f'comma separated, of {", ".join(SCENARIOS)}; defaults to the read-only ones',
+        )
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=10, help='seconds per scenario')
+        parser.add_argument('--url', help='base URL of a running server, by default one is started in-process')
+        parser.add_argument('--output', help='write the results to this JSON file')
+        parser.add_argument('--compare', help='JSON results of an earlier run to compare with')
+
+    def handle(self, *args, **options):
+        scenarios = options['scenarios'].split(',')
+        unknown = [name for name in scenarios if name not in SCENARIOS]
+        if unknown:
+            raise CommandError(f'Unknown scenarios: {", ".join(unknown)}')
+
+        self.stdout.write(f'seeding {options["users"]} users x {options["recipes"]} recipes...')
+        users = [
+            {
+                'email': user.email,
+                'token': Token.objects.get_or_create(user=user)[0].key,
+                'recipes': list(
+                    Recipe.objects.filter(user=user).order_by('id').values_list('id', flat=True)[:SAMPLED_RECIPES]
+                ),
+                'tags': list(Tag.objects.filter(user=user).order_by('id').values_list('id', flat=True)),
+            }
+            for user in seed(
+                users=options['users'], recipes=options['recipes'], tags=options['tags'],
+                ingredients=options['ingredients'], per_recipe=options['per_recipe'],
+                seed=options['seed'], loader=options['loader'],
+            )
+        ]
+        token_cache.clear()
+
+        server = None
+        base_url = options['url']
+        if base_url is None:
+            base_url, server = serve()
+        try:
+            results = {}
+            for scenario in scenarios:
+                results[scenario] = run_scenario(
+                    base_url, scenario, users, options['concurrency'], options['duration'], options['seed'],
+                )
+                self.stdout.write(f'{scenario:<16} {results[scenario]}')
+        finally:
+            if server is not None:
+                server.shutdown()
+
+        report = {
+            'commit': git_commit(),
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'options': {
+                key: options[key] for key in (
+                    'users', 'recipes', 'tags', 'ingredients', 'per_recipe', 'seed', 'loader',
+                    'concurrency', 'duration', 'url',
+                )
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+        if options['compare']:
+            with open(options['compare']) as previous:
+                self.compare(json.load(previous), report)
+
+    def compare(self, previous, current):
+        self.stdout.write(f'compared with {previous.get("commit")} ({previous.get("started_at")}):')
+        for scenario, result in current['results'].items():
+            before = previous['results'].get(scenario)
+            if before is None or not result.get('requests') or not before.get('requests'):
+                continue
+            self.stdout.write(
+                f'{scenario:<16} rps {before["rps"]} -> {result["rps"]} ({result["rps"] / before["rps"] - 1:+.1%})'
+                f'  p95 {before["p95_ms"]} -> {result["p95_ms"]} ms'
+            )
@@ -0,0 +1,58 @@
+"""
+Django command comparing the query plans of the recipe tag/ingredient filters
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from benchmarks.seed import seed
+from benchmarks.timing import measure
+from core.models import Recipe, Tag, Ingredient
+
+
+class Command(BaseCommand):
+    """Compare the DISTINCT join filter with the EXISTS filters on a seeded dataset"""
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--filter-ids', type=int, default=3, help='ids passed to each of tags and ingredients')
+        parser.add_argument('--runs', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--explain', action='store_true', help='print EXPLAIN ANALYZE of every plan')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'seeding {options["recipes"]} recipes...')
+        user = seed(recipes=options['recipes'], seed=options['seed'])[0]
+        count = options['filter_ids']
+        tag_ids = list(Tag.objects.filter(user=user).order_by('id').values_list('id', flat=True)[:count])
+        ingredient_ids = list(Ingredient.objects.filter(user=user).order_by('id').values_list('id', flat=True)[:count])
+
+        plans = {
+            'distinct join': (
+                Recipe.objects.filter(user=user)
+                .filter(tags__id__in=tag_ids)
+                .filter(ingredients__id__in=ingredient_ids)
+                .order_by('-id')
+                .distinct()
+            ),
+            'exists any': (
+                Recipe.objects.for_user(user)
+                .filter_related('tags', tag_ids)
+                .filter_related('ingredients', ingredient_ids)
+                .order_by('-id')
+            ),
+            'exists all': (
+                Recipe.objects.for_user(user)
+                .filter_related('tags', tag_ids, 'all')
+                .filter_related('ingredients', ingredient_ids, 'all')
+                .order_by('-id')
+            ),
+        }
+        # the list endpoint reads one page plus one row to know whether there is a next page
+        limit = settings.API_PAGE_SIZE + 1
+        for name, queryset in plans.items():
+            for label, sliced in (('page', queryset[:limit]), ('full', queryset)):
+                stats = measure(lambda: list(sliced.all()), options['runs'])
+                self.stdout.write(f'{name:<14} {label:<5} {stats}')
+            if options['explain']:
+                self.stdout.write(queryset[:limit].explain(analyze=True, buffers=True))
@@ -0,0 +1,48 @@
+"""
+Django command comparing the full-text recipe search with an icontains scan
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from benchmarks.seed import seed
+from benchmarks.timing import measure
+from core.models import Recipe
+
+
+class Command(BaseCommand):
+    """Compare the ranked tsvector search with the icontains baseline on a seeded dataset"""
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1000000)
+        parser.add_argument('--query', default='spicy coconut')
+        parser.add_argument('--runs', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--explain', action='store_true', help='print EXPLAIN ANALYZE of every plan')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'seeding {options["recipes"]} recipes...')
+        user = seed(recipes=options['recipes'], seed=options['seed'])[0]
+        text = options['query']
+
+        contains = Q()
+        for word in text.split():
+            contains &= (
+                Q(title__icontains=word)
+                | Q(description__icontains=word)
+                | Q(tags__name__icontains=word)
+                | Q(ingredients__name__icontains=word)
+            )
+        plans = {
+            'icontains': Recipe.objects.filter(user=user).filter(contains).order_by('-id').distinct(),
+            'search': Recipe.objects.for_user(user).search(text).order_by('-rank', '-id'),
+        }
+        # the list endpoint reads one page plus one row to know whether there is a next page
+        limit = settings.API_PAGE_SIZE + 1
+        for name, queryset in plans.items():
+            sliced = queryset[:limit]
+            stats = measure(lambda: list(sliced.all()), options['runs'])
+            self.stdout.write(f'{name:<10} {stats}')
+            if options['explain']:
+                self.stdout.write(sliced.explain(analyze=True, buffers=True))
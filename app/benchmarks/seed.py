@@ -0,0 +1,149 @@
+"""
+Deterministic benchmark datasets.
+
+The same arguments always produce the same rows, so timings of different
+commits can be compared against identical data.
+"""
+import random
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.management.commands.import_recipes import copy_rows
+from core.models import Recipe, Tag, Ingredient
+
+BATCH_SIZE = 5000
+BENCH_PASSWORD = 'bench-password'
+WORDS = (
+    'apple', 'basil', 'butter', 'chicken', 'chili', 'cinnamon', 'coconut', 'curry', 'garlic', 'ginger',
+    'honey', 'lemon', 'lentil', 'mango', 'mushroom', 'noodle', 'onion', 'pasta', 'pepper', 'potato',
+    'rice', 'salmon', 'spinach', 'tomato', 'tofu', 'vanilla', 'roasted', 'spicy', 'creamy', 'crispy',
+)
+
+
+def bench_email(index, seed=0):
+    return f'bench-{seed}-{index}@example.com'
+
+
+def _sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def _recipe_values(rng, recipes):
+    """title, description, price and time_minutes of every recipe, drawn in a fixed order."""
+    for _ in range(recipes):
+        yield (
+            _sentence(rng, 3).title(),
+            _sentence(rng, 30),
+            Decimal(rng.randint(100, 99999)) / 100,
+            rng.randint(5, 180),
+        )
+
+
+def _refresh_denormalized(user):
+    Recipe.objects.filter(user=user).refresh_search_vector()
+    Recipe.objects.filter(user=user).refresh_cached_attrs()
+    Tag.objects.filter(user=user).refresh_recipe_count()
+    Ingredient.objects.filter(user=user).refresh_recipe_count()
+
+
+def _seed_user(user, rng, recipes, tags, ingredients, per_recipe):
+    tag_objs = Tag.objects.bulk_create([Tag(user=user, name=f'tag {i}') for i in range(tags)])
+    ingredient_objs = Ingredient.objects.bulk_create(
+        [Ingredient(user=user, name=f'ingredient {i}') for i in range(ingredients)]
+    )
+    recipe_objs = Recipe.objects.bulk_create(
+        (
+            Recipe(user=user, title=title, description=description, price=price, time_minutes=time_minutes)
+            for title, description, price, time_minutes in _recipe_values(rng, recipes)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    for relation, pool in (('tags', tag_objs), ('ingredients', ingredient_objs)):
+        through = getattr(Recipe, relation).through
+        column = Recipe._meta.get_field(relation).m2m_reverse_name()
+        k = min(per_recipe, len(pool))
+        through.objects.bulk_create(
+            (
+                through(recipe_id=recipe.id, **{column: obj.id})
+                for recipe in recipe_objs
+                for obj in rng.sample(pool, k)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+    # bulk_create skips the signals that maintain the search vector, the cached tags and
+    # ingredients and their recipe counts
+    _refresh_denormalized(user)
+
+
+def _reserve_ids(cursor, model, count):
+    table = model._meta.db_table
+    cursor.execute(
+        f"SELECT nextval(pg_get_serial_sequence('{table}', 'id')) FROM generate_series(1, %s)", [count]
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _copy_seed_user(user, rng, recipes, tags, ingredients, per_recipe):
+    """The rows _seed_user creates, written with COPY; the random draws happen in the same order."""
+    now = timezone.now().isoformat()
+    with connection.cursor() as cursor:
+        pools = {}
+        for relation, model, count, prefix in (
+            ('tags', Tag, tags, 'tag'), ('ingredients', Ingredient, ingredients, 'ingredient'),
+        ):
+            pools[relation] = _reserve_ids(cursor, model, count)
+            copy_rows(
+                cursor, model._meta.db_table, ('id', 'user_id', 'name', 'updated_at', 'recipe_count'),
+                ((pk, user.id, f'{prefix} {i}', now, 0) for i, pk in enumerate(pools[relation])),
+            )
+        recipe_ids = _reserve_ids(cursor, Recipe, recipes)
+        copy_rows(
+            cursor, Recipe._meta.db_table,
+            ('id', 'user_id', 'title', 'description', 'price', 'time_minutes', 'link', 'image_variants', 'updated_at'),
+            ((pk, user.id, *values, '', '[]', now) for pk, values in zip(recipe_ids, _recipe_values(rng, recipes))),
+        )
+        for relation in ('tags', 'ingredients'):
+            field = Recipe._meta.get_field(relation)
+            pool = pools[relation]
+            k = min(per_recipe, len(pool))
+            copy_rows(
+                cursor, field.remote_field.through._meta.db_table, ('recipe_id', field.m2m_reverse_name()),
+                ((recipe_id, pk) for recipe_id in recipe_ids for pk in rng.sample(pool, k)),
+            )
+    _refresh_denormalized(user)
+
+
+LOADERS = {'orm': _seed_user, 'copy': _copy_seed_user}
+
+
+def seed(users=1, recipes=1000, tags=20, ingredients=50, per_recipe=3, seed=0, loader='orm'):
+    """
+    Create `users` users owning `recipes` recipes each, every recipe linked to
+    `per_recipe` of the user's `tags` and `ingredients`. Users that already
+    exist are reused as they are, so seeding a large dataset only happens once.
+    The rows are written through the ORM or, with loader='copy', with COPY;
+    both produce the same data. Returns the users.
+    """
+    users_created = []
+    analyze = False
+    for index in range(users):
+        with transaction.atomic():
+            user, created = get_user_model().objects.get_or_create(
+                email=bench_email(index, seed),
+                defaults={'name': f'Bench user {index}'},
+            )
+            if created:
+                user.set_password(BENCH_PASSWORD)
+                user.save()
+                rng = random.Random(f'{seed}-{index}')
+                LOADERS[loader](user, rng, recipes, tags, ingredients, per_recipe)
+                analyze = True
+        users_created.append(user)
+    if analyze:
+        # refresh planner statistics so the seeded tables are not planned as empty
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+    return users_created
@@ -0,0 +1,116 @@
+"""
+Async views running the sync DRF views in a bounded thread pool, for the ASGI application.
+
+Django 3.2 has no async ORM and DRF no async views, so an async view hands the request to
+one of settings.ASGI_VIEW_THREADS threads and awaits the rendered response. Slow clients
+and idle keep-alive connections then cost the event loop a socket instead of a thread,
+while at most ASGI_VIEW_THREADS requests use the database at a time. The DRF view runs
+unchanged, authentication, permissions, caching and conditional requests included.
+
+Streaming responses, like the recipe export, query the database while their content is
+iterated, which Django 3.2 does on the event loop; iterate_pooled runs that iteration in a
+pool thread too.
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from core.instrumentation import track_queries
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.ASGI_VIEW_THREADS, thread_name_prefix='view')
+        return _executor
+
+
+def _run(view, request, args, kwargs):
+    # the pool threads keep their connections between requests, which request_started and
+    # request_finished only close in the thread Django runs them in
+    close_old_connections()
+    try:
+        with track_queries():
+            response = view(request, *args, **kwargs)
+            if hasattr(response, 'render') and callable(response.render):
+                response = response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def pooled(view):
+    """Async view running the sync view, DRF's csrf_exempt and viewset attributes kept."""
+
+    @functools.wraps(view)
+    async def pooled_view(request, *args, **kwargs):
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            executor(), context.run, _run, view, request, args, kwargs,
+        )
+
+    return pooled_view
+
+
+class _Raised:
+    def __init__(self, exc):
+        self.exc = exc
+
+
+_DONE = object()
+
+
+async def iterate_pooled(iterable):
+    """
+    Yield the items of iterable, iterated in one pool thread from start to end so that a
+    server-side cursor stays with its connection. One item is read ahead of the consumer;
+    the iteration stops when the consumer does.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=1)
+    stopped = threading.Event()
+
+    def put(item):
+        asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+    def produce():
+        close_old_connections()
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                put(item)
+                if stopped.is_set():
+                    return
+            put(_DONE)
+        except Exception as exc:
+            put(_Raised(exc))
+        finally:
+            if hasattr(iterator, 'close'):
+                iterator.close()
+            close_old_connections()
+
+    context = contextvars.copy_context()
+    producer = loop.run_in_executor(executor(), context.run, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                break
+            if isinstance(item, _Raised):
+                raise item.exc
+            yield item
+    finally:
+        stopped.set()
+        # frees a producer waiting to hand over its next item, which then sees stopped
+        while not queue.empty():
+            queue.get_nowait()
+        await producer
@@ -0,0 +1,62 @@
+"""
+PostgreSQL backend taking its connections from core.db.pool.
+
+Configured by the POOL entry of the database settings; without it, or with a MAX_SIZE of 0,
+it behaves as django.db.backends.postgresql.
+"""
+import functools
+
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.creation import DatabaseCreation as PostgresDatabaseCreation
+from django.utils.asyncio import async_unsafe
+
+from core.db.pool import close_pools, get_pool
+
+# alias of the connections Django opens to the postgres database, to create the test database
+NO_DB_ALIAS = '__no_db__'
+
+
+class DatabaseCreation(PostgresDatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # idle pooled connections, of any alias, would keep the test database from being dropped
+        close_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+    # the pool the open connection came from
+    _pool = None
+
+    @property
+    def pool(self):
+        """The pool of the current settings, looked up each time as the tests change NAME."""
+        options = self.settings_dict.get('POOL') or {}
+        if not options.get('MAX_SIZE') or self.alias == NO_DB_ALIAS:
+            return None
+        conn_params = self.get_connection_params()
+        key = (self.alias, tuple(sorted((name, str(value)) for name, value in conn_params.items())))
+        return get_pool(
+            key,
+            functools.partial(super().get_new_connection, conn_params),
+            options,
+        )
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        # the connection goes back to the pool it came from, whatever the settings are by then
+        self._pool = self.pool
+        if self._pool is None:
+            return super().get_new_connection(conn_params)
+        connection = self._pool.get()
+        self.isolation_level = self.settings_dict['OPTIONS'].get('isolation_level', connection.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is None or self._pool is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            # closed in an atomic block, the connection stays with this wrapper until the
+            # block rolls back, so it cannot serve anyone else
+            self._pool.put(self.connection, reuse=not self.in_atomic_block)
@@ -0,0 +1,221 @@
+"""
+In-process pool of database connections, shared by the threads of a process.
+
+Django opens a connection per thread and, with CONN_MAX_AGE 0, closes it at the end of
+every request. The postgresql backend of core.db takes connections from a pool instead and
+hands them back on close, so a request pays for a checkout rather than for TCP, auth and a
+backend fork. Connections are checked before reuse: closed ones and ones older than
+MAX_LIFETIME are dropped, ones idle for CHECK_AFTER seconds are pinged first. At most
+MAX_SIZE connections exist; a thread wanting one more waits up to TIMEOUT seconds.
+
+Pools belong to the process that opened them: a process forked from it, like the workers of
+a server that loads the application first, starts with no pools and opens its own.
+"""
+import logging
+import os
+import threading
+import time
+from collections import Counter, deque
+
+from psycopg2 import Error, OperationalError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class ConnectionPool:
+
+    def __init__(self, connect, max_size, timeout=10, check_after=30, max_lifetime=3600, **options):
+        self.connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_after = check_after
+        self.max_lifetime = max_lifetime
+        self.stats = Counter()
+        self._cond = threading.Condition()
+        # (connection, opened at, returned at) of the idle connections, the last returned at the end
+        self._idle = deque()
+        # opened at of the checked out connections
+        self._opened = {}
+        self._size = 0
+
+    def get(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.stats['timeouts'] += 1
+                        raise PoolTimeout(f'no free database connection within {self.timeout}s')
+                    self.stats['waits'] += 1
+                    self._cond.wait(remaining)
+                if self._idle:
+                    # the most recently used connection is the likeliest to be alive
+                    conn, opened, returned = self._idle.pop()
+                else:
+                    self._size += 1
+                    conn = None
+            if conn is None:
+                return self._open()
+            if self._usable(conn, opened, returned):
+                self.stats['reused'] += 1
+                with self._cond:
+                    self._opened[id(conn)] = opened
+                return conn
+            self._discard(conn)
+
+    def put(self, conn, reuse=True):
+        opened = self._opened.pop(id(conn), None)
+        if opened is None:
+            conn.close()
+            return
+        if not reuse:
+            self._discard(conn)
+            return
+        try:
+            if not conn.closed and conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except Error:
+            pass
+        if conn.closed or time.monotonic() - opened > self.max_lifetime:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, opened, time.monotonic()))
+            self._cond.notify()
+
+    def warm(self, count):
+        """Open connections until `count` are idle or the pool is full, returning how many were opened."""
+        opened = []
+        with self._cond:
+            missing = min(count - len(self._idle), self.max_size - self._size)
+        try:
+            for _ in range(max(missing, 0)):
+                with self._cond:
+                    if self._size >= self.max_size:
+                        break
+                    self._size += 1
+                opened.append(self._open())
+        finally:
+            for conn in opened:
+                self.put(conn)
+        return len(opened)
+
+    def close(self):
+        """Close the idle connections; checked out ones are closed when they come back."""
+        with self._cond:
+            idle, self._idle = self._idle, deque()
+        for conn, _, _ in idle:
+            self._discard(conn)
+
+    def _open(self):
+        try:
+            conn = self.connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        self.stats['opened'] += 1
+        with self._cond:
+            self._opened[id(conn)] = time.monotonic()
+        return conn
+
+    def _usable(self, conn, opened, returned):
+        now = time.monotonic()
+        if conn.closed or now - opened > self.max_lifetime:
+            return False
+        if now - returned < self.check_after:
+            return True
+        self.stats['checks'] += 1
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            # a connection returned with autocommit off is left in the ping's transaction
+            if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            return True
+        except Error:
+            logger.info('dropping a pooled database connection that failed its health check')
+            return False
+
+    def _discard(self, conn):
+        self.stats['discarded'] += 1
+        try:
+            conn.close()
+        except Error:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+# pools inherited over a fork, whose sockets the parent still uses
+_inherited = []
+
+
+def _forget_pools():
+    global _pools_lock
+    # kept referenced, as closing the connections, even by garbage collection, would end
+    # the parent's sessions
+    _inherited.extend(_pools.values())
+    _pools.clear()
+    _pools_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget_pools)
+
+
+def get_pool(key, connect, options):
+    """The pool of key, a database alias with its connection parameters."""
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(connect, **{name.lower(): value for name, value in options.items()})
+        return _pools[key]
+
+
+def close_pools(alias=None):
+    with _pools_lock:
+        pools = [pool for key, pool in _pools.items() if alias is None or key[0] == alias]
+    for pool in pools:
+        pool.close()
+
+
+def warm_pools(fail_silently=False):
+    """Open the MIN_SIZE connections of every pooled database, returning {alias: opened}."""
+    from django.db import connections
+
+    warmed = {}
+    for connection in connections.all():
+        pool = connection.pool if hasattr(connection, 'pool') else None
+        if pool is None:
+            continue
+        try:
+            warmed[connection.alias] = pool.warm(connection.settings_dict['POOL'].get('MIN_SIZE', 0))
+        except Error:
+            if not fail_silently:
+                raise
+            # the first requests open the connections instead
+            logger.warning('could not warm the connection pool of %s', connection.alias, exc_info=True)
+    return warmed
+
+
+def warm_pools_on_first_request():
+    """
+    Warm the pools when a process serves its first request, rather than on import, which
+    happens before the fork of servers that load the application first.
+    """
+    from django.core.signals import request_started
+
+    def warm(**kwargs):
+        request_started.disconnect(dispatch_uid=__name__)
+        warm_pools(fail_silently=True)
+
+    request_started.connect(warm, weak=False, dispatch_uid=__name__)
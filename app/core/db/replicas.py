@@ -0,0 +1,135 @@
+"""
+Routing of request reads to the read replicas of the default database.
+
+ReplicaReadsMiddleware lets the reads of GET, HEAD and OPTIONS requests go to one of the
+settings.REPLICA_READS['DATABASES'], picked at random per request; ReplicaRouter sends every
+other read, and every write, to default. Reads outside of requests, like management commands,
+and reads inside a transaction stay on default too.
+
+Replicas lag behind default, so a client that just wrote reads from default for
+STICKY_SECONDS afterwards: the response to the write sets the COOKIE, and marks the
+authenticated user in the CACHE for clients that ignore cookies, like most API clients.
+Anonymous writes, like signing up or obtaining a token, mark the user they wrote for
+with pin_reads(). The lookup of a token a replica doesn't have yet is retried on default
+(user.authentication), it is what tells whose pin applies.
+"""
+import asyncio
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.functional import SimpleLazyObject, empty
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_current = ContextVar('replica_reads', default=None)
+
+
+def _pin_key(user_id):
+    return f'replica-reads-pin:{user_id}'
+
+
+def _known_user(request):
+    """The user of request, None until an authentication has loaded it."""
+    user = request.__dict__.get('user')
+    if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+        return None
+    return user
+
+
+class ReplicaReads:
+    """Where the reads of one request go."""
+
+    def __init__(self, request, alias):
+        self.request = request
+        # the replica of the request, None when it reads from default
+        self.alias = alias
+        self._user_checked = False
+
+    def db_for_read(self):
+        if self.alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        if not self._user_checked:
+            user = _known_user(self.request)
+            if user is not None:
+                self._user_checked = True
+                if user.is_authenticated and caches[settings.REPLICA_READS['CACHE']].get(_pin_key(user.pk)):
+                    self.alias = None
+                    return DEFAULT_DB_ALIAS
+        return self.alias
+
+
+def read_alias():
+    """The database the reads of the current request go to, as far as known yet."""
+    reads = _current.get()
+    return reads.db_for_read() if reads is not None else DEFAULT_DB_ALIAS
+
+
+def pin_reads(request, user):
+    """Pin the reads of user to default after the write of request, which was made for them."""
+    getattr(request, '_request', request)._replica_reads_user = user
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replicas hold the same rows as default
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in settings.REPLICA_READS['DATABASES']
+
+
+class ReplicaReadsMiddleware:
+    """Route the reads of the request, pinning the client to default after a write; see the module docstring."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def _reads(self, request):
+        options = settings.REPLICA_READS
+        alias = None
+        if options['DATABASES'] and request.method in SAFE_METHODS and options['COOKIE'] not in request.COOKIES:
+            alias = random.choice(options['DATABASES'])
+        return ReplicaReads(request, alias)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        token = _current.set(self._reads(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response)
+
+    async def __acall__(self, request):
+        token = _current.set(self._reads(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response)
+
+    def _finish(self, request, response):
+        options = settings.REPLICA_READS
+        if options['DATABASES'] and request.method not in SAFE_METHODS and response.status_code < 400:
+            response.set_cookie(
+                options['COOKIE'], '1', max_age=options['STICKY_SECONDS'], httponly=True, samesite='Lax',
+            )
+            user = getattr(request, '_replica_reads_user', None) or _known_user(request)
+            if user is not None and user.is_authenticated:
+                caches[options['CACHE']].set(_pin_key(user.pk), True, options['STICKY_SECONDS'])
+        return response
@@ -0,0 +1,245 @@
+"""
+Per-request performance instrumentation.
+
+PerformanceMiddleware times every request and files the latency under its view and action.
+A sampled share of the requests (settings.PERF_METRICS['SAMPLE_RATE']) is also broken down
+into database, serializer and render time: queries are timed by a connection execute_wrapper,
+serializers and the renderer report through timer(). The breakdown of a request goes out in
+its Server-Timing header, the aggregates are served in the Prometheus text format by
+metrics_view. Metrics are kept per process, Prometheus has to scrape every worker.
+Under ASGI the queries are timed for the views run by core.asyncviews.
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+from recipe.cache import response_cache
+
+# timed parts of a sampled request, as reported in Server-Timing
+PARTS = ('db', 'serialize', 'render')
+
+_current = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """Time spent per part of one sampled request, and its query count."""
+
+    def __init__(self):
+        self.durations = dict.fromkeys(PARTS, 0.0)
+        self.queries = 0
+        self._running = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        """execute_wrapper timing every query of the request."""
+        with self.timer('db'):
+            self.queries += 1
+            return execute(sql, params, many, context)
+
+    @contextmanager
+    def timer(self, part):
+        # nested timers of the same part, like a serializer inside another, count once
+        if part in self._running:
+            yield
+            return
+        self._running.add(part)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[part] += time.perf_counter() - started
+            self._running.discard(part)
+
+
+@contextmanager
+def timer(part):
+    """Add the time spent in the block to part of the current request, if it is sampled."""
+    timings = _current.get()
+    if timings is None:
+        yield
+    else:
+        with timings.timer(part):
+            yield
+
+
+@contextmanager
+def track_queries():
+    """Time the queries of this thread's connections for the current request, if it is sampled."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timings))
+        yield
+
+
+class TimedSerializerMixin:
+    """Report the time spent producing serializer.data as serialize time."""
+
+    @property
+    def data(self):
+        with timer('serialize'):
+            return super().data
+
+
+class Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            index = len(self.buckets)
+        self.counts[index] += 1
+        self.sum += value
+
+
+class Registry:
+    """Request counters and latency histograms of this process by (view, action)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = defaultdict(int)
+            self.queries = defaultdict(int)
+            self.histograms = {}
+
+    def _histogram(self, name, labels):
+        key = (name, labels)
+        if key not in self.histograms:
+            self.histograms[key] = Histogram(settings.PERF_METRICS['BUCKETS'])
+        return self.histograms[key]
+
+    def record(self, view, action, status, total, timings):
+        labels = (('view', view), ('action', action))
+        with self._lock:
+            self.requests[labels + (('status', str(status)),)] += 1
+            self._histogram('http_request_duration_seconds', labels).observe(total)
+            if timings is not None:
+                self.queries[labels] += timings.queries
+                for part, duration in timings.durations.items():
+                    self._histogram(f'http_request_{part}_seconds', labels).observe(duration)
+
+    def render(self):
+        """The metrics in the Prometheus text exposition format."""
+        lines = []
+
+        def sample(name, labels, value):
+            formatted = ','.join(f'{key}="{value}"' for key, value in labels)
+            lines.append(f'{name}{{{formatted}}} {value}')
+
+        with self._lock:
+            lines.append('# TYPE http_requests_total counter')
+            for labels, count in sorted(self.requests.items()):
+                sample('http_requests_total', labels, count)
+            lines.append('# TYPE http_request_db_queries_total counter')
+            for labels, count in sorted(self.queries.items()):
+                sample('http_request_db_queries_total', labels, count)
+            declared = set()
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                if name not in declared:
+                    lines.append(f'# TYPE {name} histogram')
+                    declared.add(name)
+                cumulative = 0
+                for bound, count in zip(list(histogram.buckets) + ['+Inf'], histogram.counts):
+                    cumulative += count
+                    sample(f'{name}_bucket', labels + (('le', str(bound)),), cumulative)
+                sample(f'{name}_sum', labels, histogram.sum)
+                sample(f'{name}_count', labels, cumulative)
+        lines.append('# TYPE response_cache_requests_total counter')
+        for (endpoint, result), count in sorted(response_cache.stats.items()):
+            sample('response_cache_requests_total', (('endpoint', endpoint), ('result', result)), count)
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def server_timing(total, timings):
+    entries = []
+    if timings is not None:
+        entries.append(f'db;dur={timings.durations["db"] * 1000:.1f};desc="{timings.queries} queries"')
+        entries.extend(f'{part};dur={timings.durations[part] * 1000:.1f}' for part in PARTS[1:])
+    entries.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(entries)
+
+
+class PerformanceMiddleware:
+    """Time each request, sampling the breakdown; see the module docstring."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # lets the ASGI handler await this middleware without a thread hop
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def _sample(self):
+        return RequestTimings() if random.random() < settings.PERF_METRICS['SAMPLE_RATE'] else None
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        timings = self._sample()
+        token = _current.set(timings)
+        try:
+            with track_queries():
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, started, timings)
+
+    async def __acall__(self, request):
+        # the queries are timed by the thread running the view, see core.asyncviews
+        started = time.perf_counter()
+        timings = self._sample()
+        token = _current.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, started, timings)
+
+    def _finish(self, request, response, started, timings):
+        total = time.perf_counter() - started
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        actions = getattr(match.func, 'actions', None) if match else None
+        action = (actions or {}).get(request.method.lower(), request.method.lower())
+        registry.record(view, action, response.status_code, total, timings)
+        response['Server-Timing'] = server_timing(total, timings)
+        return response
+
+
+def metrics_view(request):
+    """
+    Serve the metrics to staff users logged in to the admin, and to scrapers sending
+    settings.PERF_METRICS['TOKEN'] as a bearer token when it is set. DEBUG opens nothing.
+    """
+    token = settings.PERF_METRICS['TOKEN']
+    allowed = request.user.is_staff or (
+        bool(token) and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    )
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,37 @@
+"""
+Batched check-and-repair loop shared by the commands fixing denormalized columns.
+"""
+import time
+
+from django.db import transaction
+
+from recipe.cache import response_cache
+
+
+def repair_in_batches(rows, is_stale, repair, batch_size, stdout, name):
+    """
+    Walk rows, a values() queryset selecting at least id and user_id, in batches by id.
+    repair(ids) is called in a transaction with the ids of the rows of a batch is_stale(row)
+    picks, and the response cache of their users is bumped. Progress goes to stdout, counting
+    the rows as name. Returns (repaired, checked).
+    """
+    checked = repaired = 0
+    last_id = 0
+    started = time.monotonic()
+    while True:
+        batch = list(rows.filter(id__gt=last_id).order_by('id')[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1]['id']
+        stale = [row for row in batch if is_stale(row)]
+        if stale:
+            with transaction.atomic():
+                # recomputed rather than written from the rows, which may have changed since
+                repair([row['id'] for row in stale])
+            for user_id in {row['user_id'] for row in stale}:
+                response_cache.bump(user_id)
+        checked += len(batch)
+        repaired += len(stale)
+        elapsed = time.monotonic() - started
+        stdout.write(f'{checked} {name} checked in {elapsed:.1f}s ({checked / max(elapsed, 1e-9):.0f}/s)')
+    return repaired, checked
@@ -0,0 +1,110 @@
+"""
+Django command to delete recipe image files that nothing references
+"""
+import os
+import time
+from functools import reduce
+from operator import or_
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from core.models import ImageBlob, Recipe
+from core.storage import blob_sha
+
+UPLOAD_DIR = os.path.join('uploads', 'recipe')
+
+
+def walk(root, directory=''):
+    """Yield (name relative to root, DirEntry) of every file below root/directory, one directory at a time."""
+    with os.scandir(os.path.join(root, directory)) as entries:
+        for entry in entries:
+            name = os.path.join(directory, entry.name)
+            if entry.is_dir(follow_symlinks=False):
+                yield from walk(root, name)
+            else:
+                yield name, entry
+
+
+def owner_stem(name):
+    """Name without extension and variant suffix: uploads/recipe/x-320.webp -> uploads/recipe/x"""
+    stem = os.path.splitext(name)[0]
+    base, _, width = stem.rpartition('-')
+    return base if base and width.isdigit() and len(width) <= 5 else stem
+
+
+class Command(BaseCommand):
+    """Django command to delete recipe image files that nothing references"""
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='only list the files that would be deleted')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--grace-seconds', type=int, default=3600,
+            help='keep files younger than this, they may belong to an upload in progress',
+        )
+        parser.add_argument(
+            '--reconcile', action='store_true',
+            help='recount blob references from the recipes first, fixing references leaked by failed saves',
+        )
+
+    def handle(self, *args, **options):
+        storage = Recipe._meta.get_field('image').storage
+        if options['reconcile']:
+            self.reconcile()
+        root = storage.path(UPLOAD_DIR)
+        if not os.path.isdir(root):
+            self.stdout.write('nothing to collect')
+            return
+
+        cutoff = time.time() - options['grace_seconds']
+        scanned = deleted = 0
+        batch = []
+        for name, entry in walk(root):
+            scanned += 1
+            if entry.stat().st_mtime < cutoff:
+                batch.append(os.path.join(UPLOAD_DIR, name))
+            if len(batch) >= options['batch_size']:
+                deleted += self.collect(batch, storage, options['dry_run'])
+                batch = []
+        deleted += self.collect(batch, storage, options['dry_run'])
+
+        verb = 'would delete' if options['dry_run'] else 'deleted'
+        self.stdout.write(self.style.SUCCESS(f'scanned {scanned} files, {verb} {deleted}'))
+
+    def reconcile(self):
+        references = (
+            Recipe.objects.filter(image=OuterRef('name'))
+            .values('image')
+            .annotate(total=Count('id'))
+            .values('total')
+        )
+        ImageBlob.objects.update(ref_count=Coalesce(Subquery(references), Value(0)))
+        ImageBlob.objects.filter(ref_count=0).delete()
+
+    def live_stems(self, stems):
+        """The stems of a batch still referenced by a blob or, for older uploads, by a recipe."""
+        shas = {stem: blob_sha(stem) for stem in stems}
+        live = set(
+            ImageBlob.objects.filter(sha256__in=[sha for sha in shas.values() if sha], ref_count__gt=0)
+            .values_list('sha256', flat=True)
+        )
+        live_stems = {stem for stem, sha in shas.items() if sha in live}
+        legacy = [stem for stem, sha in shas.items() if sha is None]
+        if legacy:
+            query = reduce(or_, (Q(image__startswith=f'{stem}.') for stem in legacy))
+            live_stems.update(owner_stem(name) for name in Recipe.objects.filter(query).values_list('image', flat=True))
+        return live_stems
+
+    def collect(self, names, storage, dry_run):
+        if not names:
+            return 0
+        live = self.live_stems({owner_stem(name) for name in names})
+        orphans = [name for name in names if owner_stem(name) not in live]
+        for name in orphans:
+            self.stdout.write(name)
+            if not dry_run:
+                os.remove(storage.path(name))
+        return len(orphans)
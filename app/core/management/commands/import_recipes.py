@@ -0,0 +1,195 @@
+"""
+Django command to import recipes from NDJSON or CSV, as written by the recipe export
+"""
+import csv
+import io
+import json
+import sys
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+from rest_framework.exceptions import ValidationError
+
+from core.models import Recipe
+from recipe.cache import response_cache
+from recipe.export import CSV_NAME_SEPARATOR
+from recipe.serializers import RecipeBulkSerializer
+
+RELATIONS = ('tags', 'ingredients')
+# columns of core_recipe filled from the input, the others get their model defaults
+STAGED_FIELDS = ('title', 'description', 'price', 'time_minutes', 'link')
+MAX_REPORTED_ERRORS = 100
+
+
+def read_ndjson(lines):
+    """Yield (line number, row) of every non-blank line, or (line number, ValidationError)."""
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as exc:
+            yield number, ValidationError(f'Invalid JSON: {exc}')
+
+
+def read_csv(lines):
+    reader = csv.DictReader(lines)
+    for row in reader:
+        for relation in RELATIONS:
+            names = row.get(relation)
+            row[relation] = names.split(CSV_NAME_SEPARATOR) if names else []
+        yield reader.line_num, row
+
+
+def normalize(row):
+    """Accept tags and ingredients given as names as well as {'name': ...} objects."""
+    if isinstance(row, dict):
+        row.pop('id', None)
+        for relation in RELATIONS:
+            if isinstance(row.get(relation), list):
+                row[relation] = [{'name': attr} if isinstance(attr, str) else attr for attr in row[relation]]
+    return row
+
+
+def copy_rows(cursor, table, columns, rows):
+    """COPY rows into table through an in-memory CSV buffer, every value quoted so '' stays ''."""
+    buffer = io.StringIO()
+    csv.writer(buffer, quoting=csv.QUOTE_ALL).writerows(rows)
+    buffer.seek(0)
+    cursor.copy_expert(f'COPY {table} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)', buffer)
+
+
+class Command(BaseCommand):
+    """
+    Validate every row against the recipe API rules, COPY the valid ones into staging tables
+    and merge them into the recipe, tag, ingredient and through tables, one transaction per batch
+    """
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='file to import, - for stdin')
+        parser.add_argument('--user', required=True, help='email of the user owning the imported recipes')
+        parser.add_argument('--format', choices=['ndjson', 'csv'], help='defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'No user with email {options["user"]}')
+        path = options['path']
+        file_format = options['format'] or ('csv' if path.endswith('.csv') else 'ndjson')
+        read = read_csv if file_format == 'csv' else read_ndjson
+
+        serializer = RecipeBulkSerializer()
+        imported = invalid = 0
+        started = time.monotonic()
+        source = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        with source:
+            batch = []
+            for number, row in read(source):
+                try:
+                    if isinstance(row, ValidationError):
+                        raise row
+                    batch.append(serializer.run_validation(normalize(row)))
+                except ValidationError as exc:
+                    invalid += 1
+                    if invalid <= MAX_REPORTED_ERRORS:
+                        self.stderr.write(f'line {number}: {json.dumps(exc.detail)}')
+                    continue
+                if len(batch) == options['batch_size']:
+                    imported += self.import_batch(user, batch)
+                    batch = []
+                    self.report(imported, started)
+            if batch:
+                imported += self.import_batch(user, batch)
+
+        self.report(imported, started)
+        self.stdout.write(self.style.SUCCESS(f'Imported {imported} recipes, skipped {invalid} invalid rows'))
+
+    def report(self, imported, started):
+        elapsed = time.monotonic() - started
+        self.stdout.write(f'{imported} rows in {elapsed:.1f}s ({imported / max(elapsed, 1e-9):.0f} rows/s)')
+
+    def import_batch(self, user, batch):
+        """Write one batch of validated rows with a few set-based statements, returning the recipe count."""
+        recipe_table = Recipe._meta.db_table
+        # what saving a new Recipe() would write, auto_now included
+        blank = Recipe()
+        defaults = [
+            (field.column, field.get_db_prep_save(field.pre_save(blank, True), connection))
+            for field in Recipe._meta.concrete_fields
+            if not field.primary_key and field.name != 'user' and field.name not in STAGED_FIELDS
+        ]
+        with transaction.atomic(), connection.cursor() as cursor:
+            # ids come from the recipe sequence so the through rows can be joined before the merge
+            cursor.execute(
+                f'''
+                CREATE TEMP TABLE import_recipe (
+                    item integer PRIMARY KEY,
+                    id bigint NOT NULL DEFAULT nextval(pg_get_serial_sequence('{recipe_table}', 'id')),
+                    title varchar(255), description text, price numeric, time_minutes integer, link varchar(255)
+                )
+                '''
+            )
+            cursor.execute('CREATE TEMP TABLE import_recipe_attr (item integer, relation text, name varchar(255))')
+            copy_rows(
+                cursor, 'import_recipe', ('item',) + STAGED_FIELDS,
+                (
+                    [item] + [attrs.get(name, Recipe._meta.get_field(name).get_default()) for name in STAGED_FIELDS]
+                    for item, attrs in enumerate(batch)
+                ),
+            )
+            copy_rows(
+                cursor, 'import_recipe_attr', ('item', 'relation', 'name'),
+                (
+                    (item, relation, attr['name'])
+                    for item, attrs in enumerate(batch)
+                    for relation in RELATIONS
+                    for attr in attrs.get(relation, ())
+                ),
+            )
+
+            for relation in RELATIONS:
+                model = Recipe._meta.get_field(relation).related_model
+                cursor.execute(
+                    f'''
+                    INSERT INTO {model._meta.db_table} (user_id, name, updated_at, recipe_count)
+                    SELECT DISTINCT %s, name, now(), 0 FROM import_recipe_attr WHERE relation = %s
+                    ON CONFLICT DO NOTHING
+                    ''',
+                    [user.id, relation],
+                )
+            columns = ', '.join(column for column, _ in defaults)
+            cursor.execute(
+                f'''
+                INSERT INTO {recipe_table} (id, user_id, {', '.join(STAGED_FIELDS)}, {columns})
+                SELECT id, %s, {', '.join(STAGED_FIELDS)}, {', '.join(['%s'] * len(defaults))}
+                FROM import_recipe
+                ''',
+                [user.id] + [value for _, value in defaults],
+            )
+            imported = cursor.rowcount
+            for relation in RELATIONS:
+                field = Recipe._meta.get_field(relation)
+                cursor.execute(
+                    f'''
+                    INSERT INTO {field.remote_field.through._meta.db_table} (recipe_id, {field.m2m_reverse_name()})
+                    SELECT DISTINCT r.id, a.id
+                    FROM import_recipe r
+                    JOIN import_recipe_attr i ON i.item = r.item AND i.relation = %s
+                    JOIN {field.related_model._meta.db_table} a ON a.user_id = %s AND a.name = i.name
+                    ''',
+                    [relation, user.id],
+                )
+            imported_recipes = Recipe.objects.filter(id__in=RawSQL('SELECT id FROM import_recipe', []))
+            imported_recipes.refresh_search_vector()
+            imported_recipes.refresh_cached_attrs()
+            for relation in RELATIONS:
+                Recipe._meta.get_field(relation).related_model.objects.count_recipes(imported_recipes.values('pk'))
+            cursor.execute('DROP TABLE import_recipe, import_recipe_attr')
+            response_cache.bump(user.id)
+        return imported
@@ -0,0 +1,43 @@
+"""
+Django command to fix the recipe counts of tags and ingredients
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models.functions import Coalesce
+
+from core.management.batches import repair_in_batches
+from core.models import Ingredient, Tag
+
+
+class Command(BaseCommand):
+    """
+    Compare recipe_count of every tag and ingredient with the number of recipes linked to it,
+    in batches by id, and recount the ones that drifted
+    """
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='email of the user whose tags and ingredients to fix, by default all users')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = get_user_model().objects.get(email=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f'No user with email {options["user"]}')
+
+        for model in (Tag, Ingredient):
+            objs = model.objects.all() if user is None else model.objects.filter(user=user)
+            self._reconcile(objs, model._meta.verbose_name_plural, options['batch_size'])
+
+    def _reconcile(self, objs, name, batch_size):
+        rows = objs.values('id', 'user_id', 'recipe_count').annotate(linked=Coalesce(objs.linked_count(), 0))
+        fixed, checked = repair_in_batches(
+            rows,
+            lambda row: row['recipe_count'] != row['linked'],
+            lambda ids: objs.filter(id__in=ids).refresh_recipe_count(),
+            batch_size, self.stdout, name,
+        )
+        self.stdout.write(self.style.SUCCESS(f'Fixed {fixed} of {checked} {name}'))
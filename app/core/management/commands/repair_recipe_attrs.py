@@ -0,0 +1,40 @@
+"""
+Django command to rebuild the cached tags and ingredients of recipes
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.management.batches import repair_in_batches
+from core.models import Recipe
+
+
+class Command(BaseCommand):
+    """
+    Compare the cached_tags and cached_ingredients columns of every recipe with its tags and
+    ingredients, in batches of recipes by id, and rebuild the ones that are missing or stale
+    """
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='email of the user whose recipes to repair, by default all users')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.all()
+        if options['user']:
+            try:
+                recipes = recipes.for_user(get_user_model().objects.get(email=options['user']))
+            except get_user_model().DoesNotExist:
+                raise CommandError(f'No user with email {options["user"]}')
+
+        rows = recipes.values('id', 'user_id', 'cached_tags', 'cached_ingredients').annotate(
+            tags=recipes.aggregated_attrs('tags', cached=False),
+            ingredients=recipes.aggregated_attrs('ingredients', cached=False),
+        )
+        repaired, checked = repair_in_batches(
+            rows,
+            lambda row: row['cached_tags'] != row['tags'] or row['cached_ingredients'] != row['ingredients'],
+            lambda ids: Recipe.objects.filter(id__in=ids).refresh_cached_attrs(),
+            options['batch_size'], self.stdout, 'recipes',
+        )
+        self.stdout.write(self.style.SUCCESS(f'Repaired {repaired} of {checked} recipes'))
@@ -8,9 +8,14 @@ from django.db.utils import OperationalError
 
 from django.core.management.base import BaseCommand
 
+from core.db.pool import warm_pools
+
 
 class Command(BaseCommand):
-    """Django command to wait for database connection"""
+    """
+    Django command to wait for database connection, then to open the pooled connections
+    opened at startup, checking the database accepts them
+    """
     def handle(self, *args, **options):
         self.stdout.write('waiting for database...')
         db_up = False
@@ -23,4 +28,5 @@ class Command(BaseCommand):
                 time.sleep(1)
 
         self.stdout.write(self.style.SUCCESS('Database available!'))
-        pass
+        for alias, opened in warm_pools().items():
+            self.stdout.write(f'Warmed the {alias} connection pool with {opened} connections')
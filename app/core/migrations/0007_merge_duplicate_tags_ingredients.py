@@ -0,0 +1,40 @@
+# Generated by Django 3.2.25 on 2026-10-17 07:15
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicates(apps, schema_editor):
+    """Merge tags/ingredients sharing (user, name) into the oldest row before the unique constraint."""
+    Recipe = apps.get_model('core', 'Recipe')
+    for model_name, relation in (('Tag', 'tags'), ('Ingredient', 'ingredients')):
+        model = apps.get_model('core', model_name)
+        through = getattr(Recipe, relation).through
+        column = f'{model_name.lower()}_id'
+        duplicates = (
+            model.objects.values('user_id', 'name')
+            .annotate(keep=Min('id'), total=Count('id'))
+            .filter(total__gt=1)
+        )
+        for duplicate in duplicates:
+            ids = list(
+                model.objects.filter(user_id=duplicate['user_id'], name=duplicate['name']).values_list('id', flat=True)
+            )
+            links = through.objects.filter(**{f'{column}__in': ids})
+            recipe_ids = set(links.values_list('recipe_id', flat=True))
+            links.delete()
+            through.objects.bulk_create(
+                [through(recipe_id=recipe_id, **{column: duplicate['keep']}) for recipe_id in recipe_ids]
+            )
+            model.objects.filter(id__in=ids).exclude(id=duplicate['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_recipe_image'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.2.25 on 2026-10-17 09:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    The columns start out NULL on existing recipes, which are read by joining their tags and
+    ingredients until the repair_recipe_attrs command fills them; new recipes get [].
+    """
+
+    dependencies = [
+        ('core', '0013_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='cached_ingredients',
+            field=models.JSONField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='cached_tags',
+            field=models.JSONField(editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='cached_ingredients',
+            field=models.JSONField(default=list, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='cached_tags',
+            field=models.JSONField(default=list, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.2.25 on 2026-10-17 08:54
+
+from django.db import migrations, models
+
+# same counts as RecipeAttrQuerySet.refresh_recipe_count, filled in before the indexes are built
+POPULATE_RECIPE_COUNT = """
+UPDATE core_{model} SET recipe_count = links.count
+FROM (SELECT {model}_id, count(*) AS count FROM core_recipe_{relation} GROUP BY {model}_id) links
+WHERE links.{model}_id = core_{model}.id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_recipe_cached_attrs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunSQL(
+            POPULATE_RECIPE_COUNT.format(model='ingredient', relation='ingredients'), migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(POPULATE_RECIPE_COUNT.format(model='tag', relation='tags'), migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', '-recipe_count', 'id'], name='ingredient_user_usage_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', '-recipe_count', 'id'], name='tag_user_usage_idx'),
+        ),
+    ]
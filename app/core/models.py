@@ -1,11 +1,22 @@
 """database models"""
+import itertools
 import os
 import uuid
-from django.db import models
+from django.contrib.postgres.aggregates import JSONBAgg, StringAgg
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, SearchVectorField
+from django.db import models, transaction
+from django.db.models import Count, Exists, F, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Coalesce, JSONObject, Now
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 
 from django.conf import settings
 
+from core.storage import ContentAddressedStorage, CountedImageField, blob_sha
+
+# text search configuration of Recipe.search_vector and the queries matched against it
+SEARCH_CONFIG = 'english'
+
 
 def recipe_image_file_path(instance, filename):
     """Generate file path for new recipe image."""
@@ -47,6 +58,205 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'email'
 
 
+class ImageBlobQuerySet(models.QuerySet):
+    """
+    Reference counting of content-addressed image files.
+    The blob row is locked while a file is written or deleted, so an upload of the same
+    bytes can't slip in between the last reference going away and the file being removed.
+    Names that are not content-addressed (older uploads) are not counted.
+    """
+
+    def acquire(self, name, write=None):
+        """Add a reference to the blob stored as name, calling write() to store its bytes first."""
+        sha = blob_sha(name)
+        if sha is None:
+            if write is not None:
+                write()
+            return
+        with transaction.atomic():
+            self.select_for_update().get_or_create(sha256=sha, defaults={'name': name})
+            if write is not None:
+                write()
+            self.filter(pk=sha).update(ref_count=F('ref_count') + 1)
+
+    def release(self, name, storage):
+        """
+        Drop a reference to the blob stored as name, deleting its files with the last one.
+        The files go once the transaction commits, so a rollback that restores the reference
+        finds them still there.
+        """
+        sha = blob_sha(name)
+        if sha is None:
+            return
+        released = self.filter(pk=sha, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+        if released:
+            transaction.on_commit(lambda: self._collect(sha, name, storage))
+
+    def _collect(self, sha, name, storage):
+        # the row is kept at zero until now, so an upload of the same bytes in between
+        # locks it and takes the reference back instead of losing its file
+        with transaction.atomic():
+            blob = self.select_for_update().filter(pk=sha, ref_count=0).first()
+            if blob is None:
+                return
+            blob.delete()
+            storage.delete_blob(name)
+
+
+class ImageBlob(models.Model):
+    """A stored image file and the number of recipes referencing it."""
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    name = models.CharField(max_length=255)
+    ref_count = models.PositiveIntegerField(default=0)
+
+    objects = ImageBlobQuerySet.as_manager()
+
+    def __str__(self):
+        return self.name
+
+
+class RecipeQuerySet(models.QuerySet):
+    """QuerySet for recipes with prefetch plans for the nested relations."""
+
+    def for_user(self, user):
+        return self.filter(user=user)
+
+    def filter_related(self, relation, ids, match='any'):
+        """
+        Keep recipes linked to any (or, with match='all', every one) of the given tag/ingredient ids.
+        Uses EXISTS semi-joins on the through table, so rows are never multiplied and no DISTINCT is needed.
+        """
+        field = self.model._meta.get_field(relation)
+        links = field.remote_field.through.objects.filter(**{field.m2m_field_name(): OuterRef('pk')})
+        target = field.m2m_reverse_field_name()
+        ids = set(ids)
+        if match == 'all':
+            queryset = self
+            for pk in ids:
+                queryset = queryset.filter(Exists(links.filter(**{target: pk})))
+            return queryset
+        return self.filter(Exists(links.filter(**{f'{target}__in': ids})))
+
+    def search(self, text):
+        """
+        Recipes matching a web-search style query, annotated with their rank.
+        ts_rank returns a real; the rank is cast to double so it round-trips through a cursor.
+        """
+        query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+        rank = Cast(SearchRank(F('search_vector'), query), models.FloatField())
+        return self.filter(search_vector=query).annotate(rank=rank)
+
+    def refresh_search_vector(self):
+        """
+        Recompute search_vector of these recipes with a single UPDATE: title weighs most,
+        then tag and ingredient names, then the description.
+        """
+        def names(model):
+            return Coalesce(
+                Subquery(
+                    model.objects.filter(recipes=OuterRef('pk'))
+                    .values('recipes')
+                    .annotate(names=StringAgg('name', ' '))
+                    .values('names')
+                ),
+                Value(''),
+            )
+
+        return self.update(search_vector=(
+            SearchVector('title', weight='A', config=SEARCH_CONFIG)
+            + SearchVector(names(Tag), weight='B', config=SEARCH_CONFIG)
+            + SearchVector(names(Ingredient), weight='B', config=SEARCH_CONFIG)
+            + SearchVector('description', weight='C', config=SEARCH_CONFIG)
+        ))
+
+    def aggregated_attrs(self, relation, cached=True):
+        """
+        The recipe's tags or ingredients as a JSON list of {'id', 'name'} ordered by id, read
+        from its cached_<relation> column when that is filled and settings.RECIPE_CACHED_ATTRS
+        is on, aggregated from the relation otherwise.
+        """
+        related_model = self.model._meta.get_field(relation).related_model
+        aggregated = Subquery(
+            related_model.objects.filter(recipes=OuterRef('pk'))
+            .values('recipes')
+            .annotate(items=JSONBAgg(JSONObject(id='id', name='name'), ordering='id'))
+            .values('items')
+        )
+        empty = Value([], output_field=models.JSONField())
+        if cached and settings.RECIPE_CACHED_ATTRS:
+            # COALESCE stops at the column, the subquery only runs for rows not filled yet
+            return Coalesce(F(f'cached_{relation}'), aggregated, empty)
+        return Coalesce(aggregated, empty)
+
+    def refresh_cached_attrs(self):
+        """
+        Recompute cached_tags and cached_ingredients of these recipes with a single UPDATE,
+        marking them modified as their nested tags and ingredients changed.
+        """
+        return self.update(
+            cached_tags=self.aggregated_attrs('tags', cached=False),
+            cached_ingredients=self.aggregated_attrs('ingredients', cached=False),
+            updated_at=Now(),
+        )
+
+    def with_attrs(self, *relations):
+        """
+        Load the given tag/ingredient relations as {'id', 'name'} ordered by id: annotated as
+        <relation>_attrs from the cached columns, or prefetched loading only id and name when
+        settings.RECIPE_CACHED_ATTRS is off.
+        """
+        if settings.RECIPE_CACHED_ATTRS:
+            # the annotations carry the columns, no need to load them twice
+            return self.defer(*(f'cached_{relation}' for relation in relations)).annotate(
+                **{f'{relation}_attrs': self.aggregated_attrs(relation) for relation in relations}
+            )
+        lookups = []
+        for relation in relations:
+            related_model = self.model._meta.get_field(relation).related_model
+            lookups.append(
+                models.Prefetch(relation, queryset=related_model.objects.only('id', 'name').order_by('id'))
+            )
+        return self.prefetch_related(*lookups)
+
+    def release_attr_counts(self):
+        """
+        Take these recipes out of recipe_count of their tags and ingredients, before they are
+        deleted: the cascade removes their links without sending m2m_changed.
+        """
+        for relation in ('tags', 'ingredients'):
+            related_model = self.model._meta.get_field(relation).related_model
+            related_model.objects.count_recipes(self.values('pk'), sign=-1)
+
+    def delete(self):
+        # without a savepoint, like the deletion itself
+        with transaction.atomic(savepoint=False):
+            self.release_attr_counts()
+            return super().delete()
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+    def as_rows(self, *fields, relations=('tags', 'ingredients')):
+        """
+        values() rows of the given fields, with every relation as a list of {'id', 'name'}
+        ordered by id, as with_attrs() would load it, all in one query.
+        """
+        return self.values(*fields).annotate(**{relation: self.aggregated_attrs(relation) for relation in relations})
+
+    def chunked(self, chunk_size):
+        """
+        Yield lists of at most chunk_size recipes read through a server-side cursor, running the
+        prefetches of this queryset for each list, which iterator() alone would skip.
+        """
+        rows = self.iterator(chunk_size=chunk_size)
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                return
+            models.prefetch_related_objects(chunk, *self._prefetch_related_lookups)
+            yield chunk
+
+
 class Recipe(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     title = models.CharField(max_length=255)
@@ -56,15 +266,133 @@ class Recipe(models.Model):
     link = models.CharField(max_length=255, blank=True)
     tags = models.ManyToManyField('Tag', related_name='recipes', blank=True)
     ingredients = models.ManyToManyField('Ingredient', related_name='recipes', blank=True)
-    image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    image = CountedImageField(null=True, upload_to=recipe_image_file_path, storage=ContentAddressedStorage())
+    # resized copies of image as [{'width', 'format', 'name'}], filled in by recipe.variants
+    image_variants = models.JSONField(default=list, blank=True)
+    # maintained by core.signals, see RecipeQuerySet.refresh_search_vector
+    search_vector = SearchVectorField(null=True, editable=False)
+    # also moved when a linked tag or ingredient changes (see core.signals), validates cached copies
+    updated_at = models.DateTimeField(auto_now=True)
+    # tags and ingredients as [{'id', 'name'}] ordered by id, read instead of joining them (see
+    # RecipeQuerySet.aggregated_attrs); maintained by core.signals, NULL until filled by
+    # refresh_cached_attrs, for rows written before them or around the ORM
+    cached_tags = models.JSONField(null=True, default=list, editable=False)
+    cached_ingredients = models.JSONField(null=True, default=list, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'], name='recipe_user_id_idx'),
+            models.Index(fields=['user', 'updated_at'], name='recipe_user_updated_idx'),
+            GinIndex(fields=['search_vector'], name='recipe_search_vector_idx'),
+        ]
+
+    # image name as stored in the database, the reference to release when it changes (see core.signals)
+    _stored_image = ''
+    # set when a new upload took its reference in ContentAddressedStorage._save
+    _image_acquired = False
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'image' in instance.__dict__:
+            image = instance.__dict__['image']
+            instance._stored_image = getattr(image, 'name', image) or ''
+        else:
+            # deferred, the previous image is unknown
+            instance._stored_image = None
+        return instance
+
+    def save(self, *args, **kwargs):
+        """
+        Save the recipe, leaving out the cached tags and ingredients of a stored one: they are
+        only written by refresh_cached_attrs, and the instance may hold copies loaded before
+        its tags or ingredients changed.
+        """
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            skipped = {'cached_tags', 'cached_ingredients', *self.get_deferred_fields()}
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skipped
+            ]
+        return super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            Recipe.objects.filter(pk=self.pk).release_attr_counts()
+            return super().delete(*args, **kwargs)
 
     def __str__(self):
         return self.title
 
 
+class RecipeAttrQuerySet(models.QuerySet):
+    """QuerySet shared by tags and ingredients."""
+
+    def resolve(self, user, names):
+        """
+        Return the user's objects for the given names in order, creating the missing ones.
+        Costs one SELECT, plus one INSERT and one SELECT when some names are new.
+        Rows created concurrently by another request are skipped by the (user, name)
+        constraint and picked up by the second SELECT.
+        """
+        names = list(dict.fromkeys(names))
+        objs = {obj.name: obj for obj in self.filter(user=user, name__in=names)}
+        missing = [name for name in names if name not in objs]
+        if missing:
+            self.bulk_create([self.model(user=user, name=name) for name in missing], ignore_conflicts=True)
+            objs.update((obj.name, obj) for obj in self.filter(user=user, name__in=missing))
+        return [objs[name] for name in names]
+
+    def _links(self):
+        """The through model of the objects' recipes, with its recipe and object column names."""
+        field = self.model._meta.get_field('recipes').remote_field
+        return field.remote_field.through, field.m2m_field_name(), field.m2m_reverse_field_name()
+
+    def linked_count(self, recipes=None):
+        """Subquery counting the recipes of each object, only those among recipes when given."""
+        through, source, target = self._links()
+        links = through.objects.filter(**{target: OuterRef('pk')})
+        if recipes is not None:
+            links = links.filter(**{f'{source}__in': recipes})
+        return Subquery(links.values(target).annotate(count=Count('pk')).values('count'))
+
+    def count_recipes(self, recipes, sign=1):
+        """
+        Add to recipe_count of these objects the number of their links to the given recipes, or
+        subtract it with sign=-1, with a single UPDATE of the objects linked to any of them.
+        Added links are counted once they exist, removed ones before they go.
+        """
+        through, source, target = self._links()
+        linked = through.objects.filter(**{f'{source}__in': recipes}).values(target)
+        return self.filter(pk__in=linked).update(
+            recipe_count=F('recipe_count') + sign * self.linked_count(recipes)
+        )
+
+    def refresh_recipe_count(self):
+        """Recount recipe_count of these objects from their links with a single UPDATE."""
+        return self.update(recipe_count=Coalesce(self.linked_count(), 0))
+
+
 class Tag(models.Model):
     name = models.CharField(max_length=255)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    updated_at = models.DateTimeField(auto_now=True)
+    # number of recipes linked, maintained by core.signals so that listing by usage needs no
+    # join; reconcile_recipe_counts fixes rows written around them
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = RecipeAttrQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'name'], name='unique_tag_name_per_user'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'updated_at'], name='tag_user_updated_idx'),
+            models.Index(fields=['user', '-recipe_count', 'id'], name='tag_user_usage_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -73,6 +401,21 @@ class Tag(models.Model):
 class Ingredient(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     name = models.CharField(max_length=255)
+    updated_at = models.DateTimeField(auto_now=True)
+    # number of recipes linked, maintained by core.signals so that listing by usage needs no
+    # join; reconcile_recipe_counts fixes rows written around them
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = RecipeAttrQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'name'], name='unique_ingredient_name_per_user'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'updated_at'], name='ingredient_user_updated_idx'),
+            models.Index(fields=['user', '-recipe_count', 'id'], name='ingredient_user_usage_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -0,0 +1,76 @@
+"""
+Declarative query budgets of the API views.
+
+A view declares the most queries each of its actions may issue in query_budgets, like
+{'list': 2, 'retrieve': 4}; views that are not viewsets key it by lowercase HTTP method.
+With settings.QUERY_BUDGET 'raise' a request going over its budget raises
+QueryBudgetExceeded, with 'log' it logs a warning and None turns the counting off.
+Under 'raise' a write request runs in a transaction, rolled back when it goes over its
+budget, so the error never reports a write that was kept.
+Queries run while a streaming response is consumed happen after the view returns and
+are not counted.
+"""
+import logging
+from contextlib import ExitStack, nullcontext
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from core.db.replicas import read_alias
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryCounter:
+    """execute_wrapper collecting the SQL of every query."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+
+class QueryBudgetMixin:
+    query_budgets = {}
+
+    def query_budget(self, request):
+        """Budget of the current action, None when it has none."""
+        return self.query_budgets.get(getattr(self, 'action', None) or request.method.lower())
+
+    def dispatch(self, request, *args, **kwargs):
+        mode = settings.QUERY_BUDGET
+        if mode is None:
+            return super().dispatch(request, *args, **kwargs)
+        # the first connection of a process runs setup queries, they are not the view's
+        for alias in {DEFAULT_DB_ALIAS, read_alias()}:
+            connections[alias].ensure_connection()
+        counter = QueryCounter()
+        # inside a transaction already, like ATOMIC_REQUESTS, the error rolls back with it
+        writes = (
+            mode == 'raise' and request.method not in ('GET', 'HEAD', 'OPTIONS')
+            and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+        )
+        # entered and left outside the counting, its BEGIN and COMMIT are not the view's
+        with transaction.atomic() if writes else nullcontext():
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(counter))
+                response = super().dispatch(request, *args, **kwargs)
+            budget = self.query_budget(request)
+            if budget is not None and len(counter.queries) > budget:
+                action = getattr(self, 'action', None) or request.method.lower()
+                message = '\n'.join(
+                    [f'{type(self).__name__}.{action} issued {len(counter.queries)} queries, '
+                     f'over its budget of {budget}:']
+                    + counter.queries
+                )
+                if mode == 'raise':
+                    raise QueryBudgetExceeded(message)
+                logger.warning(message)
+        return response
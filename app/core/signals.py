@@ -0,0 +1,102 @@
+"""
+Signal handlers of the core models.
+"""
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from core.models import ImageBlob, Ingredient, Recipe, Tag
+
+SEARCHED_FIELDS = {'title', 'description'}
+
+
+@receiver(post_save, sender=Recipe)
+def update_image_references(sender, instance, **kwargs):
+    """Move the image reference when the recipe's image was replaced or cleared."""
+    acquired, instance._image_acquired = instance._image_acquired, False
+    if 'image' in instance.get_deferred_fields() or instance._stored_image is None:
+        return
+    old, new = instance._stored_image, instance.image.name or ''
+    if acquired or old != new:
+        if new and not acquired:
+            ImageBlob.objects.acquire(new)
+        if old:
+            ImageBlob.objects.release(old, instance.image.storage)
+    instance._stored_image = new
+
+
+@receiver(post_delete, sender=Recipe)
+def release_image(sender, instance, **kwargs):
+    if instance._stored_image:
+        ImageBlob.objects.release(instance._stored_image, Recipe._meta.get_field('image').storage)
+
+
+def linked_changed(recipes):
+    """
+    The tags or ingredients nested in these recipes changed: refresh their search vector,
+    cached tags and ingredients and updated_at.
+    """
+    recipes.refresh_search_vector()
+    recipes.refresh_cached_attrs()
+
+
+@receiver(post_save, sender=Recipe)
+def refresh_search_vector(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or SEARCHED_FIELDS & set(update_fields):
+        Recipe.objects.filter(pk=instance.pk).refresh_search_vector()
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def refresh_linked_search_vector(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            linked_changed(Recipe.objects.filter(pk=instance.pk))
+        return
+    # instance is a tag or ingredient, pk_set holds recipe ids (unknown on clear)
+    if action == 'pre_clear':
+        instance._cleared_recipe_ids = list(instance.recipes.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        linked_changed(Recipe.objects.filter(pk__in=instance._cleared_recipe_ids))
+    elif action in ('post_add', 'post_remove'):
+        linked_changed(Recipe.objects.filter(pk__in=pk_set))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def update_recipe_count(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """
+    Move recipe_count of the tags or ingredients whose links changed, counting the links
+    removed before they go: remove() reports the given pks whether they were linked or not,
+    while add() only reports the new ones.
+    """
+    if reverse:
+        # instance is a tag or ingredient, pk_set holds recipe ids (None on clear)
+        attrs, recipes = type(instance).objects.filter(pk=instance.pk), pk_set
+    else:
+        attrs = model.objects.all() if pk_set is None else model.objects.filter(pk__in=pk_set)
+        recipes = [instance.pk]
+    if action == 'post_add':
+        attrs.count_recipes(recipes)
+    elif action == 'pre_clear' and recipes is None:
+        attrs.update(recipe_count=0)
+    elif action in ('pre_remove', 'pre_clear'):
+        attrs.count_recipes(recipes, sign=-1)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def refresh_renamed_search_vector(sender, instance, created, **kwargs):
+    if not created:
+        linked_changed(Recipe.objects.filter(pk__in=instance.recipes.values('pk')))
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def collect_deleted_recipe_ids(sender, instance, **kwargs):
+    instance._deleted_recipe_ids = list(instance.recipes.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def refresh_deleted_search_vector(sender, instance, **kwargs):
+    linked_changed(Recipe.objects.filter(pk__in=instance._deleted_recipe_ids))
@@ -0,0 +1,92 @@
+"""
+Content-addressed storage for recipe images.
+
+Files are named after the SHA-256 of their bytes and sharded into two levels
+of fan-out directories (uploads/recipe/ab/cd/abcd....jpg), so the same photo is
+stored once however many recipes use it. Every stored file has an ImageBlob row
+counting the recipes referencing it; the last reference to go deletes the file
+together with its resized variants.
+"""
+import hashlib
+import os
+import re
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db.models.fields.files import ImageField, ImageFieldFile
+from django.utils.deconstruct import deconstructible
+
+SHA256_RE = re.compile(r'[0-9a-f]{64}')
+FORMAT_EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'GIF': '.gif', 'WEBP': '.webp'}
+
+
+def blob_sha(name):
+    """The content hash a stored name is keyed by, None for names not written by this storage."""
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return stem if SHA256_RE.fullmatch(stem) else None
+
+
+def content_sha256(content):
+    """Hash an uploaded file, reusing the hash computed while it streamed in when there is one."""
+    sha = getattr(content, 'sha256', None)
+    if sha is None:
+        hasher = hashlib.sha256()
+        for chunk in content.chunks():
+            hasher.update(chunk)
+        sha = hasher.hexdigest()
+        content.seek(0)
+    return sha
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that deduplicates files by content and reference counts them."""
+
+    def content_name(self, name, content):
+        sha = content_sha256(content)
+        # derive the extension from the detected format so equal bytes always get equal names
+        ext = FORMAT_EXTENSIONS.get(getattr(content, 'image_format', None)) or os.path.splitext(name)[1].lower()
+        return os.path.join(os.path.dirname(name), sha[:2], sha[2:4], sha + ext)
+
+    def _save(self, name, content):
+        name = self.content_name(name, content)
+        # the model lives in core.models, which imports this module
+        image_blobs = apps.get_model('core', 'ImageBlob').objects
+
+        def write():
+            if not self.exists(name):
+                super(ContentAddressedStorage, self)._save(name, content)
+
+        image_blobs.acquire(name, write)
+        return name
+
+    def delete(self, name):
+        # blobs are deleted by ImageBlob.objects.release() once nothing references them
+        if blob_sha(name) is None:
+            super().delete(name)
+
+    def delete_blob(self, name):
+        """Delete a blob and the resized variants stored next to it."""
+        super().delete(name)
+        directory = os.path.dirname(name)
+        prefix = blob_sha(name) + '-'
+        try:
+            files = self.listdir(directory)[1]
+        except FileNotFoundError:
+            return
+        for filename in files:
+            if filename.startswith(prefix):
+                super().delete(os.path.join(directory, filename))
+
+
+class CountedImageFieldFile(ImageFieldFile):
+
+    def save(self, name, content, save=True):
+        # the storage takes the reference of a new file itself, post_save must not take another one
+        self.instance._image_acquired = True
+        super().save(name, content, save)
+
+
+class CountedImageField(ImageField):
+    """ImageField whose files are reference counted by ContentAddressedStorage and core.signals."""
+    attr_class = CountedImageFieldFile
@@ -0,0 +1,41 @@
+"""
+Test helpers asserting the query budgets of the API views (core.querybudget).
+"""
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+# data sizes an endpoint's query count must not depend on
+DATA_SIZES = (1, 10, 100)
+
+
+class QueryBudgetAssertionsMixin:
+    """TestCase mixin checking requests against the query_budgets of their views."""
+
+    def _count_queries(self, request):
+        with CaptureQueriesContext(connection) as ctx:
+            response = request()
+        self.assertLess(response.status_code, 400, getattr(response, 'data', response))
+        return ctx
+
+    def assertWithinQueryBudget(self, view_class, action, request):
+        """request() issues at most the budget of action on view_class."""
+        budget = view_class.query_budgets[action]
+        ctx = self._count_queries(request)
+        self.assertLessEqual(
+            len(ctx), budget,
+            '\n'.join([f'{view_class.__name__}.{action} over budget:'] + [query['sql'] for query in ctx]),
+        )
+
+    def assertQueryBudgetScales(self, view_class, action, grow, request, sizes=DATA_SIZES):
+        """
+        For each size, grow(size) brings the data to that size before request() is issued:
+        every size has to stay within budget and cost the same number of queries.
+        """
+        budget = view_class.query_budgets[action]
+        counts = {}
+        for size in sizes:
+            grow(size)
+            counts[size] = len(self._count_queries(request))
+            with self.subTest(size=size):
+                self.assertLessEqual(counts[size], budget, f'{view_class.__name__}.{action} over budget')
+        self.assertEqual(len(set(counts.values())), 1, f'queries grow with the data size: {counts}')
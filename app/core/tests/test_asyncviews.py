@@ -0,0 +1,125 @@
+"""
+Tests for the async views of the ASGI application
+"""
+import asyncio
+import json
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.signals import request_finished
+from django.test import AsyncClient, TransactionTestCase, override_settings
+from django.urls import resolve, reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from app.asgi import ASGIApplication
+from core import asyncviews
+from core.models import Recipe, Tag
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def detail_url(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+# the pool threads use connections of their own, which only see committed rows
+@override_settings(ROOT_URLCONF='app.urls_asgi', RESPONSE_CACHE={'BACKEND': None, 'TTL': 0})
+class AsyncViewTests(TransactionTestCase):
+    # the reads of the pool threads may go to a replica, when DB_REPLICAS configures some
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='async@example.com', password='PASSWORD')
+        self.token = Token.objects.create(user=self.user).key
+        self.recipe = Recipe.objects.create(user=self.user, title='Curry', price=Decimal('5.00'), time_minutes=30)
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name='Spicy'))
+        self.client = AsyncClient()
+
+    def test_read_routes_are_async(self):
+        for url in (RECIPES_URL, detail_url(self.recipe.id), reverse('recipe:tag-list')):
+            self.assertTrue(asyncio.iscoroutinefunction(resolve(url).func), url)
+        self.assertFalse(asyncio.iscoroutinefunction(resolve(reverse('user:me')).func))
+        self.assertEqual(resolve(RECIPES_URL).view_name, 'recipe:recipe-list')
+
+    async def test_list_matches_sync_view(self):
+        res = await self.client.get(RECIPES_URL, authorization=f'Token {self.token}')
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        expected = await sync_to_async(client.get)(RECIPES_URL)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.content, expected.content)
+        self.assertEqual(res['ETag'], expected['ETag'])
+
+    async def test_detail_not_modified(self):
+        url = detail_url(self.recipe.id)
+        res = await self.client.get(url, authorization=f'Token {self.token}')
+        self.assertEqual(res.json()['tags'][0]['name'], 'Spicy')
+
+        res = await self.client.get(url, authorization=f'Token {self.token}', **{'if-none-match': res['ETag']})
+        self.assertEqual(res.status_code, 304)
+
+    async def test_authentication_required(self):
+        res = await self.client.get(RECIPES_URL)
+        self.assertEqual(res.status_code, 401)
+
+    async def test_writes_on_async_routes(self):
+        res = await self.client.post(
+            RECIPES_URL, {'title': 'Rice', 'price': '1.00', 'time_minutes': 5},
+            content_type='application/json', authorization=f'Token {self.token}',
+        )
+        self.assertEqual(res.status_code, 201)
+        self.assertTrue(await sync_to_async(Recipe.objects.filter(title='Rice').exists)())
+
+    async def asgi_get(self, path):
+        """GET path from ASGIApplication, returning the messages sent and the request_finished signals."""
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'',
+            'headers': [(b'host', b'testserver'), (b'authorization', f'Token {self.token}'.encode())],
+        }
+        messages, finished = [], []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        def on_finished(**kwargs):
+            finished.append(kwargs)
+
+        request_finished.connect(on_finished)
+        try:
+            await ASGIApplication()(scope, receive, send)
+        finally:
+            request_finished.disconnect(on_finished)
+        return messages, finished
+
+    @override_settings(RECIPE_EXPORT_CHUNK_SIZE=1)
+    async def test_export_streams_over_asgi(self):
+        await sync_to_async(Recipe.objects.create)(user=self.user, title='Soup', price=Decimal('3.00'))
+
+        messages, finished = await self.asgi_get(reverse('recipe:recipe-export'))
+
+        self.assertEqual(messages[0]['status'], 200)
+        lines = b''.join(message.get('body', b'') for message in messages[1:]).splitlines()
+        self.assertEqual(sorted(json.loads(line)['title'] for line in lines), ['Curry', 'Soup'])
+        self.assertNotIn('more_body', messages[-1])
+        self.assertEqual(len(finished), 1)
+
+    async def test_responses_closed_over_asgi(self):
+        messages, finished = await self.asgi_get(RECIPES_URL)
+
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertFalse(messages[-1]['more_body'])
+        self.assertEqual(len(finished), 1)
+
+    @override_settings(ASGI_VIEW_THREADS=3)
+    def test_pool_bounded(self):
+        asyncviews._executor = None
+        try:
+            self.assertEqual(asyncviews.executor()._max_workers, 3)
+        finally:
+            asyncviews._executor = None
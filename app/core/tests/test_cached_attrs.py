@@ -0,0 +1,135 @@
+"""
+Tests for the cached tags and ingredients of recipes
+"""
+import json
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from recipe.serializers import RecipeDetailSerializer
+
+RECIPES_URL = reverse('recipe:recipe-list')
+BULK_URL = reverse('recipe:recipe-bulk')
+
+
+def attrs(*objs):
+    return [{'id': obj.id, 'name': obj.name} for obj in sorted(objs, key=lambda obj: obj.id)]
+
+
+class CachedAttrsTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='cached@example.com', password='PASSWORD')
+        self.recipe = Recipe.objects.create(user=self.user, title='Curry', price=Decimal('5.00'))
+        self.hot = Tag.objects.create(user=self.user, name='Hot')
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+        self.rice = Ingredient.objects.create(user=self.user, name='Rice')
+        self.recipe.tags.add(self.vegan, self.hot)
+        self.recipe.ingredients.add(self.rice)
+
+    def assertCached(self, recipe, tags, ingredients):
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.cached_tags, attrs(*tags))
+        self.assertEqual(recipe.cached_ingredients, attrs(*ingredients))
+
+    def test_new_recipe_has_none(self):
+        recipe = Recipe.objects.create(user=self.user, title='Soup', price=Decimal('3.00'))
+
+        self.assertCached(recipe, [], [])
+
+    def test_follows_links(self):
+        self.assertCached(self.recipe, [self.hot, self.vegan], [self.rice])
+
+        self.recipe.tags.remove(self.hot)
+        self.assertCached(self.recipe, [self.vegan], [self.rice])
+        self.recipe.ingredients.clear()
+        self.assertCached(self.recipe, [self.vegan], [])
+
+    def test_follows_reverse_links(self):
+        self.hot.recipes.clear()
+        self.assertCached(self.recipe, [self.vegan], [self.rice])
+
+        self.rice.recipes.remove(self.recipe)
+        self.assertCached(self.recipe, [self.vegan], [])
+
+    def test_follows_rename_and_delete(self):
+        self.hot.name = 'Spicy'
+        self.hot.save()
+        self.assertCached(self.recipe, [self.hot, self.vegan], [self.rice])
+
+        self.rice.delete()
+        self.assertCached(self.recipe, [self.hot, self.vegan], [])
+
+    def test_follows_bulk_writes(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        payload = [{'title': 'Soup', 'price': '3.00', 'tags': [{'name': 'Hot'}, {'name': 'Warm'}]}]
+        recipe_id = client.post(BULK_URL, payload, format='json').data['results'][0]['id']
+        recipe = Recipe.objects.get(id=recipe_id)
+        self.assertCached(recipe, [self.hot, Tag.objects.get(name='Warm')], [])
+
+        payload = [{'id': recipe_id, 'ingredients': [{'name': 'Rice'}]}]
+        client.patch(BULK_URL, payload, format='json')
+        self.assertCached(recipe, [self.hot, Tag.objects.get(name='Warm')], [self.rice])
+
+    def test_follows_api_update(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse('recipe:recipe-detail', args=[self.recipe.id])
+        # loaded before the change, as a cached response would have it
+        client.get(url)
+        client.get(RECIPES_URL)
+
+        res = client.patch(url, {'tags': [{'name': 'Mild'}], 'title': 'Korma'}, format='json')
+        self.assertEqual(res.status_code, 200)
+
+        mild = Tag.objects.get(name='Mild')
+        self.assertCached(self.recipe, [mild], [self.rice])
+        self.assertEqual(client.get(url).data['tags'], attrs(mild))
+        self.assertEqual(client.get(RECIPES_URL).data['results'][0]['tags'], attrs(mild))
+
+    def test_follows_import(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, 'recipes.ndjson')
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write(json.dumps({'title': 'Soup', 'price': '3.00', 'tags': ['Hot', 'Warm']}) + '\n')
+            call_command('import_recipes', path, user=self.user.email, stdout=StringIO())
+
+        self.assertCached(Recipe.objects.get(title='Soup'), [self.hot, Tag.objects.get(name='Warm')], [])
+
+    def test_missing_cache_read_from_relations(self):
+        expected = RecipeDetailSerializer(Recipe.objects.with_attrs('tags', 'ingredients').get()).data
+        Recipe.objects.update(cached_tags=None, cached_ingredients=None)
+
+        recipe = Recipe.objects.with_attrs('tags', 'ingredients').get()
+        self.assertEqual(RecipeDetailSerializer(recipe).data, expected)
+        rows = Recipe.objects.as_rows('id')
+        self.assertEqual(rows[0]['tags'], expected['tags'])
+        with override_settings(RECIPE_CACHED_ATTRS=False):
+            recipe = Recipe.objects.with_attrs('tags', 'ingredients').get()
+            self.assertEqual(RecipeDetailSerializer(recipe).data, expected)
+
+    def test_repair_rebuilds_missing_and_stale(self):
+        other = Recipe.objects.create(user=self.user, title='Soup', price=Decimal('3.00'))
+        other.tags.add(self.hot)
+        Recipe.objects.filter(id=self.recipe.id).update(cached_tags=None, cached_ingredients=None)
+        Recipe.objects.filter(id=other.id).update(cached_tags=[{'id': self.hot.id, 'name': 'Stale'}])
+        unchanged = Recipe.objects.create(user=self.user, title='Bread', price=Decimal('2.00'))
+        Recipe.objects.filter(id=unchanged.id).update(updated_at='2020-01-01T00:00:00Z')
+        out = StringIO()
+
+        call_command('repair_recipe_attrs', batch_size=1, stdout=out)
+
+        self.assertIn('Repaired 2 of 3 recipes', out.getvalue())
+        self.assertCached(self.recipe, [self.hot, self.vegan], [self.rice])
+        self.assertCached(other, [self.hot], [])
+        unchanged.refresh_from_db()
+        self.assertEqual(unchanged.updated_at.year, 2020)
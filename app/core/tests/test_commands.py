@@ -0,0 +1,107 @@
+"""
+Tests for the core management commands
+"""
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.utils import OperationalError
+from django.test import TestCase
+
+from core.models import Ingredient, Recipe, Tag
+
+
+class ImportRecipesTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='import@example.com', password='pass123')
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+
+    def _write(self, name, content):
+        path = os.path.join(self.tempdir.name, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def _import(self, path, **options):
+        out, err = StringIO(), StringIO()
+        call_command('import_recipes', path, user=self.user.email, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_import_ndjson(self):
+        Tag.objects.create(user=self.user, name='Vegan')
+        rows = [
+            {'title': 'Curry', 'price': '5.00', 'tags': ['Vegan', 'Hot', 'Hot'], 'ingredients': [{'name': 'Rice'}]},
+            {'title': 'Soup', 'price': '3.50', 'time_minutes': 5, 'description': 'warm', 'tags': ['Hot']},
+            {'title': 'No price'},
+            {'title': 'Bread', 'price': '1.00'},
+        ]
+        path = self._write('recipes.ndjson', '\n'.join(json.dumps(row) for row in rows) + '\n{broken\n')
+        out, err = self._import(path, batch_size=2)
+
+        self.assertIn('Imported 3 recipes, skipped 2 invalid rows', out)
+        self.assertIn('rows/s', out)
+        self.assertIn('line 3:', err)
+        self.assertIn('line 5:', err)
+        curry, soup, bread = Recipe.objects.filter(user=self.user).order_by('id')
+        self.assertEqual(curry.title, 'Curry')
+        self.assertEqual(curry.time_minutes, 10)
+        self.assertEqual(curry.image_variants, [])
+        self.assertEqual(sorted(tag.name for tag in curry.tags.all()), ['Hot', 'Vegan'])
+        self.assertEqual([ingredient.name for ingredient in curry.ingredients.all()], ['Rice'])
+        self.assertEqual([tag.name for tag in soup.tags.all()], ['Hot'])
+        self.assertEqual(soup.description, 'warm')
+        self.assertFalse(bread.tags.exists())
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(Ingredient.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(list(Recipe.objects.search('rice')), [curry])
+
+    def test_import_csv(self):
+        path = self._write(
+            'recipes.csv',
+            'id,title,description,price,time_minutes,link,tags,ingredients\n'
+            '7,"Curry, green",,5.25,20,,Vegan|Hot,Rice\n',
+        )
+        out, _ = self._import(path)
+
+        self.assertIn('Imported 1 recipes', out)
+        recipe = Recipe.objects.get(user=self.user)
+        self.assertEqual(recipe.title, 'Curry, green')
+        self.assertEqual(recipe.description, '')
+        self.assertEqual(recipe.time_minutes, 20)
+        self.assertEqual(sorted(tag.name for tag in recipe.tags.all()), ['Hot', 'Vegan'])
+        self.assertEqual([ingredient.name for ingredient in recipe.ingredients.all()], ['Rice'])
+
+    def test_import_unknown_user(self):
+        path = self._write('recipes.ndjson', '')
+        with self.assertRaises(CommandError):
+            call_command('import_recipes', path, user='nobody@example.com', stdout=StringIO())
+
+
+class WaitForDbTests(TestCase):
+
+    def test_waits_then_warms_pool(self):
+        out = StringIO()
+        call_command('wait_for_db', stdout=out)
+
+        self.assertIn('Database available!', out.getvalue())
+        self.assertIn('Warmed the default connection pool', out.getvalue())
+        self.assertGreaterEqual(len(connection.pool._idle), connection.settings_dict['POOL']['MIN_SIZE'])
+
+    @patch('core.management.commands.wait_for_db.time.sleep')
+    @patch('core.management.commands.wait_for_db.Command.check')
+    def test_retries_until_available(self, check, sleep):
+        check.side_effect = [OperationalError] * 3 + [None]
+        out = StringIO()
+        call_command('wait_for_db', stdout=out)
+
+        self.assertEqual(check.call_count, 4)
+        self.assertEqual(sleep.call_count, 3)
+        self.assertEqual(out.getvalue().count('Database unavailable'), 3)
@@ -0,0 +1,224 @@
+"""
+Tests for the database connection pool
+"""
+import os
+import threading
+from unittest.mock import patch
+
+from django.core.signals import request_started
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase
+from psycopg2 import OperationalError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INTRANS
+
+from core.db.backends.postgresql.base import DatabaseWrapper
+from core.db import pool as pools
+from core.db.pool import ConnectionPool, PoolTimeout, close_pools, get_pool, warm_pools_on_first_request
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.closed = 0
+        self.status = TRANSACTION_STATUS_IDLE
+        self.pings = 0
+        self.broken = False
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.status = TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, sql):
+        self.pings += 1
+        if self.broken:
+            raise OperationalError('server closed the connection unexpectedly')
+
+
+class ConnectionPoolTests(SimpleTestCase):
+
+    def _pool(self, **options):
+        return ConnectionPool(FakeConnection, **{'max_size': 2, 'timeout': 0.05, **options})
+
+    def test_reuses_returned_connection(self):
+        pool = self._pool()
+        conn = pool.get()
+        pool.put(conn)
+
+        self.assertIs(pool.get(), conn)
+        self.assertEqual(pool.stats['opened'], 1)
+        self.assertEqual(pool.stats['reused'], 1)
+
+    def test_rolls_back_open_transaction_on_return(self):
+        pool = self._pool()
+        conn = pool.get()
+        conn.status = TRANSACTION_STATUS_INTRANS
+        pool.put(conn)
+
+        self.assertEqual(conn.status, TRANSACTION_STATUS_IDLE)
+
+    def test_waits_then_times_out_when_full(self):
+        pool = self._pool()
+        pool.get(), pool.get()
+
+        with self.assertRaises(PoolTimeout):
+            pool.get()
+
+    def test_waiting_thread_gets_returned_connection(self):
+        pool = self._pool(max_size=1, timeout=5)
+        conn = pool.get()
+        timer = threading.Timer(0.05, pool.put, [conn])
+        timer.start()
+        self.addCleanup(timer.join)
+
+        self.assertIs(pool.get(), conn)
+
+    def test_closed_connection_replaced(self):
+        pool = self._pool()
+        conn = pool.get()
+        pool.put(conn)
+        conn.closed = 2
+
+        self.assertIsNot(pool.get(), conn)
+        self.assertEqual(pool.stats['discarded'], 1)
+
+    def test_idle_connection_pinged_before_reuse(self):
+        pool = self._pool(check_after=0)
+        conn = pool.get()
+        pool.put(conn)
+        conn.broken = True
+
+        replacement = pool.get()
+
+        self.assertEqual(conn.pings, 1)
+        self.assertIsNot(replacement, conn)
+        self.assertTrue(conn.closed)
+
+    def test_ping_transaction_rolled_back(self):
+        pool = self._pool(check_after=0)
+        conn = pool.get()
+        pool.put(conn)
+        # as a connection with autocommit off after its ping
+        conn.execute = lambda sql: setattr(conn, 'status', TRANSACTION_STATUS_INTRANS)
+
+        self.assertIs(pool.get(), conn)
+        self.assertEqual(conn.status, TRANSACTION_STATUS_IDLE)
+
+    def test_connection_recycled_after_max_lifetime(self):
+        pool = self._pool(max_lifetime=60)
+        conn = pool.get()
+        with patch('core.db.pool.time.monotonic', return_value=10 ** 9):
+            pool.put(conn)
+
+        self.assertTrue(conn.closed)
+        self.assertIsNot(pool.get(), conn)
+
+    def test_failed_connect_frees_its_slot(self):
+        pool = ConnectionPool(FakeConnection, max_size=1, timeout=0.05)
+        with patch.object(pool, 'connect', side_effect=OperationalError('refused')):
+            with self.assertRaises(OperationalError):
+                pool.get()
+
+        self.assertIsInstance(pool.get(), FakeConnection)
+
+    def test_warm_opens_idle_connections_up_to_max_size(self):
+        pool = self._pool()
+
+        self.assertEqual(pool.warm(5), 2)
+        self.assertEqual(pool.warm(5), 0)
+        pool.get()
+        self.assertEqual(pool.stats['reused'], 1)
+
+
+class ProcessPoolTests(SimpleTestCase):
+
+    def test_forked_child_opens_pools_of_its_own(self):
+        key = ('fork', self._testMethodName)
+        pool = get_pool(key, FakeConnection, {'MAX_SIZE': 1})
+        self.addCleanup(close_pools, 'fork')
+
+        pid = os.fork()
+        if pid == 0:
+            # the child reports with its exit status, without running the parent's cleanups
+            os._exit(0 if get_pool(key, FakeConnection, {'MAX_SIZE': 1}) is not pool else 1)
+        self.assertEqual(os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1]), 0)
+        self.assertIs(get_pool(key, FakeConnection, {'MAX_SIZE': 1}), pool)
+
+    def test_pools_warmed_on_first_request(self):
+        with patch.object(pools, 'warm_pools') as warm_pools:
+            warm_pools_on_first_request()
+            request_started.send(sender=self.__class__)
+            request_started.send(sender=self.__class__)
+
+        warm_pools.assert_called_once_with(fail_silently=True)
+
+
+class PooledBackendTests(TransactionTestCase):
+
+    def _wrapper(self, **pool):
+        # a pool of its own, as the pools are per alias and connection parameters
+        options = {'application_name': self._testMethodName}
+        settings_dict = {**connection.settings_dict, 'POOL': pool, 'OPTIONS': options}
+        wrapper = DatabaseWrapper(settings_dict, alias=connection.alias)
+        self.addCleanup(close_pools)
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def _backend_pid(self, wrapper):
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT pg_backend_pid()')
+            return cursor.fetchone()[0]
+
+    def test_closed_connection_reused(self):
+        wrapper = self._wrapper(MAX_SIZE=2)
+        pid = self._backend_pid(wrapper)
+        wrapper.close()
+
+        self.assertEqual(self._backend_pid(wrapper), pid)
+        self.assertEqual(wrapper.pool.stats['reused'], 1)
+
+    def test_returned_transaction_rolled_back(self):
+        wrapper = self._wrapper(MAX_SIZE=2)
+        wrapper.set_autocommit(False)
+        self._backend_pid(wrapper)
+        wrapper.close()
+
+        wrapper.ensure_connection()
+        self.assertEqual(wrapper.connection.get_transaction_status(), TRANSACTION_STATUS_IDLE)
+        self.assertTrue(wrapper.get_autocommit())
+
+    def test_connection_closed_in_atomic_block_not_reused(self):
+        wrapper = self._wrapper(MAX_SIZE=2)
+        self._backend_pid(wrapper)
+        # as in transaction.atomic(), which looks wrappers up by alias
+        wrapper.set_autocommit(False)
+        wrapper.in_atomic_block = True
+        wrapper.close()
+
+        self.assertTrue(wrapper.closed_in_transaction)
+        self.assertEqual(wrapper.pool.stats['discarded'], 1)
+        self.assertEqual(len(wrapper.pool._idle), 0)
+        wrapper.in_atomic_block = False
+        wrapper.closed_in_transaction = False
+        wrapper.connection = None
+
+    def test_pool_off(self):
+        wrapper = self._wrapper(MAX_SIZE=0)
+        pid = self._backend_pid(wrapper)
+        wrapper.close()
+
+        self.assertIsNone(wrapper.pool)
+        self.assertNotEqual(self._backend_pid(wrapper), pid)
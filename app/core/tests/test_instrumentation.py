@@ -0,0 +1,110 @@
+"""
+Tests for the per-request performance instrumentation
+"""
+import re
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.instrumentation import Histogram, registry
+from core.models import Recipe
+
+RECIPES_URL = reverse('recipe:recipe-list')
+METRICS_URL = reverse('metrics')
+BUCKETS = [0.1, 1]
+
+
+def perf_metrics(**options):
+    return override_settings(PERF_METRICS={'SAMPLE_RATE': 1.0, 'TOKEN': None, 'BUCKETS': BUCKETS, **options})
+
+
+def timing_entries(response):
+    return dict(
+        (entry.split(';')[0], entry) for entry in response['Server-Timing'].split(', ')
+    )
+
+
+@override_settings(RESPONSE_CACHE={'BACKEND': None, 'TTL': 0})
+class PerformanceMiddlewareTests(TestCase):
+
+    def setUp(self):
+        registry.reset()
+        self.user = get_user_model().objects.create_user(email='perf@example.com', password='PASSWORD')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        Recipe.objects.create(user=self.user, title='Curry', price=Decimal('5.00'), time_minutes=30)
+
+    @perf_metrics()
+    def test_sampled_request_breakdown(self):
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPES_URL)
+
+        entries = timing_entries(res)
+        self.assertEqual(set(entries), {'db', 'serialize', 'render', 'total'})
+        self.assertIn(f'desc="{len(ctx)} queries"', entries['db'])
+        self.assertRegex(entries['total'], r'^total;dur=\d+\.\d$')
+
+    @perf_metrics(SAMPLE_RATE=0.0)
+    def test_unsampled_request_only_total(self):
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(set(timing_entries(res)), {'total'})
+
+    @perf_metrics(TOKEN='secret')
+    def test_metrics_by_view_and_action(self):
+        self.client.get(RECIPES_URL)
+        self.client.get(RECIPES_URL)
+        self.client.post(RECIPES_URL, {'title': 'Rice', 'price': '1.00', 'time_minutes': 5}, format='json')
+
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer secret')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = res.content.decode()
+        labels = 'view="recipe:recipe-list",action="list"'
+        self.assertIn(f'http_requests_total{{{labels},status="200"}} 2', body)
+        self.assertIn('http_requests_total{view="recipe:recipe-list",action="create",status="201"} 1', body)
+        self.assertIn(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2', body)
+        self.assertIn(f'http_request_duration_seconds_count{{{labels}}} 2', body)
+        for part in ('db', 'serialize', 'render'):
+            self.assertIn(f'# TYPE http_request_{part}_seconds histogram', body)
+        self.assertRegex(body, re.escape(f'http_request_db_queries_total{{{labels}}} ') + r'\d+')
+
+    @perf_metrics(TOKEN='secret')
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get(METRICS_URL).status_code, 403)
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(res.status_code, 200)
+        with self.settings(DEBUG=True):
+            self.assertEqual(self.client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+
+        staff = get_user_model().objects.create_user(email='staff@example.com', password='PASSWORD', is_staff=True)
+        client = APIClient()
+        client.force_login(staff)
+        self.assertEqual(client.get(METRICS_URL).status_code, 200)
+
+    @perf_metrics()
+    def test_metrics_without_token_staff_only(self):
+        client = APIClient()
+        self.assertEqual(client.get(METRICS_URL).status_code, 403)
+        client.force_login(self.user)
+        self.assertEqual(client.get(METRICS_URL).status_code, 403)
+
+        staff = get_user_model().objects.create_user(email='staff@example.com', password='PASSWORD', is_staff=True)
+        client.force_login(staff)
+        self.assertEqual(client.get(METRICS_URL).status_code, 200)
+        with self.settings(DEBUG=True):
+            self.assertEqual(APIClient().get(METRICS_URL).status_code, 403)
+
+    def test_histogram_buckets(self):
+        histogram = Histogram(BUCKETS)
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value)
+
+        self.assertEqual(histogram.counts, [2, 1, 1])
+        self.assertEqual(histogram.sum, 3.65)
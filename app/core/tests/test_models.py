@@ -5,6 +5,7 @@ from decimal import Decimal
 from core import models
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError
 from unittest.mock import patch
 
 
@@ -63,6 +64,34 @@ class ModelTests(TestCase):
         tag = models.Tag.objects.create(user=user, name='Vegan')
         self.assertEqual(str(tag), tag.name)
 
+    def test_tag_name_unique_per_user(self):
+        user = create_sample_user()
+        models.Tag.objects.create(user=user, name='Vegan')
+        models.Tag.objects.create(user=create_sample_user(email='other@example.com'), name='Vegan')
+        with self.assertRaises(IntegrityError):
+            models.Tag.objects.create(user=user, name='Vegan')
+
+    def test_resolve_tags(self):
+        """resolve returns existing tags and creates the missing ones in the given order"""
+        user = create_sample_user()
+        vegan = models.Tag.objects.create(user=user, name='Vegan')
+        models.Tag.objects.create(user=create_sample_user(email='other@example.com'), name='Dinner')
+
+        tags = models.Tag.objects.resolve(user, ['Dinner', 'Vegan', 'Dinner'])
+
+        self.assertEqual([tag.name for tag in tags], ['Dinner', 'Vegan'])
+        self.assertEqual(tags[1], vegan)
+        self.assertEqual(tags[0].user, user)
+        self.assertEqual(models.Tag.objects.filter(user=user).count(), 2)
+
+    def test_resolve_ingredients_query_count(self):
+        user = create_sample_user()
+        models.Ingredient.objects.create(user=user, name='Salt')
+        with self.assertNumQueries(1):
+            models.Ingredient.objects.resolve(user, ['Salt'])
+        with self.assertNumQueries(3):
+            models.Ingredient.objects.resolve(user, ['Salt'] + [f'Spice {i}' for i in range(30)])
+
     @patch('core.models.uuid.uuid4')
     def test_recipe_file_name_uuid(self, mock_uuid):
         """Test generating image path."""
@@ -0,0 +1,63 @@
+"""
+Tests for the query budget enforcement of the API views
+"""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from core.querybudget import QueryBudgetExceeded
+from recipe.views import RecipeViewSet
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+@override_settings(RESPONSE_CACHE={'BACKEND': None, 'TTL': 0})
+@patch.object(RecipeViewSet, 'query_budgets', {'list': 1})
+class QueryBudgetTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='budget@example.com', password='PASSWORD')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @override_settings(QUERY_BUDGET='raise')
+    def test_over_budget_raises(self):
+        with self.assertRaisesRegex(QueryBudgetExceeded, r'RecipeViewSet.list issued 2 queries, over its budget of 1'):
+            self.client.get(RECIPES_URL)
+
+    @override_settings(QUERY_BUDGET='log')
+    def test_over_budget_logs(self):
+        with self.assertLogs('core.querybudget', 'WARNING') as logs:
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('SELECT', logs.output[0])
+
+    @override_settings(QUERY_BUDGET=None)
+    def test_disabled(self):
+        self.assertEqual(self.client.get(RECIPES_URL).status_code, 200)
+
+    @override_settings(QUERY_BUDGET='raise')
+    def test_actions_without_budget_unchecked(self):
+        res = self.client.post(RECIPES_URL, {'title': 'Rice', 'price': '1.00', 'time_minutes': 5}, format='json')
+        self.assertEqual(res.status_code, 201)
+
+
+@override_settings(QUERY_BUDGET='raise', RESPONSE_CACHE={'BACKEND': None, 'TTL': 0})
+@patch.object(RecipeViewSet, 'query_budgets', {'create': 1})
+class WriteQueryBudgetTests(TransactionTestCase):
+    # outside a test transaction, as requests run
+
+    def test_write_over_budget_rolled_back(self):
+        user = get_user_model().objects.create_user(email='budget@example.com', password='PASSWORD')
+        client = APIClient()
+        client.force_authenticate(user)
+
+        with self.assertRaises(QueryBudgetExceeded):
+            client.post(RECIPES_URL, {'title': 'Rice', 'price': '1.00', 'time_minutes': 5}, format='json')
+
+        self.assertFalse(Recipe.objects.exists())
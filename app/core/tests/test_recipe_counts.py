@@ -0,0 +1,106 @@
+"""
+Tests for the recipe counts of tags and ingredients
+"""
+import json
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+
+BULK_URL = reverse('recipe:recipe-bulk')
+
+
+class RecipeCountTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='counts@example.com', password='PASSWORD')
+        self.curry = Recipe.objects.create(user=self.user, title='Curry', price=Decimal('5.00'))
+        self.soup = Recipe.objects.create(user=self.user, title='Soup', price=Decimal('3.00'))
+        self.hot = Tag.objects.create(user=self.user, name='Hot')
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+        self.rice = Ingredient.objects.create(user=self.user, name='Rice')
+
+    def assertCounts(self, **counts):
+        for name, count in counts.items():
+            obj = getattr(self, name)
+            obj.refresh_from_db()
+            self.assertEqual(obj.recipe_count, count, name)
+
+    def test_follows_links(self):
+        self.curry.tags.add(self.hot, self.vegan)
+        self.soup.tags.add(self.hot)
+        self.curry.tags.add(self.hot)
+        self.assertCounts(hot=2, vegan=1)
+
+        self.soup.tags.remove(self.hot, self.vegan)
+        self.assertCounts(hot=1, vegan=1)
+        self.curry.tags.clear()
+        self.assertCounts(hot=0, vegan=0)
+
+    def test_follows_reverse_links(self):
+        self.rice.recipes.add(self.curry, self.soup)
+        self.assertCounts(rice=2)
+
+        self.rice.recipes.remove(self.soup)
+        self.rice.recipes.remove(self.soup)
+        self.assertCounts(rice=1)
+        self.rice.recipes.clear()
+        self.assertCounts(rice=0)
+
+    def test_follows_recipe_delete(self):
+        for recipe in (self.curry, self.soup):
+            recipe.tags.add(self.hot)
+            recipe.ingredients.add(self.rice)
+
+        self.curry.delete()
+        self.assertCounts(hot=1, rice=1)
+        Recipe.objects.all().delete()
+        self.assertCounts(hot=0, rice=0)
+
+    def test_follows_bulk_writes(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        payload = [
+            {'title': 'Stew', 'price': '3.00', 'tags': [{'name': 'Hot'}, {'name': 'Hot'}]},
+            {'title': 'Salad', 'price': '2.00', 'tags': [{'name': 'Hot'}, {'name': 'Vegan'}]},
+        ]
+        ids = [item['id'] for item in client.post(BULK_URL, payload, format='json').data['results']]
+        self.assertCounts(hot=2, vegan=1)
+
+        client.patch(BULK_URL, [{'id': ids[1], 'tags': [{'name': 'Vegan'}]}], format='json')
+        self.assertCounts(hot=1, vegan=1)
+        client.delete(BULK_URL, ids, format='json')
+        self.assertCounts(hot=0, vegan=0)
+
+    def test_follows_import(self):
+        self.curry.tags.add(self.hot)
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, 'recipes.ndjson')
+            with open(path, 'w', encoding='utf-8') as file:
+                for tags in (['Hot', 'Warm'], ['Hot']):
+                    file.write(json.dumps({'title': 'Stew', 'price': '3.00', 'tags': tags}) + '\n')
+            call_command('import_recipes', path, user=self.user.email, stdout=StringIO())
+
+        self.assertCounts(hot=3)
+        self.assertEqual(Tag.objects.get(name='Warm').recipe_count, 1)
+
+    def test_reconcile_fixes_drift(self):
+        self.curry.tags.add(self.hot, self.vegan)
+        self.soup.ingredients.add(self.rice)
+        Tag.objects.filter(pk=self.hot.pk).update(recipe_count=5)
+        Ingredient.objects.update(recipe_count=0)
+        out = StringIO()
+
+        call_command('reconcile_recipe_counts', batch_size=1, stdout=out)
+
+        self.assertIn('Fixed 1 of 2 tags', out.getvalue())
+        self.assertIn('Fixed 1 of 1 ingredients', out.getvalue())
+        self.assertCounts(hot=1, vegan=1, rice=1)
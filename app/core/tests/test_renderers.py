@@ -0,0 +1,82 @@
+"""
+Tests for the orjson renderer and parser
+"""
+import datetime
+import io
+import json
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+from core.renderers import ORJSONParser, ORJSONRenderer
+from recipe.serializers import RecipeDetailSerializer
+
+
+class ORJSONRendererTests(SimpleTestCase):
+
+    def assertRendersLikeDRF(self, data):
+        self.assertEqual(
+            json.loads(ORJSONRenderer().render(data)),
+            json.loads(JSONRenderer().render(data)),
+        )
+
+    def test_native_types(self):
+        self.assertRendersLikeDRF({'title': 'Çorba', 'count': 3, 'tags': [{'id': 1, 'name': 'a'}], 'none': None})
+
+    def test_types_orjson_does_not_know(self):
+        self.assertRendersLikeDRF({
+            'price': Decimal('5.25'),
+            'duration': datetime.timedelta(minutes=5),
+            'label': gettext_lazy('label'),
+        })
+
+    def test_datetimes(self):
+        moment = datetime.datetime(2024, 4, 9, 8, 36, 1, 250, tzinfo=timezone.utc)
+        data = {'moment': moment, 'day': moment.date()}
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_line_separators_escaped(self):
+        data = {'title': 'a\u2028b\u2029c'}
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(ORJSONRenderer().render(data), b'{"title":"a\\u2028b\\u2029c"}')
+
+    def test_non_finite_floats_rendered_as_null(self):
+        # DRF refuses them under STRICT_JSON
+        for value in (float('nan'), float('inf'), float('-inf')):
+            self.assertEqual(ORJSONRenderer().render({'rank': value}), b'{"rank":null}')
+            with self.assertRaises(ValueError):
+                JSONRenderer().render({'rank': value})
+
+    def test_indent(self):
+        rendered = ORJSONRenderer().render({'a': 1}, 'application/json; indent=4')
+        self.assertEqual(rendered, b'{\n  "a": 1\n}')
+
+    def test_parse(self):
+        self.assertEqual(ORJSONParser().parse(io.BytesIO(b'{"a": [1, 2.5]}')), {'a': [1, 2.5]})
+
+    def test_parse_error(self):
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(io.BytesIO(b'{"a": '))
+
+
+class ORJSONApiTests(TestCase):
+
+    def test_recipe_round_trip(self):
+        user = get_user_model().objects.create_user(email='json@example.com', password='pass123')
+        client = APIClient()
+        client.force_authenticate(user)
+        payload = {'title': 'Çorba', 'price': '5.25', 'time_minutes': 5, 'tags': [{'name': 'Hot'}]}
+        res = client.post(reverse('recipe:recipe-list'), payload, format='json')
+
+        recipe = Recipe.objects.get(user=user)
+        self.assertEqual(recipe.title, 'Çorba')
+        self.assertEqual(list(recipe.tags.all()), list(Tag.objects.filter(user=user)))
+        self.assertEqual(res.json(), json.loads(JSONRenderer().render(RecipeDetailSerializer(recipe).data)))
@@ -0,0 +1,202 @@
+"""
+Tests for the routing of reads to the read replicas
+"""
+import unittest
+from unittest.mock import patch
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, router
+from django.http import HttpResponse
+from django.db.models import QuerySet
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.functional import SimpleLazyObject
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.db.replicas import ReplicaReadsMiddleware, ReplicaRouter, pin_reads
+from core.models import Recipe
+
+RECIPES_URL = reverse('recipe:recipe-list')
+REPLICAS = settings.REPLICA_READS['DATABASES']
+
+
+def replica_reads(**options):
+    return override_settings(REPLICA_READS={
+        'DATABASES': ['replica1'], 'STICKY_SECONDS': 10, 'COOKIE': 'db_primary', 'CACHE': 'default', **options,
+    })
+
+
+class User:
+    pk = 7
+    is_authenticated = True
+
+
+@replica_reads()
+class ReplicaRouterTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def _route(self, request, status=200, writer=None):
+        """
+        Run request through the middleware, returning where its reads went and the response;
+        the view pins writer like an anonymous write does.
+        """
+        routed = []
+
+        def view(request):
+            routed.append(router.db_for_read(Recipe))
+            if writer is not None:
+                pin_reads(request, writer)
+            return HttpResponse(status=status)
+
+        response = ReplicaReadsMiddleware(view)(request)
+        return routed[0], response
+
+    def test_safe_request_reads_from_replica(self):
+        for method in ('get', 'head', 'options'):
+            alias, _ = self._route(getattr(self.factory, method)(RECIPES_URL))
+            self.assertEqual(alias, 'replica1', method)
+
+    def test_write_request_uses_default(self):
+        alias, response = self._route(self.factory.post(RECIPES_URL))
+
+        self.assertEqual(alias, DEFAULT_DB_ALIAS)
+        self.assertEqual(router.db_for_write(Recipe), DEFAULT_DB_ALIAS)
+        self.assertEqual(response.cookies['db_primary']['max-age'], 10)
+
+    def test_failed_write_does_not_pin(self):
+        _, response = self._route(self.factory.post(RECIPES_URL), status=400)
+
+        self.assertNotIn('db_primary', response.cookies)
+
+    def test_cookie_pins_reads_to_default(self):
+        request = self.factory.get(RECIPES_URL)
+        request.COOKIES['db_primary'] = '1'
+
+        self.assertEqual(self._route(request)[0], DEFAULT_DB_ALIAS)
+
+    def test_write_pins_user_reads_to_default(self):
+        request = self.factory.post(RECIPES_URL)
+        request.user = User()
+        self._route(request)
+
+        request = self.factory.get(RECIPES_URL)
+        request.user = User()
+        self.assertEqual(self._route(request)[0], DEFAULT_DB_ALIAS)
+        request = self.factory.get(RECIPES_URL)
+        request.user = AnonymousUser()
+        self.assertEqual(self._route(request)[0], 'replica1')
+
+    def test_anonymous_write_pins_its_user(self):
+        request = self.factory.post(RECIPES_URL)
+        request.user = AnonymousUser()
+        self._route(request, writer=User())
+
+        request = self.factory.get(RECIPES_URL)
+        request.user = User()
+        self.assertEqual(self._route(request)[0], DEFAULT_DB_ALIAS)
+
+    def test_user_not_loaded_by_router(self):
+        request = self.factory.get(RECIPES_URL)
+        request.user = SimpleLazyObject(lambda: self.fail('the router loaded the user'))
+
+        self.assertEqual(self._route(request)[0], 'replica1')
+
+    def test_reads_outside_requests_use_default(self):
+        self.assertEqual(router.db_for_read(Recipe), DEFAULT_DB_ALIAS)
+
+    @replica_reads(DATABASES=[])
+    def test_no_replicas(self):
+        alias, response = self._route(self.factory.get(RECIPES_URL))
+
+        self.assertEqual(alias, DEFAULT_DB_ALIAS)
+        _, response = self._route(self.factory.post(RECIPES_URL))
+        self.assertNotIn('db_primary', response.cookies)
+
+    def test_migrations_only_on_default(self):
+        self.assertTrue(ReplicaRouter().allow_migrate(DEFAULT_DB_ALIAS, 'core'))
+        self.assertFalse(ReplicaRouter().allow_migrate('replica1', 'core'))
+
+
+class TokenLookupTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='lagging@example.com', password='PASSWORD')
+        self.token = Token.objects.create(user=self.user)
+        cache.clear()
+
+    def test_token_missing_on_replica_read_from_default(self):
+        real_get = QuerySet.get
+
+        def lagging_get(queryset, *args, **kwargs):
+            # the routed read, which went to a replica the token has not reached yet
+            if queryset.model is Token and queryset._db is None:
+                raise Token.DoesNotExist
+            return real_get(queryset, *args, **kwargs)
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        with patch.object(QuerySet, 'get', lagging_get):
+            with patch('user.authentication.read_alias', return_value='replica1'):
+                res = client.get(reverse('user:me'))
+        self.assertEqual(res.status_code, 200)
+
+        client.credentials(HTTP_AUTHORIZATION='Token missing')
+        with patch('user.authentication.read_alias', return_value='replica1'):
+            self.assertEqual(client.get(reverse('user:me')).status_code, 401)
+
+
+@unittest.skipUnless(
+    REPLICAS, 'set DB_REPLICAS to a second local database, and SHARED_CACHE_BACKEND, to test against replicas',
+)
+@override_settings(RESPONSE_CACHE={'BACKEND': None, 'TTL': 0})
+class ReplicaReadsTests(TransactionTestCase):
+    # the replicas mirror default's test database, so they see its committed rows
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(email='replica@example.com', password='PASSWORD')
+        Recipe.objects.create(user=self.user, title='Curry', price=Decimal('5.00'), time_minutes=30)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _queries(self, request):
+        """Run request, returning its response and its query counts by alias."""
+        captured = {alias: CaptureQueriesContext(connections[alias]) for alias in (DEFAULT_DB_ALIAS, *REPLICAS)}
+        for context in captured.values():
+            context.__enter__()
+        try:
+            response = request()
+        finally:
+            for context in captured.values():
+                context.__exit__(None, None, None)
+        return response, {alias: len(context) for alias, context in captured.items()}
+
+    def test_list_reads_from_replica(self):
+        res, queries = self._queries(lambda: self.client.get(RECIPES_URL))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(res.json()['results']), 1)
+        self.assertEqual(queries[DEFAULT_DB_ALIAS], 0)
+        self.assertGreater(sum(queries[alias] for alias in REPLICAS), 0)
+
+    def test_create_writes_to_default_then_reads_stick_to_it(self):
+        payload = {'title': 'Soup', 'price': '3.50', 'time_minutes': 10, 'tags': [{'name': 'Hot'}]}
+        res, queries = self._queries(lambda: self.client.post(RECIPES_URL, payload, format='json'))
+
+        self.assertEqual(res.status_code, 201)
+        self.assertTrue(all(queries[alias] == 0 for alias in REPLICAS))
+        # force_authenticate keeps no cookies between requests, the user is pinned through the cache
+        self.client.cookies.clear()
+        res, queries = self._queries(lambda: self.client.get(RECIPES_URL))
+        self.assertEqual(len(res.json()['results']), 2)
+        self.assertTrue(all(queries[alias] == 0 for alias in REPLICAS))
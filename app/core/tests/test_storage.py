@@ -0,0 +1,133 @@
+"""
+Tests for the content-addressed recipe image storage
+"""
+import io
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import DatabaseError, transaction
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from core.models import ImageBlob, Recipe
+from core.storage import blob_sha
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def image_content(color='red'):
+    data = io.BytesIO()
+    Image.new('RGB', (10, 10), color).save(data, format='PNG')
+    return ContentFile(data.getvalue(), name='photo.png')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ContentAddressedStorageTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='storage@example.com', password='PASSWORD')
+        self.recipes = [
+            Recipe.objects.create(user=self.user, title=f'Recipe {i}', price=Decimal('1.00')) for i in range(2)
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def test_same_content_stored_once(self):
+        for recipe in self.recipes:
+            recipe.image.save('photo.png', image_content())
+
+        first, second = self.recipes
+        self.assertEqual(first.image.name, second.image.name)
+        sha = blob_sha(first.image.name)
+        self.assertEqual(first.image.name, f'uploads/recipe/{sha[:2]}/{sha[2:4]}/{sha}.png')
+        self.assertEqual(ImageBlob.objects.get(pk=sha).ref_count, 2)
+        self.assertTrue(os.path.exists(first.image.path))
+
+    def test_last_reference_deletes_blob_and_variants(self):
+        for recipe in self.recipes:
+            recipe.image.save('photo.png', image_content())
+        path = self.recipes[0].image.path
+        variant = os.path.splitext(path)[0] + '-320.webp'
+        open(variant, 'wb').close()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipes[0].delete()
+        self.assertTrue(os.path.exists(path))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Recipe.objects.get(pk=self.recipes[1].pk).delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(variant))
+        self.assertFalse(ImageBlob.objects.exists())
+
+    def test_replacing_image_releases_old_blob(self):
+        recipe = self.recipes[0]
+        recipe.image.save('photo.png', image_content('red'))
+        old_path = recipe.image.path
+
+        recipe = Recipe.objects.get(pk=recipe.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.image.save('photo.png', image_content('blue'))
+
+        self.assertFalse(os.path.exists(old_path))
+        self.assertTrue(os.path.exists(recipe.image.path))
+        self.assertEqual(ImageBlob.objects.get().name, recipe.image.name)
+
+    def test_rolled_back_release_keeps_blob(self):
+        recipe = self.recipes[0]
+        recipe.image.save('photo.png', image_content())
+        path = recipe.image.path
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    recipe.delete()
+                    raise DatabaseError
+            except DatabaseError:
+                pass
+
+        self.assertEqual(callbacks, [])
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(ImageBlob.objects.get().ref_count, 1)
+
+    def test_reupload_before_commit_keeps_blob(self):
+        recipe = self.recipes[0]
+        recipe.image.save('photo.png', image_content())
+        path = recipe.image.path
+
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.delete()
+            self.recipes[1].image.save('photo.png', image_content())
+
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(ImageBlob.objects.get().ref_count, 1)
+
+    def test_reuploading_same_image_keeps_one_reference(self):
+        recipe = self.recipes[0]
+        recipe.image.save('photo.png', image_content())
+        recipe = Recipe.objects.get(pk=recipe.pk)
+        recipe.image.save('photo.png', image_content())
+
+        self.assertEqual(ImageBlob.objects.get().ref_count, 1)
+        self.assertTrue(os.path.exists(recipe.image.path))
+
+    def test_gc_deletes_only_orphans(self):
+        recipe = self.recipes[0]
+        recipe.image.save('photo.png', image_content())
+        orphan = os.path.join(MEDIA_ROOT, 'uploads', 'recipe', 'aa', 'bb', 'a' * 64 + '-320.webp')
+        legacy_orphan = os.path.join(MEDIA_ROOT, 'uploads', 'recipe', 'old-upload.jpg')
+        os.makedirs(os.path.dirname(orphan))
+        for path in (orphan, legacy_orphan):
+            open(path, 'wb').close()
+
+        call_command('gc_recipe_images', grace_seconds=-60, stdout=io.StringIO())
+
+        self.assertTrue(os.path.exists(recipe.image.path))
+        self.assertFalse(os.path.exists(orphan))
+        self.assertFalse(os.path.exists(legacy_orphan))
@@ -0,0 +1,115 @@
+"""
+Per-user versioned cache of the recipe, tag and ingredient read responses.
+
+Every key carries a version counter of the user. Any write to the user's recipes, tags or
+ingredients bumps the counter (see recipe.signals), which makes all of the user's cached
+responses unreachable at once without scanning keys; they age out of the cache by TTL.
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    Caches the data of successful responses in the CACHES alias named by
+    settings.RESPONSE_CACHE['BACKEND'], None disables caching.
+    A local-memory alias keeps counters per process, so a write only invalidates the
+    process it happened in; use a shared alias when running several workers.
+    """
+
+    def __init__(self):
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def options(self):
+        return settings.RESPONSE_CACHE
+
+    @property
+    def cache(self):
+        return caches[self.options['BACKEND']]
+
+    @staticmethod
+    def _version_key(user_id):
+        return f'response-cache-version:{user_id}'
+
+    def version(self, user_id):
+        key = self._version_key(user_id)
+        version = self.cache.get(key)
+        if version is None:
+            # start from the clock so a counter evicted from the cache never comes back to an old version
+            self.cache.add(key, time.time_ns(), None)
+            version = self.cache.get(key) or time.time_ns()
+        return version
+
+    def _incr(self, user_id):
+        try:
+            self.cache.incr(self._version_key(user_id))
+        except ValueError:
+            self.cache.add(self._version_key(user_id), time.time_ns(), None)
+
+    def bump(self, user_id):
+        """
+        Invalidate every cached response of the user, now and again once the transaction commits:
+        a read racing the write may have cached the old rows under the new version meanwhile.
+        """
+        if self.options['BACKEND'] is None:
+            return
+        self._incr(user_id)
+        transaction.on_commit(lambda: self._incr(user_id))
+
+    def key(self, request, endpoint, version):
+        # pagination links are absolute, so the host is part of the response
+        query = sorted(request.query_params.lists())
+        digest = hashlib.sha256(repr((request.build_absolute_uri(request.path), query)).encode()).hexdigest()
+        return f'response-cache:{request.user.pk}:{version}:{endpoint}:{digest}'
+
+    def _count(self, endpoint, result):
+        with self._lock:
+            self.stats[endpoint, result] += 1
+        logger.debug('response cache %s: %s', result, endpoint)
+
+    def respond(self, request, endpoint, view):
+        """Return the cached response of the endpoint for this request, or call view and cache its response."""
+        if self.options['BACKEND'] is None:
+            return view()
+        key = self.key(request, endpoint, self.version(request.user.pk))
+        cached = self.cache.get(key)
+        if cached is not None:
+            self._count(endpoint, 'hit')
+            response = Response(cached)
+            response['X-Cache'] = 'HIT'
+            return response
+        self._count(endpoint, 'miss')
+        response = view()
+        if response.status_code == 200:
+            self.cache.set(key, response.data, self.options['TTL'])
+        response['X-Cache'] = 'MISS'
+        return response
+
+
+response_cache = ResponseCache()
+
+
+class CachedReadMixin:
+    """Serve list and retrieve of a viewset from the per-user response cache."""
+
+    def list(self, request, *args, **kwargs):
+        return response_cache.respond(
+            request, f'{self.basename}-list', lambda: super(CachedReadMixin, self).list(request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return response_cache.respond(
+            request, f'{self.basename}-detail', lambda: super(CachedReadMixin, self).retrieve(request, *args, **kwargs)
+        )
@@ -0,0 +1,106 @@
+"""
+Conditional requests (ETag, Last-Modified, If-None-Match, If-Match) for the recipe APIs.
+
+Validators come from the updated_at columns, so they cost one small query instead of a
+serialization: a detail is validated by its own updated_at, a list by the (max updated_at,
+row count) of the user's rows, read from the (user, updated_at) indexes. Deleting a row
+does not move the maximum, so lists only answer If-None-Match; their Last-Modified is
+informational.
+
+Last-Modified only has second precision, rounded up here; two changes within a second share
+it. GET ignores If-Modified-Since, leaving 304s to the ETag, while writes still honour
+If-Unmodified-Since at that precision.
+"""
+import hashlib
+import math
+
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.sha256(repr(parts).encode()).hexdigest()[:32])
+
+
+def http_seconds(updated_at):
+    """updated_at as the whole seconds of Last-Modified, which the HTTP date headers compare against."""
+    return math.ceil(updated_at.timestamp())
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(http_seconds(last_modified))
+    return response
+
+
+class ConditionalMixin:
+    """
+    Strong ETags on list and retrieve, answering a matching If-None-Match with 304 before
+    anything is serialized, and If-Match on update for optimistic concurrency.
+    """
+    # models whose rows of the user make up the list, validated together
+    list_models = ()
+
+    def _query(self, request):
+        return sorted(request.query_params.lists())
+
+    def _list_validators(self, request):
+        aggregates = [
+            model.objects.filter(user=request.user).aggregate(modified=Max('updated_at'), count=Count('id'))
+            for model in self.list_models
+        ]
+        modified = [aggregate['modified'] for aggregate in aggregates if aggregate['modified'] is not None]
+        etag = make_etag(
+            self.basename, request.build_absolute_uri(request.path), self._query(request),
+            [(aggregate['modified'], aggregate['count']) for aggregate in aggregates],
+        )
+        return etag, max(modified, default=None)
+
+    def _detail_validators(self, request, pk, lock=False):
+        """ETag and updated_at of the user's object, None when there is no such object."""
+        try:
+            queryset = self.queryset.filter(user=request.user, pk=pk)
+        except (TypeError, ValueError):
+            # malformed pk, left to the view to answer 404
+            return None
+        if lock:
+            queryset = queryset.select_for_update()
+        updated_at = queryset.values_list('updated_at', flat=True).first()
+        if updated_at is None:
+            return None
+        return make_etag(self.basename, str(pk), updated_at, self._query(request)), updated_at
+
+    def list(self, request, *args, **kwargs):
+        etag, last_modified = self._list_validators(request)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        return set_validators(response, etag, last_modified)
+
+    def retrieve(self, request, *args, **kwargs):
+        validators = self._detail_validators(request, kwargs['pk'])
+        if validators is None:
+            return super().retrieve(request, *args, **kwargs)
+        # If-Modified-Since can't tell changes within the same second apart
+        response = get_conditional_response(request, etag=validators[0])
+        if response is None:
+            response = super().retrieve(request, *args, **kwargs)
+        return set_validators(response, *validators)
+
+    def update(self, request, *args, **kwargs):
+        with transaction.atomic():
+            # the row stays locked from the precondition check until the update is written
+            validators = self._detail_validators(request, kwargs['pk'], lock=True)
+            if validators is not None:
+                etag, updated_at = validators
+                response = get_conditional_response(request, etag, http_seconds(updated_at))
+                if response is not None:
+                    return set_validators(response, *validators)
+            response = super().update(request, *args, **kwargs)
+        validators = self._detail_validators(request, kwargs['pk'])
+        if response.status_code == 200 and validators is not None:
+            set_validators(response, *validators)
+        return response
@@ -0,0 +1,78 @@
+"""
+Sparse fieldsets for the recipe APIs: ?fields=title,price or ?exclude=description.
+
+The serializer is trimmed to the selected fields and the queryset loads only what they
+need: the selected columns through only() and the selected nested relations. Writes always
+keep every field so that no input is skipped by validation.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import ListSerializer
+
+
+class SparseFieldsMixin:
+    # actions whose output can be narrowed
+    sparse_actions = ('list', 'retrieve')
+    # columns loaded whether their fields are selected or not, like the pagination ordering
+    required_columns = ()
+
+    def _names(self, param):
+        value = self.request.query_params.get(param)
+        if value is None:
+            return None
+        return [name.strip() for name in value.split(',') if name.strip()]
+
+    def selected_fields(self):
+        """{field name: model attribute} of the fields to render, None when all of them are."""
+        if self.action not in self.sparse_actions:
+            return None
+        if not hasattr(self, '_selected_fields'):
+            self._selected_fields = self._select_fields()
+        return self._selected_fields
+
+    def _select_fields(self):
+        fields, exclude = self._names('fields'), self._names('exclude')
+        if fields is None and exclude is None:
+            return None
+        available = self.get_serializer_class()().fields
+        errors = {}
+        for param, names in (('fields', fields), ('exclude', exclude)):
+            unknown = [name for name in names or () if name not in available]
+            if unknown:
+                errors[param] = [f'Unknown fields: {", ".join(unknown)}.']
+        if errors:
+            raise ValidationError(errors)
+        return {
+            name: field.source.split('.')[0]
+            for name, field in available.items()
+            if (fields is None or name in fields) and name not in (exclude or ())
+        }
+
+    def narrow_queryset(self, queryset, relations=()):
+        """
+        Return queryset restricted to the columns of the selected fields, and the selected
+        ones of relations, the nested relations the action would prefetch.
+        """
+        selected = self.selected_fields()
+        if selected is None:
+            return queryset, relations
+        opts = queryset.model._meta
+        columns = {opts.pk.name, *self.required_columns}
+        for source in selected.values():
+            try:
+                field = opts.get_field(source)
+            except FieldDoesNotExist:
+                continue
+            if field.concrete and not field.many_to_many:
+                columns.add(field.name)
+        return queryset.only(*columns), [relation for relation in relations if relation in selected.values()]
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        selected = self.selected_fields()
+        if selected is not None:
+            fields = (serializer.child if isinstance(serializer, ListSerializer) else serializer).fields
+            for name in list(fields):
+                if name not in selected:
+                    fields.pop(name)
+        return serializer
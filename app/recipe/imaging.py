@@ -0,0 +1,45 @@
+"""
+Rendering of resized recipe image variants.
+
+Only depends on Pillow so it can run in a spawned worker process without Django.
+"""
+import os
+
+from PIL import Image, ImageOps, features
+
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+
+
+def supported_formats(formats):
+    """Drop WebP when Pillow was built without libwebp."""
+    return [fmt for fmt in formats if fmt != 'webp' or features.check('webp')]
+
+
+def render_variants(source_path, output_base, widths, formats, quality):
+    """
+    Write a copy of the image for every width and format to '<output_base>-<width>.<ext>'
+    and return them as [{'width', 'format', 'suffix'}]. Widths above the original are
+    capped to it. The copies are re-encoded without EXIF, after applying its orientation.
+    """
+    variants = []
+    with Image.open(source_path) as img:
+        # JPEGs can be decoded at a reduced scale, which is much cheaper than a full decode
+        largest = max(widths)
+        img.draft('RGB', (largest, largest))
+        img = ImageOps.exif_transpose(img)
+        for width in sorted({min(width, img.width) for width in widths}):
+            suffixes = {fmt: f'-{width}.{EXTENSIONS[fmt]}' for fmt in formats}
+            variants += [{'width': width, 'format': fmt, 'suffix': suffix} for fmt, suffix in suffixes.items()]
+            # content-addressed images share their variants, which may have been rendered already
+            if all(os.path.exists(output_base + suffix) for suffix in suffixes.values()):
+                continue
+            height = max(1, round(img.height * width / img.width))
+            resized = img.resize((width, height), Image.LANCZOS)
+            for fmt, suffix in suffixes.items():
+                out = resized
+                if fmt == 'jpeg' and out.mode != 'RGB':
+                    out = out.convert('RGB')
+                elif out.mode not in ('RGB', 'RGBA'):
+                    out = out.convert('RGBA')
+                out.save(output_base + suffix, format=fmt.upper(), quality=quality, optimize=True)
+    return variants
@@ -0,0 +1,122 @@
+"""
+Pagination for the recipe APIs.
+
+Cursor (keyset) pagination filters on the ordering columns instead of using OFFSET,
+so fetching a later page costs the same as fetching the first one.
+"""
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Cursor pagination positioned on every column of the ordering, not just the first.
+
+    DRF's cursor keeps only the first column and steps over rows tied on it with an offset,
+    capped at offset_cutoff, so a longer run of ties never ends. Here the cursor keeps the
+    whole row value, unique as long as the ordering ends with the primary key, and a page
+    starts at the first row past it.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        offset, reverse, current_position = self.cursor or (0, False, None)
+
+        ordering = self._reversed(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if current_position is not None:
+            queryset = queryset.filter(self._after(ordering, self._decode_position(current_position)))
+
+        # one more row than the page tells whether another page follows
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+        following_position = None
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None or offset > 0
+            self.has_previous = following_position is not None
+            self.next_position, self.previous_position = current_position, following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = current_position is not None or offset > 0
+            self.next_position, self.previous_position = following_position, current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def _get_position_from_instance(self, instance, ordering):
+        fields = [order.lstrip('-') for order in ordering]
+        if isinstance(instance, dict):
+            values = [instance[field] for field in fields]
+        else:
+            values = [getattr(instance, field) for field in fields]
+        return json.dumps(values, separators=(',', ':'))
+
+    def _decode_position(self, position):
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        valid = (isinstance(values, list) and len(values) == len(self.ordering)
+                 and all(isinstance(value, (str, int, float)) for value in values))
+        if not valid:
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    @staticmethod
+    def _reversed(ordering):
+        return tuple(order[1:] if order.startswith('-') else f'-{order}' for order in ordering)
+
+    @staticmethod
+    def _after(ordering, values):
+        """The rows past `values` in `ordering`, a row comparison that allows mixed directions."""
+        after, tied = Q(), Q()
+        for order, value in zip(ordering, values):
+            field = order.lstrip('-')
+            after |= tied & Q(**{f'{field}__{"lt" if order.startswith("-") else "gt"}': value})
+            tied &= Q(**{field: value})
+        # bounding the first column on its own lets the index scan start at the cursor
+        first = ordering[0].lstrip('-')
+        return Q(**{f'{first}__{"lte" if ordering[0].startswith("-") else "gte"}': values[0]}) & after
+
+
+class RecipeCursorPagination(KeysetCursorPagination):
+    """Paginate recipes newest first, served by the (user, id) index; search results by rank."""
+    ordering = '-id'
+    page_size = settings.API_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view):
+        if 'rank' in queryset.query.annotations:
+            return ('-rank', '-id')
+        return super().get_ordering(request, queryset, view)
+
+
+class RecipeAttrCursorPagination(KeysetCursorPagination):
+    """
+    Paginate tags and ingredients by name, served by the (user, name) unique index, or by
+    usage, served by the (user, -recipe_count, id) index.
+    """
+    ordering = ('-name', 'id')
+    page_size = settings.API_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view):
+        # the ordering the view picked from ?ordering=, see recipe.views.ORDERINGS
+        return tuple(queryset.query.order_by) or super().get_ordering(request, queryset, view)
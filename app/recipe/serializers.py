@@ -1,52 +1,114 @@
+from django.conf import settings
+from django.utils import timezone
+from PIL import Image
 from rest_framework import serializers
+from rest_framework.settings import api_settings
+from core.instrumentation import TimedSerializerMixin
+from recipe.cache import response_cache
+from recipe.uploadhandlers import TOO_MANY_PIXELS, read_header, too_many_pixels
 from core.models import (
     Recipe,
     Tag,
     Ingredient
 )
 
+BULK_BATCH_SIZE = 1000
 
-class IngredientSerializer(serializers.ModelSerializer):
+
+class TimedListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    pass
+
+
+class UniqueNameMixin:
+    """
+    Refuse a name the user already gave to another object, which the (user, name) constraint
+    would reject. Only checked when the object itself is written: nested in a recipe, an
+    existing name picks the existing object.
+    """
+
+    def validate_name(self, value):
+        if self.parent is None:
+            others = self.Meta.model.objects.filter(user=self.context['request'].user, name=value)
+            if self.instance is not None:
+                others = others.exclude(pk=self.instance.pk)
+            if others.exists():
+                name = self.Meta.model._meta.verbose_name
+                raise serializers.ValidationError(f'You already have a {name} named {value}.')
+        return value
+
+
+class IngredientSerializer(UniqueNameMixin, TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Ingredient
         fields = ['id', 'name']
         read_only_fields = ['id']
+        list_serializer_class = TimedListSerializer
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(UniqueNameMixin, TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = ['id', 'name']
         read_only_fields = ['id']
+        list_serializer_class = TimedListSerializer
+
+
+class RecipeAttrListSerializer(TimedListSerializer):
+    """
+    Tags or ingredients of a recipe. Recipes loaded with RecipeQuerySet.with_attrs() carry
+    them as a <relation>_attrs annotation, a list already shaped like the output.
+    """
+
+    def get_attribute(self, instance):
+        attrs = instance.__dict__.get(f'{self.source}_attrs')
+        if attrs is not None:
+            return attrs
+        return super().get_attribute(instance)
+
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        # required even in a partial update of the recipe, which DRF extends to nested fields
+        required = [field for field in self.child.fields.values() if field.required]
+        errors = [
+            {
+                field.field_name: [serializers.ErrorDetail(field.error_messages['required'], code='required')]
+                for field in required if field.source not in item
+            }
+            for item in items
+        ]
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return items
 
+    def to_representation(self, data):
+        if isinstance(data, list):
+            return data
+        return super().to_representation(data)
 
-class RecipeSerializer(serializers.ModelSerializer):
-    tags = TagSerializer(many=True, read_only=True)
-    ingredients = IngredientSerializer(many=True, read_only=True)
+
+class RecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    tags = RecipeAttrListSerializer(child=TagSerializer(), required=False)
+    ingredients = RecipeAttrListSerializer(child=IngredientSerializer(), required=False)
 
     class Meta:
         model = Recipe
         fields = ['id', 'title', 'price', 'link', 'time_minutes', 'tags', 'ingredients']
         read_only_fields = ['id']
+        list_serializer_class = TimedListSerializer
 
     def _generate_tags(self, instance, tags, user):
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(
-                user=user,
-                **tag,
-            )
-            instance.tags.add(tag_obj)
+        instance.tags.add(*Tag.objects.resolve(user, [tag['name'] for tag in tags]))
 
     def _generate_ingredients(self, instance, ingredients):
         user = self.context['request'].user
-        for ingredient in ingredients:
-            ingredient_obj, created = Ingredient.objects.get_or_create(user=user, **ingredient)
-            instance.ingredients.add(ingredient_obj)
+        instance.ingredients.add(
+            *Ingredient.objects.resolve(user, [ingredient['name'] for ingredient in ingredients])
+        )
 
     def create(self, validated_data):
         """Create a recipe."""
-        tags = self.context['request'].data.get('tags', [])
-        ingredients = self.context['request'].data.get('ingredients', [])
+        tags = validated_data.pop('tags', [])
+        ingredients = validated_data.pop('ingredients', [])
         recipe = Recipe.objects.create(**validated_data)
         auth_user = self.context['request'].user
         self._generate_tags(recipe, tags, auth_user)
@@ -55,8 +117,8 @@ class RecipeSerializer(serializers.ModelSerializer):
         return recipe
 
     def update(self, instance, validated_data):
-        tags = self.context['request'].data.get('tags', None)
-        ingredients = self.context['request'].data.get('ingredients', None)
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
 
         if tags is not None:
             # if tags be like empty list it will clear tags
@@ -75,17 +137,215 @@ class RecipeSerializer(serializers.ModelSerializer):
         return instance
 
 
+class RecipeRowListSerializer(TimedListSerializer):
+    """
+    Renders RecipeQuerySet.as_rows() rows with the fields of the child, skipping the per-field
+    and nested serializer dispatch of Serializer.to_representation. Nested lists come out
+    of the query already shaped. The output matches the child serializing model instances,
+    see recipe.tests.test_recipe_rows.
+    """
+
+    def to_representation(self, data):
+        fields = [
+            (name, field.source, None if isinstance(field, serializers.ListSerializer) else field.to_representation)
+            for name, field in self.child.fields.items()
+            if not field.write_only
+        ]
+        rows = []
+        for row in data:
+            item = {}
+            for name, source, to_representation in fields:
+                value = row[source]
+                item[name] = value if value is None or to_representation is None else to_representation(value)
+            rows.append(item)
+        return rows
+
+
+class RecipeRowSerializer(RecipeSerializer):
+    """Read-only recipe list serializer of as_rows() rows."""
+
+    class Meta(RecipeSerializer.Meta):
+        list_serializer_class = RecipeRowListSerializer
+
+    def row_fields(self):
+        """Columns as_rows() has to select, besides the aggregated relations."""
+        return [field.source for field in self.fields.values() if not isinstance(field, serializers.ListSerializer)]
+
+    def row_relations(self):
+        """Relations as_rows() has to aggregate."""
+        return [field.source for field in self.fields.values() if isinstance(field, serializers.ListSerializer)]
+
+
 class RecipeDetailSerializer(RecipeSerializer):
 
     class Meta(RecipeSerializer.Meta):
         fields = RecipeSerializer.Meta.fields + ['description']
 
 
+class RecipeBulkListSerializer(serializers.ListSerializer):
+    """
+    Validates every recipe of a bulk request on its own and writes the valid ones with a few
+    set-based queries. Invalid items are left out of validated_data and reported in item_errors
+    by their index in the request; item_indexes maps validated_data back to those indexes.
+    Updates are scoped by the queryset passed as instance and match items by id.
+    """
+    default_error_messages = {
+        'max_items': 'Ensure this list has no more than {max_items} items.',
+        'not_found': 'Not found.',
+        'duplicate': 'Appears more than once.',
+    }
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            message = self.error_messages['not_a_list'].format(input_type=type(data).__name__)
+            raise serializers.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [message]}, code='not_a_list')
+        max_items = settings.RECIPE_BULK_MAX_ITEMS
+        if len(data) > max_items:
+            message = self.error_messages['max_items'].format(max_items=max_items)
+            raise serializers.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [message]}, code='max_items')
+
+        validated = {}
+        self.item_errors = {}
+        for index, item in enumerate(data):
+            try:
+                validated[index] = self.child.run_validation(item)
+            except serializers.ValidationError as exc:
+                self.item_errors[index] = exc.detail
+        if self.instance is not None:
+            self._match_instances(validated)
+        self.item_indexes = list(validated)
+        return list(validated.values())
+
+    def _match_instances(self, validated):
+        """Drop items whose id is missing, unknown or repeated, keeping the found recipes by id."""
+        ids = [attrs['id'] for attrs in validated.values() if 'id' in attrs]
+        self.found = self.instance.in_bulk(ids)
+        seen = set()
+        for index, attrs in list(validated.items()):
+            recipe_id = attrs.get('id')
+            if recipe_id is None:
+                error = self.child.fields['id'].error_messages['required']
+            elif recipe_id not in self.found:
+                error = self.error_messages['not_found']
+            elif recipe_id in seen:
+                error = self.error_messages['duplicate']
+            else:
+                seen.add(recipe_id)
+                continue
+            self.item_errors[index] = {'id': [error]}
+            del validated[index]
+
+    @staticmethod
+    def _fields(attrs):
+        return {name: value for name, value in attrs.items() if name not in ('id', 'tags', 'ingredients')}
+
+    def _link(self, recipes, items, relation, model):
+        """Add the named tags or ingredients of every item to its recipe, resolving all names at once."""
+        user = self.context['request'].user
+        names = [attr['name'] for attrs in items for attr in attrs[relation]]
+        by_name = {obj.name: obj for obj in model.objects.resolve(user, names)}
+        through = getattr(Recipe, relation).through
+        column = Recipe._meta.get_field(relation).m2m_reverse_name()
+        through.objects.bulk_create(
+            (
+                through(recipe_id=recipe.id, **{column: by_name[attr['name']].id})
+                for recipe, attrs in zip(recipes, items)
+                for attr in attrs[relation]
+            ),
+            batch_size=BULK_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        model.objects.count_recipes([recipe.id for recipe in recipes])
+
+    def _link_all(self, recipes, validated_data):
+        for relation, model in (('tags', Tag), ('ingredients', Ingredient)):
+            linked = [(recipe, attrs) for recipe, attrs in zip(recipes, validated_data) if relation in attrs]
+            if linked:
+                self._link(*zip(*linked), relation, model)
+        # bulk writes skip the signals that maintain the search vector, the cached tags and
+        # ingredients (their recipe_count is moved by _link and update), and invalidate cached responses
+        written = Recipe.objects.filter(pk__in=[recipe.pk for recipe in recipes])
+        written.refresh_search_vector()
+        written.refresh_cached_attrs()
+        response_cache.bump(self.context['request'].user.pk)
+
+    def create(self, validated_data):
+        recipes = Recipe.objects.bulk_create(
+            [Recipe(**self._fields(attrs)) for attrs in validated_data],
+            batch_size=BULK_BATCH_SIZE,
+        )
+        self._link_all(recipes, validated_data)
+        return recipes
+
+    def update(self, instance, validated_data):
+        recipes = [self.found[attrs['id']] for attrs in validated_data]
+        # bulk_update leaves auto_now alone
+        now = timezone.now()
+        for recipe in recipes:
+            recipe.updated_at = now
+        fields = {'updated_at'}
+        for recipe, attrs in zip(recipes, validated_data):
+            for name, value in self._fields(attrs).items():
+                setattr(recipe, name, value)
+                fields.add(name)
+        Recipe.objects.bulk_update(recipes, fields, batch_size=BULK_BATCH_SIZE)
+        for relation in ('tags', 'ingredients'):
+            replaced = [recipe.pk for recipe, attrs in zip(recipes, validated_data) if relation in attrs]
+            if replaced:
+                Recipe._meta.get_field(relation).related_model.objects.count_recipes(replaced, sign=-1)
+                getattr(Recipe, relation).through.objects.filter(recipe_id__in=replaced).delete()
+        self._link_all(recipes, validated_data)
+        return recipes
+
+
+class RecipeBulkSerializer(RecipeDetailSerializer):
+    """One recipe of a bulk request, with its tags and ingredients given by name."""
+    id = serializers.IntegerField(required=False)
+
+    class Meta(RecipeDetailSerializer.Meta):
+        read_only_fields = []
+        list_serializer_class = RecipeBulkListSerializer
+
+
+class HeaderCheckedImageField(serializers.ImageField):
+    """
+    ImageField validated from the image header only, instead of letting Pillow verify the whole file.
+    Files from recipe.uploadhandlers.ImageUploadHandler already carry the parsed header.
+    """
+
+    def to_internal_value(self, data):
+        file = serializers.FileField.to_internal_value(self, data)
+        if getattr(file, 'image_size', None) is None:
+            try:
+                header = read_header(file.read(settings.RECIPE_IMAGE_UPLOAD['HEADER_BYTES']))
+            except Image.DecompressionBombError:
+                raise serializers.ValidationError(TOO_MANY_PIXELS)
+            file.seek(0)
+            if header is None:
+                self.fail('invalid_image')
+            file.image_size, file.image_format = header
+        if too_many_pixels(file.image_size):
+            raise serializers.ValidationError(TOO_MANY_PIXELS)
+        return file
+
+
 class RecipeImageSerializer(serializers.ModelSerializer):
     """Serializer for uploading images to recipes."""
+    image = HeaderCheckedImageField(required=True)
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
-        fields = ['id', 'image']
+        fields = ['id', 'image', 'image_variants']
         read_only_fields = ['id']
-        extra_kwargs = {'image': {'required': 'True'}}
+
+    def get_image_variants(self, recipe):
+        """Resized copies smallest first, empty until they have been rendered."""
+        request = self.context.get('request')
+        variants = []
+        for variant in sorted(recipe.image_variants, key=lambda variant: (variant['width'], variant['format'])):
+            url = recipe.image.storage.url(variant['name'])
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            variants.append({'width': variant['width'], 'format': variant['format'], 'url': url})
+        return variants
@@ -0,0 +1,123 @@
+'''
+tests for ETag / conditional requests on the recipe endpoints
+'''
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def detail_url(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def create_recipe(user, **params):
+    return Recipe.objects.create(user=user, title=params.pop('title', 'Sample'), price=Decimal('5.25'), **params)
+
+
+class ConditionalRequestTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='etag@example.com', password='pass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(self.user, title='Curry')
+
+    def test_list_not_modified(self):
+        res = self.client.get(RECIPES_URL)
+        self.assertIn('ETag', res)
+        self.assertIn('Last-Modified', res)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertIn('ETag', res)
+
+    def test_list_etag_follows_changes(self):
+        etag = self.client.get(RECIPES_URL)['ETag']
+        create_recipe(self.user)
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 2)
+
+        etag = res['ETag']
+        self.recipe.delete()
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_list_etag_depends_on_query(self):
+        etag = self.client.get(RECIPES_URL)['ETag']
+        res = self.client.get(RECIPES_URL, {'page_size': 1}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_detail_etag_follows_nested_tags(self):
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        etag = self.client.get(detail_url(self.recipe.id))['ETag']
+        res = self.client.get(detail_url(self.recipe.id), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.recipe.tags.add(tag)
+        res = self.client.get(detail_url(self.recipe.id), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        etag = res['ETag']
+        tag.name = 'Vegetarian'
+        tag.save()
+        res = self.client.get(detail_url(self.recipe.id), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['tags'][0]['name'], 'Vegetarian')
+
+    def test_detail_missing(self):
+        res = self.client.get(detail_url(self.recipe.id + 1000), HTTP_IF_NONE_MATCH='"x"')
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_if_match_update(self):
+        etag = self.client.get(detail_url(self.recipe.id))['ETag']
+        res = self.client.patch(detail_url(self.recipe.id), {'title': 'Green curry'}, HTTP_IF_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
+        # a second client still holding the first version loses
+        res = self.client.patch(detail_url(self.recipe.id), {'title': 'Red curry'}, HTTP_IF_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.title, 'Green curry')
+
+    def test_if_modified_since_answered_in_full(self):
+        last_modified = self.client.get(detail_url(self.recipe.id))['Last-Modified']
+        # most likely within the same second as the Last-Modified seen
+        self.client.patch(detail_url(self.recipe.id), {'title': 'Green curry'})
+
+        res = self.client.get(detail_url(self.recipe.id), HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['title'], 'Green curry')
+
+    def test_if_unmodified_since_update(self):
+        last_modified = self.client.get(detail_url(self.recipe.id))['Last-Modified']
+        res = self.client.patch(
+            detail_url(self.recipe.id), {'title': 'Green curry'}, HTTP_IF_UNMODIFIED_SINCE=last_modified,
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.patch(
+            detail_url(self.recipe.id), {'title': 'Red curry'},
+            HTTP_IF_UNMODIFIED_SINCE='Sat, 01 Jan 2000 00:00:00 GMT',
+        )
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
+
+    def test_tag_list_follows_assignment(self):
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        etag = self.client.get(TAGS_URL, {'assigned_only': 1})['ETag']
+        self.recipe.tags.add(tag)
+
+        res = self.client.get(TAGS_URL, {'assigned_only': 1}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 1)
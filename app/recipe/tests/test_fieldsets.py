@@ -0,0 +1,96 @@
+'''
+tests for the fields/exclude query parameters of the recipe APIs
+'''
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def detail_url(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+@override_settings(RESPONSE_CACHE={'BACKEND': None, 'TTL': 0})
+class SparseFieldsTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='fields@example.com', password='PASSWORD')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Curry', price=Decimal('5.00'), time_minutes=30, description='Hot',
+        )
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name='Spicy'))
+        self.recipe.ingredients.add(Ingredient.objects.create(user=self.user, name='Chili'))
+
+    def _get(self, url, params):
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res, ' '.join(query['sql'] for query in ctx.captured_queries)
+
+    def test_list_fields(self):
+        res, sql = self._get(RECIPES_URL, {'fields': 'id,title'})
+
+        self.assertEqual(res.json()['results'], [{'id': self.recipe.id, 'title': 'Curry'}])
+        self.assertNotIn('"price"', sql)
+        self.assertNotIn('core_tag', sql)
+        self.assertNotIn('core_ingredient', sql)
+
+    def test_list_exclude_keeps_pagination(self):
+        Recipe.objects.create(user=self.user, title='Rice', price=Decimal('1.00'), time_minutes=5)
+        res, _ = self._get(RECIPES_URL, {'exclude': 'id,tags,ingredients', 'page_size': 1})
+
+        self.assertEqual(list(res.json()['results'][0]), ['title', 'price', 'link', 'time_minutes'])
+        res = self.client.get(res.json()['next'])
+        self.assertEqual(res.json()['results'][0]['title'], 'Curry')
+
+    def test_search_list_fields(self):
+        Recipe.objects.all().refresh_search_vector()
+        res, _ = self._get(RECIPES_URL, {'search': 'curry', 'fields': 'title'})
+
+        self.assertEqual(res.json()['results'], [{'title': 'Curry'}])
+
+    def test_detail_fields(self):
+        res, sql = self._get(detail_url(self.recipe.id), {'fields': 'description,tags'})
+
+        tag = self.recipe.tags.get()
+        self.assertEqual(res.json(), {'tags': [{'id': tag.id, 'name': 'Spicy'}], 'description': 'Hot'})
+        self.assertNotIn('"title"', sql)
+        self.assertNotIn('core_ingredient', sql)
+
+    def test_detail_exclude(self):
+        res, _ = self._get(detail_url(self.recipe.id), {'exclude': 'description,tags,ingredients'})
+
+        self.assertEqual(set(res.json()), {'id', 'title', 'price', 'link', 'time_minutes'})
+
+    def test_tag_fields(self):
+        res, _ = self._get(TAGS_URL, {'fields': 'name'})
+
+        self.assertEqual(res.json()['results'], [{'name': 'Spicy'}])
+
+    def test_unknown_field_rejected(self):
+        res = self.client.get(RECIPES_URL, {'fields': 'title,secret', 'exclude': 'nope'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.json(), {'fields': ['Unknown fields: secret.'], 'exclude': ['Unknown fields: nope.']})
+
+    def test_update_ignores_fields(self):
+        '''writes validate and return every field'''
+        res = self.client.patch(f'{detail_url(self.recipe.id)}?fields=title', {'price': '6.00'}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json()['price'], '6.00')
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.price, Decimal('6.00'))
@@ -44,12 +44,12 @@ class PrivateIngredientApiTests(TestCase):
     def test_retrieve_ingredient_list(self):
         res = self.client.get(INGREDIENT_URL)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, [])
+        self.assertEqual(res.data['results'], [])
         create_ingredient(self.user, name='Salt')
         res = self.client.get(INGREDIENT_URL)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], 'Salt')
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], 'Salt')
 
     def test_retrieve_ingredient_limit_for_user(self):
         new_user = get_user_model().objects.create_user(email='test@ex.com', password='<PASSWORD>')
@@ -59,9 +59,9 @@ class PrivateIngredientApiTests(TestCase):
 
         res = self.client.get(INGREDIENT_URL)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 2)
+        self.assertEqual(len(res.data['results']), 2)
         # checks the ordering of ingredients which is defined by name
-        self.assertEqual(res.data[0]['name'], 'Salt')
+        self.assertEqual(res.data['results'][0]['name'], 'Salt')
 
     def test_ingredient_serializer(self):
         Ingredient.objects.create(user=self.user, name='Salt')
@@ -71,7 +71,7 @@ class PrivateIngredientApiTests(TestCase):
         serializer = IngredientSerializer(ingredients, many=True)
         res = self.client.get(INGREDIENT_URL)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_ingredient_update(self):
         ingredient = Ingredient.objects.create(user=self.user, name='Salt')
@@ -83,6 +83,15 @@ class PrivateIngredientApiTests(TestCase):
         self.assertEqual(res.data['name'], payload['name'])
         self.assertEqual(ingredient.name, payload['name'])
 
+    def test_ingredient_update_to_taken_name(self):
+        ingredient = create_ingredient(self.user, name='Salt')
+        create_ingredient(self.user, name='Pepper')
+
+        res = self.client.patch(ingredient_detail_url(ingredient.id), {'name': 'Pepper'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        ingredient.refresh_from_db()
+        self.assertEqual(ingredient.name, 'Salt')
+
     def test_ingredient_delete(self):
         ingredient = create_ingredient(self.user, name='Salt')
         res = self.client.delete(ingredient_detail_url(ingredient.id))
@@ -108,9 +117,9 @@ class PrivateIngredientApiTests(TestCase):
         res = self.client.get(INGREDIENT_URL, {'assigned_only': 1})
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertIn(ser1.data, res.data)
-        self.assertNotIn(ser2.data, res.data)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertIn(ser1.data, res.data['results'])
+        self.assertNotIn(ser2.data, res.data['results'])
 
     def test_filtered_tags_unique(self):
         """Test filtered ingredients returns a unique list."""
@@ -133,7 +142,7 @@ class PrivateIngredientApiTests(TestCase):
 
         res = self.client.get(INGREDIENT_URL, {'assigned_only': 1})
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data['results']), 1)
 
         ser1 = IngredientSerializer(in1)
-        self.assertIn(ser1.data, res.data)
+        self.assertIn(ser1.data, res.data['results'])
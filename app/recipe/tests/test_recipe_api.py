@@ -1,16 +1,29 @@
 from decimal import Decimal
 from rest_framework.test import APIClient
 from rest_framework import status
-from django.test import TestCase
+from rest_framework.exceptions import ValidationError
+from django.test import TestCase, override_settings
+from django.conf import settings
 from django.urls import reverse
 from core.models import Recipe, Ingredient, Tag
 from django.contrib.auth import get_user_model
-from recipe.serializers import RecipeSerializer, RecipeDetailSerializer, IngredientSerializer
+from recipe.serializers import (
+    RecipeSerializer,
+    RecipeDetailSerializer,
+    IngredientSerializer,
+    RecipeImageSerializer,
+)
+import csv
+import hashlib
+import io
+import json
 import tempfile
 import os
 
 from PIL import Image
 
+from recipe.uploadhandlers import ImageUploadHandler
+
 
 RECIPES_URL = reverse('recipe:recipe-list')
 
@@ -19,6 +32,10 @@ def detail_url(recipe_id):
     return reverse('recipe:recipe-detail', args=[recipe_id])
 
 
+BULK_URL = reverse('recipe:recipe-bulk')
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
 def image_upload_url(recipe_id):
     """Create and return an image upload URL."""
     return reverse('recipe:recipe-upload-image', args=[recipe_id])
@@ -66,7 +83,7 @@ class PrivateRecipeApiTests(TestCase):
 
         recipes = Recipe.objects.all().order_by('-id')
         serializer = RecipeSerializer(recipes, many=True)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_recipe_list_limited_to_user(self):
         other_user = get_user_model().objects.create_user(
@@ -81,7 +98,7 @@ class PrivateRecipeApiTests(TestCase):
 
         recipes = Recipe.objects.filter(user=self.user)
         serializer = RecipeSerializer(recipes, many=True)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_recipe_detail(self):
         recipe = create_recipe(user=self.user)
@@ -257,14 +274,14 @@ class PrivateRecipeApiTests(TestCase):
 
         res = self.client.get(RECIPES_URL, {'tags': f'{tag1.id}, {tag2.id}'})
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 2)
+        self.assertEqual(len(res.data['results']), 2)
 
         s1 = RecipeSerializer(r1)
         s2 = RecipeSerializer(r2)
         s3 = RecipeSerializer(r3)
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertIn(s2.data, res.data['results'])
+        self.assertNotIn(s3.data, res.data['results'])
 
     def test_filter_by_ingredients(self):
         """test filter recipe by tags."""
@@ -278,14 +295,272 @@ class PrivateRecipeApiTests(TestCase):
 
         res = self.client.get(RECIPES_URL, {'ingredients': f'{ingredient1.id},{ingredient2.id}'})
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 2)
+        self.assertEqual(len(res.data['results']), 2)
 
         s1 = RecipeSerializer(r1)
         s2 = RecipeSerializer(r2)
         s3 = RecipeSerializer(r3)
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertIn(s2.data, res.data['results'])
+        self.assertNotIn(s3.data, res.data['results'])
+
+    def test_filter_by_all_tags(self):
+        """test match=all returns only recipes having every given tag."""
+        r1 = Recipe.objects.create(user=self.user, title='Salt', price=2.33)
+        r2 = Recipe.objects.create(user=self.user, title='Sut', price=23.33)
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Dinner')
+        r1.tags.add(tag1, tag2)
+        r2.tags.add(tag1)
+
+        res = self.client.get(RECIPES_URL, {'tags': f'{tag1.id},{tag2.id}', 'match': 'all'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([recipe['id'] for recipe in res.data['results']], [r1.id])
+
+        res = self.client.get(RECIPES_URL, {'tags': f'{tag1.id},{tag2.id}', 'match': 'any'})
+        self.assertEqual([recipe['id'] for recipe in res.data['results']], [r2.id, r1.id])
+
+    def test_filter_by_tags_and_ingredients_unique(self):
+        """test a recipe matching several filter ids is listed once."""
+        recipe = Recipe.objects.create(user=self.user, title='Salt', price=2.33)
+        tags = [Tag.objects.create(user=self.user, name=name) for name in ('Vegan', 'Dinner')]
+        ingredients = [Ingredient.objects.create(user=self.user, name=name) for name in ('Kale', 'Salt')]
+        recipe.tags.add(*tags)
+        recipe.ingredients.add(*ingredients)
+
+        res = self.client.get(RECIPES_URL, {
+            'tags': ','.join(str(tag.id) for tag in tags),
+            'ingredients': ','.join(str(ingredient.id) for ingredient in ingredients),
+        })
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([recipe['id'] for recipe in res.data['results']], [recipe.id])
+
+    def test_filter_invalid_match(self):
+        res = self.client.get(RECIPES_URL, {'tags': '1', 'match': 'some'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_recipes(self):
+        """Test full-text search matches title, description, tags and ingredients."""
+        by_title = create_recipe(user=self.user, title='Thai Curry', description='')
+        by_description = create_recipe(user=self.user, title='Soup', description='A mild curry soup')
+        by_tag = create_recipe(user=self.user, title='Rice', description='')
+        by_tag.tags.add(Tag.objects.create(user=self.user, name='curries'))
+        by_ingredient = create_recipe(user=self.user, title='Stew', description='')
+        by_ingredient.ingredients.add(Ingredient.objects.create(user=self.user, name='Curry paste'))
+        create_recipe(user=self.user, title='Pasta', description='Tomato sauce')
+        other_user = get_user_model().objects.create_user(email='other@example.com', password='PASSWORD')
+        create_recipe(user=other_user, title='Curry')
+
+        res = self.client.get(RECIPES_URL, {'search': 'curry'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        ids = [recipe['id'] for recipe in res.data['results']]
+        self.assertEqual(ids[0], by_title.id)
+        self.assertEqual(set(ids), {by_title.id, by_description.id, by_tag.id, by_ingredient.id})
+
+    def test_search_follows_renamed_tag(self):
+        recipe = create_recipe(user=self.user, title='Soup')
+        tag = Tag.objects.create(user=self.user, name='Dinner')
+        recipe.tags.add(tag)
+        tag.name = 'Lunch'
+        tag.save()
+
+        self.assertEqual(len(self.client.get(RECIPES_URL, {'search': 'dinner'}).data['results']), 0)
+        self.assertEqual(len(self.client.get(RECIPES_URL, {'search': 'lunch'}).data['results']), 1)
+
+        tag.delete()
+        self.assertEqual(len(self.client.get(RECIPES_URL, {'search': 'lunch'}).data['results']), 0)
+
+    def test_search_paginated_by_rank(self):
+        for i in range(3):
+            create_recipe(user=self.user, title=f'Curry {i}', description='')
+        for i in range(2):
+            create_recipe(user=self.user, title=f'Soup {i}', description='curry')
+
+        res = self.client.get(RECIPES_URL, {'search': 'curry', 'page_size': 2})
+        titles = [recipe['title'] for recipe in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            titles += [recipe['title'] for recipe in res.data['results']]
+
+        self.assertEqual(titles, ['Curry 2', 'Curry 1', 'Curry 0', 'Soup 1', 'Soup 0'])
+
+    def test_search_paginated_past_offset_cutoff(self):
+        """Test the cursor walks more equally ranked recipes than DRF's cursor offset allows."""
+        Recipe.objects.bulk_create(
+            Recipe(user=self.user, title='Apple pie', time_minutes=60, price=Decimal('4.00')) for _ in range(1300))
+        Recipe.objects.filter(user=self.user).refresh_search_vector()
+
+        pages = []
+        url, params = RECIPES_URL, {'search': 'apple pie', 'page_size': 100, 'fields': 'id'}
+        while url and len(pages) < 20:
+            res = self.client.get(url, params)
+            pages.append([recipe['id'] for recipe in res.data['results']])
+            url, params = res.data['next'], None
+        ids = sum(pages, [])
+        self.assertEqual(len(pages), 13)
+        self.assertEqual(ids, sorted(ids, reverse=True))
+        self.assertEqual(len(set(ids)), 1300)
+
+    def test_recipes_paginated_by_cursor(self):
+        """Test walking the recipe list page by page with the next cursor."""
+        recipes = [create_recipe(user=self.user, title=f'Recipe {i}') for i in range(5)]
+        res = self.client.get(RECIPES_URL, {'page_size': 2})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsNone(res.data['previous'])
+
+        ids = [recipe['id'] for recipe in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(res.data['results']), 2)
+            ids += [recipe['id'] for recipe in res.data['results']]
+
+        self.assertEqual(ids, [recipe.id for recipe in reversed(recipes)])
+
+
+class BulkRecipeApiTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='bulk@example.com', password='<PASSWORD>')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_bulk_create(self):
+        Tag.objects.create(user=self.user, name='Vegan')
+        payload = [
+            {'title': 'Curry', 'price': '5.00', 'time_minutes': 10, 'tags': [{'name': 'Vegan'}, {'name': 'Hot'}],
+             'ingredients': [{'name': 'Rice'}]},
+            {'title': 'Soup', 'price': '3.00', 'time_minutes': 5, 'tags': [{'name': 'Hot'}, {'name': 'Hot'}]},
+        ]
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['errors'], [])
+        curry = Recipe.objects.get(id=res.data['results'][0]['id'])
+        soup = Recipe.objects.get(id=res.data['results'][1]['id'])
+        self.assertEqual(curry.user, self.user)
+        self.assertEqual(sorted(tag.name for tag in curry.tags.all()), ['Hot', 'Vegan'])
+        self.assertEqual([ingredient.name for ingredient in curry.ingredients.all()], ['Rice'])
+        self.assertEqual([tag.name for tag in soup.tags.all()], ['Hot'])
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(list(Recipe.objects.search('rice')), [curry])
+
+    def test_bulk_create_reports_item_errors(self):
+        payload = [
+            {'title': 'Curry', 'price': '5.00', 'time_minutes': 10},
+            {'title': 'No price', 'time_minutes': 10},
+        ]
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual([result['index'] for result in res.data['results']], [0])
+        self.assertEqual(res.data['errors'][0]['index'], 1)
+        self.assertIn('price', res.data['errors'][0]['errors'])
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_bulk_create_atomic_writes_nothing(self):
+        payload = [
+            {'title': 'Curry', 'price': '5.00', 'time_minutes': 10},
+            {'title': 'No price', 'time_minutes': 10},
+        ]
+        res = self.client.post(f'{BULK_URL}?atomic=1', payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data['results'], [])
+        self.assertFalse(Recipe.objects.exists())
+
+    @override_settings(RECIPE_BULK_MAX_ITEMS=1)
+    def test_bulk_create_too_many_items(self):
+        payload = [{'title': 'Curry', 'price': '5.00', 'time_minutes': 10}] * 2
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_bulk_update(self):
+        recipe = create_recipe(user=self.user, title='Curry')
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Old'))
+        untouched = create_recipe(user=self.user, title='Soup')
+        untouched.tags.add(Tag.objects.get(name='Old'))
+        other = create_recipe(user=get_user_model().objects.create_user('other@example.com', 'pass123'))
+        payload = [
+            {'id': recipe.id, 'title': 'Green curry', 'tags': [{'name': 'New'}]},
+            {'id': other.id, 'title': 'Stolen'},
+            {'title': 'Missing id'},
+        ]
+        res = self.client.patch(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(res.data['results'], [{'index': 0, 'id': recipe.id}])
+        self.assertEqual([error['index'] for error in res.data['errors']], [1, 2])
+        recipe.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(recipe.title, 'Green curry')
+        self.assertEqual(recipe.price, Decimal('5.25'))
+        self.assertEqual([tag.name for tag in recipe.tags.all()], ['New'])
+        self.assertEqual([tag.name for tag in untouched.tags.all()], ['Old'])
+        self.assertNotEqual(other.title, 'Stolen')
+        self.assertEqual(list(Recipe.objects.search('green')), [recipe])
+
+    def test_bulk_delete(self):
+        recipes = [create_recipe(user=self.user) for _ in range(2)]
+        other = create_recipe(user=get_user_model().objects.create_user('other@example.com', 'pass123'))
+        res = self.client.delete(BULK_URL, [recipes[0].id, other.id], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(res.data['results'], [{'index': 0, 'id': recipes[0].id}])
+        self.assertEqual(res.data['errors'][0]['index'], 1)
+        self.assertEqual(list(Recipe.objects.filter(user=self.user)), [recipes[1]])
+        self.assertTrue(Recipe.objects.filter(id=other.id).exists())
+
+
+@override_settings(RECIPE_EXPORT_CHUNK_SIZE=2)
+class RecipeExportTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='export@example.com', password='<PASSWORD>')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.recipes = [create_recipe(user=self.user, title=f'Recipe {i}') for i in range(5)]
+        self.recipes[0].tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        self.recipes[0].ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Rice'),
+            Ingredient.objects.create(user=self.user, name='Beans'),
+        )
+        create_recipe(user=get_user_model().objects.create_user('other@example.com', 'pass123'))
+
+    def test_export_ndjson(self):
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(res.streaming_content).decode().splitlines()]
+        recipes = Recipe.objects.filter(user=self.user).order_by('-id')
+        self.assertEqual(rows, json.loads(json.dumps(RecipeDetailSerializer(recipes, many=True).data)))
+
+    def test_export_csv(self):
+        res = self.client.get(EXPORT_URL, {'file_format': 'csv'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(b''.join(res.streaming_content).decode())))
+        self.assertEqual([row['title'] for row in rows], [f'Recipe {i}' for i in range(4, -1, -1)])
+        self.assertEqual(rows[-1]['tags'], 'Vegan')
+        self.assertEqual(sorted(rows[-1]['ingredients'].split('|')), ['Beans', 'Rice'])
+        self.assertEqual(rows[-1]['price'], '5.25')
+
+    def test_export_filtered(self):
+        tag = Tag.objects.get(name='Vegan')
+        res = self.client.get(EXPORT_URL, {'tags': tag.id})
+
+        rows = b''.join(res.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(row)['id'] for row in rows], [self.recipes[0].id])
+
+    def test_export_invalid_format(self):
+        res = self.client.get(EXPORT_URL, {'file_format': 'xml'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
 
 class ImageUploadTests(TestCase):
@@ -305,6 +580,9 @@ class ImageUploadTests(TestCase):
         Clean up after each test it is run opposite to setup
         :return:
         '''
+        self.recipe.refresh_from_db()
+        for variant in self.recipe.image_variants:
+            self.recipe.image.storage.delete(variant['name'])
         self.recipe.image.delete()
 
     def test_upload_image(self):
@@ -329,3 +607,93 @@ class ImageUploadTests(TestCase):
         res = self.client.post(url, payload, format='multipart')
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(RECIPE_IMAGE_VARIANTS={**settings.RECIPE_IMAGE_VARIANTS, 'WIDTHS': [4, 8, 64], 'EAGER': True})
+    def test_upload_image_renders_variants(self):
+        """Test resized copies without EXIF are recorded after the upload commits."""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            img = Image.new('RGB', (20, 10))
+            exif = Image.Exif()
+            exif[0x010e] = 'secret description'
+            img.save(image_file, format='JPEG', exif=exif.tobytes())
+            image_file.seek(0)
+            with self.captureOnCommitCallbacks(execute=True):
+                res = self.client.post(url, {'image': image_file}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        variants = self.recipe.image_variants
+        self.assertEqual(sorted({variant['width'] for variant in variants}), [4, 8, 20])
+        self.assertEqual({variant['format'] for variant in variants}, {'webp', 'jpeg'})
+        for variant in variants:
+            with Image.open(self.recipe.image.storage.path(variant['name'])) as copy:
+                self.assertEqual(copy.width, variant['width'])
+                self.assertNotIn('exif', copy.info)
+
+        serializer_data = RecipeImageSerializer(self.recipe).data
+        self.assertEqual([variant['width'] for variant in serializer_data['image_variants']], [4, 4, 8, 8, 20, 20])
+
+    def _upload_noise_image(self, size=(200, 200)):
+        image_file = io.BytesIO()
+        Image.effect_noise(size, 50).convert('RGB').save(image_file, format='JPEG')
+        image_file.name = 'noise.jpg'
+        image_file.seek(0)
+        return self.client.post(image_upload_url(self.recipe.id), {'image': image_file}, format='multipart')
+
+    def test_upload_image_too_large_rejected_before_reading(self):
+        upload = {**settings.RECIPE_IMAGE_UPLOAD, 'MAX_BYTES': 100}
+        with override_settings(RECIPE_IMAGE_UPLOAD=upload):
+            res = self._upload_noise_image()
+
+        self.assertEqual(res.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    def test_upload_image_too_large_rejected_while_streaming(self):
+        image_file = io.BytesIO()
+        Image.effect_noise((200, 200), 50).convert('RGB').save(image_file, format='JPEG')
+        # the announced length fits, the file itself does not
+        upload = {**settings.RECIPE_IMAGE_UPLOAD, 'MAX_BYTES': image_file.tell() - 1}
+        with override_settings(RECIPE_IMAGE_UPLOAD=upload):
+            res = self._upload_noise_image()
+
+        self.assertEqual(res.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    def test_upload_image_too_many_pixels(self):
+        upload = {**settings.RECIPE_IMAGE_UPLOAD, 'MAX_PIXELS': 100 * 100}
+        with override_settings(RECIPE_IMAGE_UPLOAD=upload):
+            res = self._upload_noise_image()
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', res.data)
+
+
+class ImageUploadHandlerTests(TestCase):
+    """Tests for the streaming image upload handler."""
+
+    def _stream(self, data, chunk_size=64):
+        handler = ImageUploadHandler()
+        handler.new_file('image', 'photo.png', 'image/png', len(data))
+        for start in range(0, len(data), chunk_size):
+            handler.receive_data_chunk(data[start:start + chunk_size], start)
+        return handler.file_complete(len(data))
+
+    def test_hash_and_header_read_while_streaming(self):
+        data = io.BytesIO()
+        Image.new('RGB', (30, 20)).save(data, format='PNG')
+        data = data.getvalue()
+
+        uploaded = self._stream(data)
+
+        self.assertEqual(uploaded.sha256, hashlib.sha256(data).hexdigest())
+        self.assertEqual(uploaded.image_size, (30, 20))
+        self.assertEqual(uploaded.image_format, 'PNG')
+        self.assertEqual(uploaded.read(), data)
+        uploaded.close()
+
+    def test_header_buffer_bounded(self):
+        upload = {**settings.RECIPE_IMAGE_UPLOAD, 'HEADER_BYTES': 256}
+        with override_settings(RECIPE_IMAGE_UPLOAD=upload):
+            with self.assertRaises(ValidationError):
+                self._stream(b'not an image' * 100)
@@ -0,0 +1,229 @@
+'''
+query count regression tests for the recipe endpoints
+the list cost must not grow with the number of recipes (no N+1 on nested tags/ingredients)
+'''
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+from core.testing import QueryBudgetAssertionsMixin
+from recipe.views import IngredientViewSet, RecipeViewSet, TagViewSet
+from user.authentication import token_cache
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENTS_URL = reverse('recipe:ingredient-list')
+BULK_URL = reverse('recipe:recipe-bulk')
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+def detail_url(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def create_recipes(user, count, start=0):
+    '''create recipes with two tags and two ingredients each'''
+    recipes = []
+    for i in range(start, start + count):
+        recipe = Recipe.objects.create(user=user, title=f'Recipe {i}', price=Decimal('5.25'))
+        recipe.tags.add(
+            Tag.objects.create(user=user, name=f'Tag {i}a'),
+            Tag.objects.create(user=user, name=f'Tag {i}b'),
+        )
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=user, name=f'Ingredient {i}a'),
+            Ingredient.objects.create(user=user, name=f'Ingredient {i}b'),
+        )
+        recipes.append(recipe)
+    return recipes
+
+
+# measure the database work, not the response cache
+@override_settings(RESPONSE_CACHE={'BACKEND': None, 'TTL': 0})
+class RecipeQueryCountTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='queries@example.com', password='PASSWORD')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return len(ctx)
+
+    def test_list_queries_constant(self):
+        '''the list costs the same number of queries for 1 and for 20 recipes'''
+        create_recipes(self.user, 1)
+        small = self._count_queries(RECIPES_URL)
+        create_recipes(self.user, 19, start=1)
+        large = self._count_queries(RECIPES_URL)
+
+        self.assertEqual(small, large)
+
+    def test_later_page_queries_constant(self):
+        '''fetching a later page through the cursor costs the same as the first page'''
+        create_recipes(self.user, 6)
+        first = self.client.get(RECIPES_URL, {'page_size': 2})
+        last = self.client.get(self.client.get(first.data['next']).data['next'])
+        self.assertEqual(len(last.data['results']), 2)
+
+        self.assertEqual(
+            self._count_queries(f'{RECIPES_URL}?page_size=2'),
+            self._count_queries(first.data['next']),
+        )
+
+    def test_list_prefetches_nested_relations(self):
+        '''the ETag aggregate and one query for the recipes with their nested relations aggregated'''
+        create_recipes(self.user, 5)
+        with self.assertNumQueries(2):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(len(res.data['results']), 5)
+        self.assertEqual(len(res.data['results'][0]['tags']), 2)
+        self.assertEqual(len(res.data['results'][0]['ingredients']), 2)
+
+    def test_detail_reads_cached_nested_relations(self):
+        recipe = create_recipes(self.user, 1)[0]
+        with self.assertNumQueries(2):
+            res = self.client.get(detail_url(recipe.id))
+
+        self.assertEqual(len(res.data['tags']), 2)
+        self.assertEqual(len(res.data['ingredients']), 2)
+
+    @override_settings(RECIPE_CACHED_ATTRS=False)
+    def test_detail_prefetches_nested_relations(self):
+        recipe = create_recipes(self.user, 1)[0]
+        with self.assertNumQueries(4):
+            res = self.client.get(detail_url(recipe.id))
+
+        self.assertEqual(len(res.data['tags']), 2)
+        self.assertEqual(len(res.data['ingredients']), 2)
+
+    def _count_create_queries(self, tag_count, ingredient_count):
+        payload = {
+            'title': 'Cookbook Recipe',
+            'price': Decimal('4.30'),
+            'tags': [{'name': f'{tag_count} tag {i}'} for i in range(tag_count)],
+            'ingredients': [{'name': f'{ingredient_count} ingredient {i}'} for i in range(ingredient_count)],
+        }
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.post(RECIPES_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return len(ctx)
+
+    def test_create_queries_constant(self):
+        '''creating with 30 new ingredients costs the same as with 2'''
+        small = self._count_create_queries(2, 2)
+        large = self._count_create_queries(30, 30)
+
+        self.assertEqual(small, large)
+
+    def test_update_queries_constant(self):
+        recipe = create_recipes(self.user, 1)[0]
+        counts = []
+        for size in (2, 30):
+            payload = {'ingredients': [{'name': f'{size} ingredient {i}'} for i in range(size)]}
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.patch(detail_url(recipe.id), payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            counts.append(len(ctx))
+
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(recipe.ingredients.count(), 30)
+
+    def _count_bulk_create_queries(self, size):
+        payload = [
+            {
+                'title': f'Bulk {size} {i}',
+                'price': '4.30',
+                'time_minutes': 5,
+                'tags': [{'name': f'{size} tag {i % 7}'}, {'name': 'shared'}],
+                'ingredients': [{'name': f'{size} ingredient {i}'}],
+            }
+            for i in range(size)
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.post(BULK_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return len(ctx)
+
+    def test_bulk_create_queries_constant(self):
+        '''creating 50 recipes in bulk costs the same as creating 2'''
+        small = self._count_bulk_create_queries(2)
+        large = self._count_bulk_create_queries(50)
+
+        self.assertEqual(small, large)
+
+    @override_settings(RECIPE_EXPORT_CHUNK_SIZE=10)
+    def test_export_queries_per_chunk(self):
+        '''the export prefetches nested relations once per chunk, not once per recipe'''
+        counts = []
+        for count in (1, 9):
+            create_recipes(self.user, count, start=len(counts) * 10)
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.get(EXPORT_URL)
+                lines = b''.join(res.streaming_content).splitlines()
+            counts.append(len(ctx))
+        self.assertEqual(len(lines), 10)
+
+        self.assertEqual(counts[0], counts[1])
+
+
+@override_settings(RESPONSE_CACHE={'BACKEND': None, 'TTL': 0})
+class QueryBudgetTests(QueryBudgetAssertionsMixin, TestCase):
+    '''the read endpoints stay within their query budgets, token authentication included'''
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='budget@example.com', password='PASSWORD')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+
+    def _get(self, url, params=None):
+        # budgets hold for a token missing from the authentication cache
+        token_cache.clear()
+        return self.client.get(url, params)
+
+    def _grow_recipes(self, size):
+        existing = Recipe.objects.filter(user=self.user).count()
+        create_recipes(self.user, size - existing, start=existing)
+
+    def test_recipe_list_budget(self):
+        self.assertQueryBudgetScales(
+            RecipeViewSet, 'list', self._grow_recipes, lambda: self._get(RECIPES_URL, {'page_size': 100}),
+        )
+
+    def test_recipe_search_budget(self):
+        def grow(size):
+            self._grow_recipes(size)
+            Recipe.objects.all().refresh_search_vector()
+
+        self.assertQueryBudgetScales(
+            RecipeViewSet, 'list', grow, lambda: self._get(RECIPES_URL, {'search': 'recipe', 'page_size': 100}),
+        )
+
+    def test_recipe_detail_budget(self):
+        recipe = Recipe.objects.create(user=self.user, title='Many tags', price=Decimal('1.00'))
+
+        def grow(size):
+            existing = recipe.tags.count()
+            recipe.tags.add(*[Tag.objects.create(user=self.user, name=f'Tag {i}') for i in range(existing, size)])
+
+        self.assertQueryBudgetScales(RecipeViewSet, 'retrieve', grow, lambda: self._get(detail_url(recipe.id)))
+
+    def test_tag_and_ingredient_list_budget(self):
+        for view_class, url in ((TagViewSet, TAGS_URL), (IngredientViewSet, INGREDIENTS_URL)):
+            with self.subTest(view=view_class.__name__):
+                self.assertQueryBudgetScales(
+                    view_class, 'list', self._grow_recipes,
+                    lambda: self._get(url, {'page_size': 1000, 'assigned_only': 1}),
+                )
@@ -0,0 +1,75 @@
+'''
+contract tests for the recipe list fast path: RecipeRowSerializer over as_rows() must render
+exactly the bytes RecipeSerializer renders for the same recipes as model instances
+'''
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+from core.renderers import ORJSONRenderer
+from recipe.serializers import RecipeSerializer, RecipeRowSerializer
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+@override_settings(RESPONSE_CACHE={'BACKEND': None, 'TTL': 0})
+class RecipeRowContractTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='rows@example.com', password='PASSWORD')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        spicy = Tag.objects.create(user=self.user, name='Spicy')
+        vegan = Tag.objects.create(user=self.user, name='Végétalien 🌱')
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        chili = Ingredient.objects.create(user=self.user, name='Chili "hot"')
+
+        curry = Recipe.objects.create(
+            user=self.user, title='Curry soup', price=Decimal('5.00'), time_minutes=30, link='https://example.com',
+        )
+        # added out of id order, nested lists come out ordered by id either way
+        curry.tags.add(vegan, spicy)
+        curry.ingredients.add(chili, salt)
+        plain = Recipe.objects.create(user=self.user, title='Plain rice', price=Decimal('0.50'), time_minutes=0)
+        plain.ingredients.add(salt)
+        Recipe.objects.create(user=self.user, title='Crème brûlée', price=Decimal('999.99'), time_minutes=45)
+        Recipe.objects.all().refresh_search_vector()
+
+        other = get_user_model().objects.create_user(email='other@example.com', password='PASSWORD')
+        Recipe.objects.create(user=other, title='Curry of someone else', price=Decimal('1.00'), time_minutes=5)
+
+    def _instances(self, queryset):
+        return RecipeSerializer(queryset.with_attrs('tags', 'ingredients'), many=True).data
+
+    def test_row_fields_match_recipe_serializer(self):
+        self.assertEqual(list(RecipeRowSerializer().fields), list(RecipeSerializer().fields))
+
+    def test_rows_render_like_instances(self):
+        queryset = Recipe.objects.filter(user=self.user).order_by('-id')
+        rows = RecipeRowSerializer(
+            queryset.as_rows(*RecipeRowSerializer().row_fields()), many=True
+        ).data
+        expected = self._instances(queryset)
+
+        for renderer in (ORJSONRenderer(), JSONRenderer()):
+            self.assertEqual(renderer.render(rows), renderer.render(expected))
+
+    def test_list_renders_like_instances(self):
+        res = self.client.get(RECIPES_URL)
+
+        expected = self._instances(Recipe.objects.filter(user=self.user).order_by('-id'))
+        self.assertEqual(res.content, ORJSONRenderer().render({'next': None, 'previous': None, 'results': expected}))
+
+    def test_search_list_renders_like_instances(self):
+        res = self.client.get(RECIPES_URL, {'search': 'curry'})
+
+        recipes = Recipe.objects.filter(user=self.user).search('curry').order_by('-rank', '-id')
+        expected = self._instances(recipes)
+        self.assertEqual(len(expected), 1)
+        self.assertEqual(res.content, ORJSONRenderer().render({'next': None, 'previous': None, 'results': expected}))
@@ -0,0 +1,107 @@
+'''
+tests for the per-user versioned response cache
+'''
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+from recipe.cache import response_cache
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+BULK_URL = reverse('recipe:recipe-bulk')
+
+
+def detail_url(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def create_recipe(user, **params):
+    return Recipe.objects.create(user=user, title=params.pop('title', 'Sample'), price=Decimal('5.25'), **params)
+
+
+@override_settings(RESPONSE_CACHE={'BACKEND': 'default', 'TTL': 300})
+class ResponseCacheTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='cache@example.com', password='pass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(self.user, title='Curry')
+
+    def test_list_cached(self):
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res['X-Cache'], 'MISS')
+
+        # only the ETag aggregate, see recipe.conditional
+        with self.assertNumQueries(1):
+            cached = self.client.get(RECIPES_URL)
+        self.assertEqual(cached.status_code, status.HTTP_200_OK)
+        self.assertEqual(cached['X-Cache'], 'HIT')
+        self.assertEqual(cached.data, res.data)
+
+    def test_query_params_normalized(self):
+        self.client.get(RECIPES_URL, {'page_size': 5, 'match': 'any'})
+        res = self.client.get(f'{RECIPES_URL}?match=any&page_size=5')
+        self.assertEqual(res['X-Cache'], 'HIT')
+
+        res = self.client.get(RECIPES_URL, {'page_size': 6})
+        self.assertEqual(res['X-Cache'], 'MISS')
+
+    def test_update_invalidates(self):
+        self.client.get(detail_url(self.recipe.id))
+        self.client.patch(detail_url(self.recipe.id), {'title': 'Green curry'})
+
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['title'], 'Green curry')
+
+    def test_tag_changes_invalidate(self):
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.client.get(RECIPES_URL)
+        self.client.get(TAGS_URL)
+        self.recipe.tags.add(tag)
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.data['results'][0]['tags'], [{'id': tag.id, 'name': 'Vegan'}])
+        tag.name = 'Vegetarian'
+        tag.save()
+        res = self.client.get(TAGS_URL)
+        self.assertEqual(res.data['results'][0]['name'], 'Vegetarian')
+
+    def test_bulk_create_invalidates(self):
+        self.client.get(RECIPES_URL)
+        self.client.post(BULK_URL, [{'title': 'Soup', 'price': '3.00', 'time_minutes': 5}], format='json')
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(len(res.data['results']), 2)
+
+    def test_other_user_not_invalidated(self):
+        other = get_user_model().objects.create_user(email='other@example.com', password='pass123')
+        self.client.get(RECIPES_URL)
+        create_recipe(other)
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res['X-Cache'], 'HIT')
+
+    def test_users_do_not_share_entries(self):
+        other = get_user_model().objects.create_user(email='other@example.com', password='pass123')
+        self.client.get(RECIPES_URL)
+        self.client.force_authenticate(other)
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['results'], [])
+
+    def test_hits_and_misses_counted(self):
+        before = response_cache.stats.copy()
+        self.client.get(RECIPES_URL)
+        self.client.get(RECIPES_URL)
+
+        self.assertEqual(response_cache.stats['recipe-list', 'miss'] - before['recipe-list', 'miss'], 1)
+        self.assertEqual(response_cache.stats['recipe-list', 'hit'] - before['recipe-list', 'hit'], 1)
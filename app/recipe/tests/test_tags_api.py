@@ -74,7 +74,18 @@ class PrivateTagTestApi(TestCase):
         tags = Tag.objects.all().order_by('-name')
         serializer = TagSerializer(tags, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
+
+    def test_tags_paginated_by_cursor(self):
+        for name in ['a', 'b', 'c']:
+            create_tag(self.user, name)
+        res = self.client.get(TAGS_URL, {'page_size': 2})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([tag['name'] for tag in res.data['results']], ['c', 'b'])
+
+        res = self.client.get(res.data['next'])
+        self.assertEqual([tag['name'] for tag in res.data['results']], ['a'])
+        self.assertIsNone(res.data['next'])
 
     def test_tags_limited_to_user(self):
         user2 = get_user_model().objects.create_user(email='ali@gm.com', password='<PASSWORD>')
@@ -86,7 +97,7 @@ class PrivateTagTestApi(TestCase):
         self.assertEqual(self.user, tags[0].user)
         tags_list = self.client.get(TAGS_URL)
         self.assertEqual(tags_list.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(tags_list.data), 2)
+        self.assertEqual(len(tags_list.data['results']), 2)
 
     def test_tag_get_single_object(self):
         tag = create_tag(self.user, 'test1')
@@ -101,6 +112,19 @@ class PrivateTagTestApi(TestCase):
         tag.refresh_from_db()
         self.assertEqual(tag.name, 'new name')
 
+    def test_tag_update_to_taken_name(self):
+        tag = create_tag(self.user, 'test1')
+        create_tag(self.user, 'test2')
+        create_tag(create_user(email='other@example.com'), 'test3')
+
+        res = self.client.patch(tag_url(tag.id), {'name': 'test2'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('name', res.data)
+        res = self.client.put(tag_url(tag.id), {'name': 'test1'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = self.client.put(tag_url(tag.id), {'name': 'test3'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
     def test_delete_tag(self):
 
         tag = create_tag(self.user, 'test1')
@@ -179,6 +203,22 @@ class PrivateTagTestApi(TestCase):
         new_tag = Tag.objects.get(user=self.user, name='Lunch')
         self.assertIn(new_tag, recipe.tags.all())
 
+    def test_invalid_tags_rejected(self):
+        """Test tags that are not objects with a valid name are a bad request."""
+        recipe = create_recipe(user=self.user)
+        for tags in ([{'title': 'Lunch'}], ['Lunch'], [{'name': ''}], [{'name': 'x' * 300}], {'name': 'Lunch'}):
+            payload = {'title': 'Soup', 'time_minutes': 10, 'price': '2.50', 'tags': tags}
+            res = self.client.post(RECIPES_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST, tags)
+            self.assertIn('tags', res.data)
+            res = self.client.patch(recipe_url(recipe.id), {'tags': tags}, format='json')
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST, tags)
+            res = self.client.patch(reverse('recipe:recipe-bulk'), [{'id': recipe.id, 'tags': tags}], format='json')
+            self.assertEqual(res.data['errors'][0]['index'], 0, tags)
+
+        self.assertEqual(Recipe.objects.count(), 1)
+        self.assertFalse(Tag.objects.exists())
+
     def test_update_recipe_assign_tag(self):
         """Test assigning an existing tag when updating a recipe."""
         tag_breakfast = Tag.objects.create(user=self.user, name='Breakfast')
@@ -231,15 +271,15 @@ class PrivateTagTestApi(TestCase):
 
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 2)
+        self.assertEqual(len(res.data['results']), 2)
 
         ser1 = TagSerializer(tag1)
         ser2 = TagSerializer(tag2)
         ser3 = TagSerializer(tag3)
 
-        self.assertIn(ser1.data, res.data)
-        self.assertIn(ser2.data, res.data)
-        self.assertNotIn(ser3.data, res.data)
+        self.assertIn(ser1.data, res.data['results'])
+        self.assertIn(ser2.data, res.data['results'])
+        self.assertNotIn(ser3.data, res.data['results'])
 
     def test_filtered_tags_unique(self):
         """Test filtered tags returns a unique list."""
@@ -264,5 +304,57 @@ class PrivateTagTestApi(TestCase):
 
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_tags_by_usage(self):
+        """Test tags sorted by usage, most used first, and filtered by a minimum usage."""
+        tags = [Tag.objects.create(user=self.user, name=name) for name in ('Breakfast', 'Lunch', 'Dessert')]
+        for count, tag in zip((1, 3, 0), tags):
+            for _ in range(count):
+                create_recipe(user=self.user).tags.add(tag)
 
+        res = self.client.get(TAGS_URL, {'ordering': 'usage'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([tag['name'] for tag in res.data['results']], ['Lunch', 'Breakfast', 'Dessert'])
+
+        res = self.client.get(TAGS_URL, {'ordering': 'usage', 'min_recipes': 2})
+        self.assertEqual([tag['name'] for tag in res.data['results']], ['Lunch'])
+
+    def test_tags_by_usage_paginated(self):
+        """Test the cursor walks ties in usage without repeating or skipping tags."""
+        for i in range(5):
+            Tag.objects.create(user=self.user, name=f'Tag {i}')
+        create_recipe(user=self.user).tags.add(*Tag.objects.filter(name__in=['Tag 3', 'Tag 4']))
+
+        names = []
+        url, params = TAGS_URL, {'ordering': 'usage', 'page_size': 2, 'fields': 'name'}
+        while url:
+            res = self.client.get(url, params)
+            names += [tag['name'] for tag in res.data['results']]
+            url, params = res.data['next'], None
+        self.assertEqual(names[:2], ['Tag 3', 'Tag 4'])
+        self.assertCountEqual(names, [f'Tag {i}' for i in range(5)])
+
+    def test_tags_by_usage_paginated_past_offset_cutoff(self):
+        """Test the cursor walks more tied tags than DRF's cursor offset allows, both ways."""
+        Tag.objects.bulk_create(Tag(user=self.user, name=f'Tag {i}') for i in range(1300))
+
+        pages = []
+        url, params = TAGS_URL, {'ordering': 'usage', 'page_size': 100, 'fields': 'id'}
+        while url and len(pages) < 20:
+            res = self.client.get(url, params)
+            pages.append([tag['id'] for tag in res.data['results']])
+            url, params = res.data['next'], None
+        ids = sum(pages, [])
+        self.assertEqual(len(pages), 13)
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), 1300)
+
+        res = self.client.get(res.data['previous'])
+        self.assertEqual([tag['id'] for tag in res.data['results']], pages[-2])
+
+    def test_invalid_usage_params(self):
+        """Test unknown orderings and negative minimum usages are rejected."""
+        for params in ({'ordering': 'recipe_count'}, {'min_recipes': -1}, {'min_recipes': 'many'}):
+            res = self.client.get(TAGS_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST, params)
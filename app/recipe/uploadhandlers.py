@@ -0,0 +1,98 @@
+"""
+Streaming upload handling for recipe images.
+
+Chunks are written straight to a temporary file while their SHA-256 is computed,
+and the image size is read from a bounded prefix holding the header, so neither
+the upload nor its decoded pixels are ever held in memory. Oversized payloads are
+rejected as soon as that is known instead of after the whole body was read.
+"""
+import hashlib
+import io
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image
+from rest_framework import exceptions, status
+
+# room for the multipart boundaries and part headers around the file itself
+MULTIPART_OVERHEAD = 16 * 1024
+
+
+class UploadTooLarge(exceptions.APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'The uploaded image is too large.'
+    default_code = 'upload_too_large'
+
+
+TOO_MANY_PIXELS = 'The image has too many pixels.'
+INVALID_IMAGE = 'Upload a valid image.'
+
+
+def too_many_pixels(size):
+    width, height = size
+    return width * height > settings.RECIPE_IMAGE_UPLOAD['MAX_PIXELS']
+
+
+def read_header(data):
+    """
+    Return (size, format) parsed from the leading bytes of an image, or None if they
+    are not enough. Raises Image.DecompressionBombError for absurdly large images.
+    """
+    try:
+        # Image.open only parses the header, pixel data is decoded lazily
+        with Image.open(io.BytesIO(data)) as img:
+            return img.size, img.format
+    except OSError:
+        return None
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """
+    TemporaryFileUploadHandler that also sets sha256, image_size and image_format
+    on the uploaded file.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.options = settings.RECIPE_IMAGE_UPLOAD
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length > self.options['MAX_BYTES'] + MULTIPART_OVERHEAD:
+            raise UploadTooLarge()
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+        self.header = b''
+        self.image_info = None
+
+    def _reject(self, exc):
+        self.upload_interrupted()
+        raise exc
+
+    def _invalid(self, message):
+        self._reject(exceptions.ValidationError({'image': [message]}))
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.options['MAX_BYTES']:
+            self._reject(UploadTooLarge())
+        self.hasher.update(raw_data)
+        if self.image_info is None:
+            self.header += raw_data[:self.options['HEADER_BYTES'] - len(self.header)]
+            try:
+                self.image_info = read_header(self.header)
+            except Image.DecompressionBombError:
+                self._invalid(TOO_MANY_PIXELS)
+            if self.image_info is not None:
+                self.header = b''
+                if too_many_pixels(self.image_info[0]):
+                    self._invalid(TOO_MANY_PIXELS)
+            elif len(self.header) >= self.options['HEADER_BYTES']:
+                self._invalid(INVALID_IMAGE)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.sha256 = self.hasher.hexdigest()
+        file.image_size, file.image_format = self.image_info or (None, None)
+        return file
@@ -0,0 +1,77 @@
+"""
+Background generation of recipe image variants.
+
+Rendering runs in a local process pool once the upload is committed; the
+result is recorded on Recipe.image_variants. No external broker is involved.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from core.models import Recipe
+from recipe.imaging import render_variants, supported_formats
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn instead of fork, forking a threaded server process is not safe
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.RECIPE_IMAGE_VARIANTS['WORKERS'],
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _executor
+
+
+def _store(recipe_id, image_name, base, rendered):
+    variants = [
+        {'width': variant['width'], 'format': variant['format'], 'name': base + variant['suffix']}
+        for variant in rendered
+    ]
+    # the image may have been replaced while rendering, then these variants are stale
+    Recipe.objects.filter(pk=recipe_id, image=image_name).update(image_variants=variants)
+
+
+def _on_rendered(recipe_id, image_name, base, future):
+    try:
+        _store(recipe_id, image_name, base, future.result())
+    except Exception:
+        logger.exception('Rendering image variants of recipe %s failed', recipe_id)
+    finally:
+        # runs in the executor's thread, which is not a request thread
+        connection.close()
+
+
+def _submit(recipe_id, image_name, storage):
+    options = settings.RECIPE_IMAGE_VARIANTS
+    base = os.path.splitext(image_name)[0]
+    args = (
+        storage.path(image_name),
+        storage.path(base),
+        options['WIDTHS'],
+        supported_formats(options['FORMATS']),
+        options['QUALITY'],
+    )
+    if options['EAGER']:
+        _store(recipe_id, image_name, base, render_variants(*args))
+        return
+    future = _get_executor().submit(render_variants, *args)
+    future.add_done_callback(partial(_on_rendered, recipe_id, image_name, base))
+
+
+def schedule_variants(recipe):
+    """Render the variants of the recipe's image once the current transaction commits."""
+    if recipe.image:
+        transaction.on_commit(partial(_submit, recipe.pk, recipe.image.name, recipe.image.storage))
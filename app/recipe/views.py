@@ -1,21 +1,47 @@
 """
 Views for the recipe APIs
 """
+from django.conf import settings
 from drf_spectacular.utils import (
     extend_schema_view,
     extend_schema,
     OpenApiParameter,
     OpenApiTypes,
 )
+from django.db import transaction
 from rest_framework import viewsets, mixins, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import IntegerField, ListField
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
 # Create your views here.
 from core.models import Recipe, Tag, Ingredient
+from core.querybudget import QueryBudgetMixin
 from recipe import serializers
+from recipe.cache import CachedReadMixin
+from recipe.conditional import ConditionalMixin
+from recipe.export import CONTENT_TYPES, export_response
+from recipe.fieldsets import SparseFieldsMixin
+from recipe.uploadhandlers import ImageUploadHandler
+from recipe.variants import schedule_variants
+from user.authentication import CachedTokenAuthentication
+from recipe.pagination import RecipeCursorPagination, RecipeAttrCursorPagination
+
+SPARSE_FIELDS_PARAMETERS = [
+    OpenApiParameter(
+        'fields',
+        OpenApiTypes.STR,
+        description='Comma separated list of the fields to return, like id,title',
+    ),
+    OpenApiParameter(
+        'exclude',
+        OpenApiTypes.STR,
+        description='Comma separated list of the fields to leave out',
+    ),
+]
+
 
 @extend_schema_view(
     list=extend_schema(
@@ -30,15 +56,54 @@ from recipe import serializers
                 OpenApiTypes.STR,
                 description='Comma separated list of ingredient IDs to filter',
             ),
+            OpenApiParameter(
+                'search',
+                OpenApiTypes.STR,
+                description='Full-text search over title, description, tag and ingredient names. '
+                            'Results are ranked, best match first.',
+            ),
+            OpenApiParameter(
+                'match',
+                OpenApiTypes.STR,
+                enum=['any', 'all'],
+                description='Return recipes having any (default) or all of the given tags and ingredients.',
+            ),
+            *SPARSE_FIELDS_PARAMETERS,
         ]
-    )
+    ),
+    retrieve=extend_schema(parameters=SPARSE_FIELDS_PARAMETERS),
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(QueryBudgetMixin, SparseFieldsMixin, ConditionalMixin, CachedReadMixin, viewsets.ModelViewSet):
     """View for manage recipe APIs."""
     serializer_class = serializers.RecipeDetailSerializer
     queryset = Recipe.objects.all()
-    authentication_classes = [TokenAuthentication]
+    list_models = (Recipe,)
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = RecipeCursorPagination
+    # nested relations each action serializes; they are prefetched with one query per relation
+    # instead of one query per recipe
+    prefetch_plans = {
+        'retrieve': ('tags', 'ingredients'),
+        'export': ('tags', 'ingredients'),
+    }
+    # most queries per request, token authentication included; writes also pay for their
+    # savepoints and for the signal handlers keeping search vectors, timestamps and the
+    # recipe counts of tags and ingredients current.
+    # None of them may grow with the number of recipes, tags or ingredients involved. bulk
+    # has none: it writes BULK_BATCH_SIZE rows per query (and Django deletes 100 recipes per
+    # query), see test_bulk_create_queries_constant for its cost per batch. Nor has export:
+    # its recipes are read while the response streams, after the budget is checked, see
+    # test_export_queries_per_chunk for its cost per chunk
+    query_budgets = {
+        'list': 3,
+        'retrieve': 5,
+        'create': 21,
+        'update': 25,
+        'partial_update': 25,
+        'destroy': 7,
+        'upload_image': 11,
+    }
 
     def _get_id_list(self, objs):
         return [int(obj) for obj in objs.split(',') ]
@@ -47,18 +112,36 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """Retrieve recipes for authenticated user."""
         tags = self.request.query_params.get('tags', None)
         ingredients = self.request.query_params.get('ingredients', None)
+        match = self.request.query_params.get('match', 'any')
+        if match not in ('any', 'all'):
+            raise ValidationError({'match': 'Must be "any" or "all".'})
         queryset = self.queryset
         if tags is not None:
-            queryset = queryset.filter(tags__id__in=self._get_id_list(tags))
+            queryset = queryset.filter_related('tags', self._get_id_list(tags), match)
         if ingredients is not None:
-            queryset = queryset.filter(ingredients__id__in=self._get_id_list(ingredients))
-        return queryset.filter(user=self.request.user).order_by('-id').distinct()
+            queryset = queryset.filter_related('ingredients', self._get_id_list(ingredients), match)
+        queryset, relations = self.narrow_queryset(queryset, self.prefetch_plans.get(self.action, ()))
+        queryset = queryset.for_user(self.request.user).with_attrs(*relations)
+        search = self.request.query_params.get('search')
+        if search:
+            queryset = queryset.search(search).order_by('-rank', '-id')
+        else:
+            queryset = queryset.order_by('-id')
+        if self.action == 'list':
+            # plain rows with tags and ingredients aggregated in the same query, see RecipeRowSerializer
+            serializer = self.get_serializer()
+            # the cursor reads the id (and rank) of the rows, whether they are rendered or not
+            fields = {'id', *serializer.row_fields(), *(['rank'] if search else [])}
+            queryset = queryset.as_rows(*fields, relations=serializer.row_relations())
+        return queryset
 
     def get_serializer_class(self):
         if self.action == 'list':
-            return serializers.RecipeSerializer
+            return serializers.RecipeRowSerializer
         if self.action == 'upload_image':
             return serializers.RecipeImageSerializer
+        if self.action == 'bulk':
+            return serializers.RecipeBulkSerializer
         return self.serializer_class
 
     def perform_create(self, serializer):
@@ -68,14 +151,103 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def upload_image(self, request, pk=None):
         """Upload an image to recipe."""
         recipe = self.get_object()
+        # must be set before request.data parses the body
+        request.upload_handlers = [ImageUploadHandler(request)]
         serializer = self.get_serializer(recipe, data=request.data)
 
         if serializer.is_valid():
-            serializer.save()
+            recipe = serializer.save(image_variants=[])
+            schedule_variants(recipe)
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'atomic',
+                OpenApiTypes.INT,
+                enum=[0, 1],
+                description='Write nothing if any item is invalid.',
+            ),
+        ]
+    )
+    @action(methods=['POST', 'PATCH', 'DELETE'], detail=False, url_path='bulk')
+    def bulk(self, request):
+        """
+        Create (POST), update (PATCH, items carry their id) or delete (DELETE, a list of ids)
+        many recipes in one transaction. Invalid items are reported by their index
+        and skipped, unless atomic=1 is given.
+        """
+        atomic = request.query_params.get('atomic') == '1'
+        recipes = Recipe.objects.for_user(request.user)
+        if request.method == 'DELETE':
+            id_list = ListField(child=IntegerField(), max_length=settings.RECIPE_BULK_MAX_ITEMS)
+            ids = id_list.run_validation(request.data)
+            found = set(recipes.filter(id__in=ids).values_list('id', flat=True))
+            errors = {index: {'id': ['Not found.']} for index, recipe_id in enumerate(ids) if recipe_id not in found}
+            results = {}
+            if not (errors and atomic):
+                with transaction.atomic():
+                    recipes.filter(id__in=found).delete()
+                results = {index: recipe_id for index, recipe_id in enumerate(ids) if recipe_id in found}
+            return self._bulk_response(results, errors, atomic, status.HTTP_200_OK)
+
+        partial = request.method == 'PATCH'
+        serializer = self.get_serializer(recipes if partial else None, data=request.data, many=True, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        errors = serializer.item_errors
+        results = {}
+        if not (errors and atomic):
+            with transaction.atomic():
+                saved = serializer.save() if partial else serializer.save(user=request.user)
+            results = {index: recipe.id for index, recipe in zip(serializer.item_indexes, saved)}
+        return self._bulk_response(
+            results, errors, atomic, status.HTTP_200_OK if partial else status.HTTP_201_CREATED
+        )
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'file_format',
+                OpenApiTypes.STR,
+                enum=list(CONTENT_TYPES),
+                description='ndjson (default) or csv.',
+            ),
+        ],
+        responses={(200, content_type): OpenApiTypes.STR for content_type in CONTENT_TYPES.values()},
+    )
+    @action(methods=['GET'], detail=False, url_path='export')
+    def export(self, request):
+        """Stream every recipe of the user, narrowed by the list filters, as NDJSON or CSV."""
+        file_format = request.query_params.get('file_format', 'ndjson')
+        if file_format not in CONTENT_TYPES:
+            raise ValidationError({'file_format': f'Must be one of {", ".join(CONTENT_TYPES)}.'})
+        return export_response(self.get_queryset(), file_format)
+
+    def _bulk_response(self, results, errors, atomic, success_status):
+        """200/201 when every item was written, 207 when some were and 400 when none were."""
+        if not errors:
+            response_status = success_status
+        elif results and not atomic:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response(
+            {
+                'results': [{'index': index, 'id': recipe_id} for index, recipe_id in sorted(results.items())],
+                'errors': [{'index': index, 'errors': detail} for index, detail in sorted(errors.items())],
+            },
+            status=response_status,
+        )
+
+
+# ?ordering= of the tag and ingredient lists, each served by an index on (user, ...)
+ORDERINGS = {
+    'name': ('-name', 'id'),
+    'usage': ('-recipe_count', 'id'),
+}
+
 
 @extend_schema_view(
     list=extend_schema(
@@ -86,24 +258,68 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 enum=[0, 1],
                 description='Filter by items assigned to recipes.',
             ),
+            OpenApiParameter(
+                'min_recipes',
+                OpenApiTypes.INT,
+                description='Filter by items assigned to at least this many recipes.',
+            ),
+            OpenApiParameter(
+                'ordering',
+                OpenApiTypes.STR,
+                enum=list(ORDERINGS),
+                description='Sort by name (default) or by usage, the items assigned to most recipes first.',
+            ),
+            *SPARSE_FIELDS_PARAMETERS,
         ]
-    )
+    ),
+    retrieve=extend_schema(parameters=SPARSE_FIELDS_PARAMETERS),
 )
-class BaseRecipeAttrViewSet(mixins.UpdateModelMixin,
+class BaseRecipeAttrViewSet(QueryBudgetMixin,
+                            SparseFieldsMixin,
+                            ConditionalMixin,
+                            CachedReadMixin,
+                            mixins.UpdateModelMixin,
                             mixins.ListModelMixin,
                             mixins.RetrieveModelMixin,
                             mixins.DestroyModelMixin,
                             viewsets.GenericViewSet):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = RecipeAttrCursorPagination
+    # the cursor reads the column it paginates on, whichever fields are selected
+    required_columns = ('name', 'recipe_count')
+    # renames and deletes touch the linked recipes, see core.signals
+    query_budgets = {
+        'list': 4,
+        'retrieve': 3,
+        'update': 9,
+        'partial_update': 9,
+        'destroy': 5,
+    }
 
     def get_queryset(self):
-        assigned_only = bool(self.request.query_params.get('assigned_only', 0))
+        """
+        The user's objects, filtered and sorted by usage on their recipe_count instead of
+        joining the recipes.
+        """
+        params = self.request.query_params
+        ordering = params.get('ordering', 'name')
+        if ordering not in ORDERINGS:
+            raise ValidationError({'ordering': f'Must be one of {", ".join(ORDERINGS)}.'})
+        try:
+            min_recipes = int(params.get('min_recipes', 0))
+        except ValueError:
+            min_recipes = -1
+        if min_recipes < 0:
+            raise ValidationError({'min_recipes': 'Must be a positive integer or 0.'})
+        if bool(params.get('assigned_only', 0)):
+            min_recipes = max(min_recipes, 1)
         queryset = self.queryset
-        if assigned_only:
-            queryset = queryset.filter(recipes__isnull=False)
+        if min_recipes:
+            queryset = queryset.filter(recipe_count__gte=min_recipes)
 
-        return queryset.filter(user=self.request.user).order_by('-name').distinct()
+        queryset, _ = self.narrow_queryset(queryset)
+        return queryset.filter(user=self.request.user).order_by(*ORDERINGS[ordering])
 
 
 class TagViewSet(BaseRecipeAttrViewSet):
@@ -117,8 +333,12 @@ class TagViewSet(BaseRecipeAttrViewSet):
     '''
     serializer_class = serializers.TagSerializer
     queryset = Tag.objects.all()
+    # recipe_count follows the recipes, whose updated_at moves when they are linked, and
+    # their count when they are deleted
+    list_models = (Tag, Recipe)
 
 
 class IngredientViewSet(BaseRecipeAttrViewSet):
     serializer_class = serializers.IngredientSerializer
     queryset = Ingredient.objects.all()
+    list_models = (Ingredient, Recipe)
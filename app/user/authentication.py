@@ -0,0 +1,137 @@
+'''
+token authentication with a cache in front of the authtoken table
+'''
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from core.db.replicas import read_alias
+
+
+class LRUCache:
+    '''Thread safe in-process LRU cache whose entries expire after ttl seconds'''
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class TokenCache:
+    '''
+    maps token keys to their (user, token) pair.
+    the per-process LRU answers first, then the optional shared cache (an alias of CACHES).
+    invalidation only reaches the LRU of the current process, so other processes may keep
+    serving an entry for up to LOCAL_TTL seconds; keep it short when running several workers.
+    '''
+
+    def __init__(self, options):
+        self.local = LRUCache(options['MAX_SIZE'], options['LOCAL_TTL'])
+        self.shared = caches[options['BACKEND']] if options['BACKEND'] else None
+        self.ttl = options['TTL']
+
+    @staticmethod
+    def _shared_key(key):
+        # raw tokens are credentials, keep them out of the shared cache
+        return 'auth-token:' + hashlib.sha256(key.encode()).hexdigest()
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is None and self.shared is not None:
+            value = self.shared.get(self._shared_key(key))
+            if value is not None:
+                self.local.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.local.set(key, value)
+        if self.shared is not None:
+            self.shared.set(self._shared_key(key), value, self.ttl)
+
+    def delete(self, key):
+        self.local.delete(key)
+        if self.shared is not None:
+            self.shared.delete(self._shared_key(key))
+
+    def delete_user(self, user_id):
+        for key in Token.objects.filter(user_id=user_id).values_list('key', flat=True):
+            self.delete(key)
+
+    def clear(self):
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+
+token_cache = TokenCache(settings.TOKEN_AUTH_CACHE)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    '''
+    drop-in replacement for TokenAuthentication that skips the authtoken query
+    while the token is cached. entries are dropped when the token is deleted or
+    its user is saved (see user.signals).
+    '''
+
+    def _get_token(self, key):
+        tokens = self.get_model().objects.select_related('user')
+        try:
+            return tokens.get(key=key)
+        except Token.DoesNotExist:
+            if read_alias() == DEFAULT_DB_ALIAS:
+                raise exceptions.AuthenticationFailed('Invalid token.')
+        # a token created moments ago may not have reached the replica yet
+        try:
+            return tokens.using(DEFAULT_DB_ALIAS).get(key=key)
+        except Token.DoesNotExist:
+            raise exceptions.AuthenticationFailed('Invalid token.')
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is None:
+            token = self._get_token(key)
+            cached = (token.user, token)
+            token_cache.set(key, cached)
+
+        user, token = cached
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        # every request gets its own copy so views can't mutate the cached user
+        return copy.copy(user), token
@@ -0,0 +1,21 @@
+'''
+signal handlers keeping the token auth cache consistent
+'''
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from user.authentication import token_cache
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    token_cache.delete(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_saved_user(sender, instance, created, **kwargs):
+    '''a saved user may be deactivated or renamed, so its cached copy is stale'''
+    if not created:
+        token_cache.delete_user(instance.pk)
@@ -5,9 +5,14 @@ from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from core.testing import QueryBudgetAssertionsMixin
+from user.authentication import token_cache
+from user.views import CreateTokenView, CreateUserView, ManageUserView
+
 
 CREATE_USER_URL = reverse('user:create')
 TOKEN_URL = reverse('user:token')
@@ -113,3 +118,25 @@ class PrivateUserApiTest(TestCase):
         self.assertEqual(self.user.name, payload['name'])
         self.assertTrue(self.user.check_password(payload['password']))
         self.assertTrue(res.status_code, status.HTTP_200_OK)
+
+
+class UserQueryBudgetTests(QueryBudgetAssertionsMixin, TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_new_user(email='budget@example.com', password='pass123', name='budget')
+        token_cache.clear()
+
+    def test_create_user_budget(self):
+        payload = {'email': 'new@example.com', 'password': 'pass123', 'name': 'new'}
+        self.assertWithinQueryBudget(CreateUserView, 'post', lambda: self.client.post(CREATE_USER_URL, payload))
+
+    def test_token_budget(self):
+        payload = {'email': 'budget@example.com', 'password': 'pass123'}
+        self.assertWithinQueryBudget(CreateTokenView, 'post', lambda: self.client.post(TOKEN_URL, payload))
+
+    def test_me_budget(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+        self.assertWithinQueryBudget(ManageUserView, 'get', lambda: self.client.get(ME_URL))
+        token_cache.clear()
+        self.assertWithinQueryBudget(ManageUserView, 'patch', lambda: self.client.patch(ME_URL, {'name': 'renamed'}))
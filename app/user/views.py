@@ -1,29 +1,51 @@
 '''
 view for create user API
 '''
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, permissions
+from .authentication import CachedTokenAuthentication
 from .serializers import UserSerializer, AuthTokenSerializer
+from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
+from core.db.replicas import pin_reads
+from core.querybudget import QueryBudgetMixin
 
 
-class CreateUserView(generics.CreateAPIView):
+class CreateUserView(QueryBudgetMixin, generics.CreateAPIView):
     """Create a new user in the system."""
     serializer_class = UserSerializer
+    query_budgets = {'post': 2}
 
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        # the client's next requests read the new user
+        pin_reads(self.request, serializer.instance)
 
-class CreateTokenView(ObtainAuthToken):
+
+class CreateTokenView(QueryBudgetMixin, ObtainAuthToken):
     """Create a new user in the system."""
     """Create a new auth token for user."""
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    query_budgets = {'post': 5}
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = serializer.validated_data['user']
+        token, created = Token.objects.get_or_create(user=user)
+        # anonymous until the client sends the token back, pinned as the user it belongs to
+        pin_reads(request, user)
+        return Response({'token': token.key})
 
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+class ManageUserView(QueryBudgetMixin, generics.RetrieveUpdateAPIView):
     """Manage the authenticated user."""
     serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
+    query_budgets = {'get': 2, 'put': 5, 'patch': 5}
 
     def get_object(self):
         """Retrieve and return the authenticated user."""